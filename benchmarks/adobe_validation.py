@@ -0,0 +1,68 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+#
+# Benchmark for the per-config cost of validating Adobe Mobile SDK configuration files, comparing the
+# compiled validator that is reused across files with loading and compiling the schema for every file.
+#
+# To run:
+# python -m benchmarks.adobe_validation
+#
+import json
+import timeit
+
+from jsonschema.validators import validator_for
+
+from truegaze.plugins.adobe_mobile_sdk import RULES_FILE, AdobeMobileSdkPlugin
+
+# Sample configurations, one valid and one with several issues
+CONFIGS = [
+    {"analytics": {"ssl": True}, "mediaHeartbeat": {"ssl": True}},
+    {"analytics": {"ssl": False}, "mediaHeartbeat": {}, "remotes": {"messages": "http://example.com/"}},
+]
+
+# Number of validations to time for each approach
+ITERATIONS = 2000
+
+
+def validate_uncached(parsed_data):
+    with open(RULES_FILE, 'r') as schema_file:
+        schema_data = json.load(schema_file)
+    validator = validator_for(schema_data)
+    return list(validator(schema=schema_data).iter_errors(parsed_data))
+
+
+def validate_cached(parsed_data):
+    return AdobeMobileSdkPlugin.validate(parsed_data)
+
+
+def run():
+    for name, function in [('uncached', validate_uncached), ('cached', validate_cached)]:
+        for index, config in enumerate(CONFIGS):
+            total = timeit.timeit(lambda: function(config), number=ITERATIONS)
+            print('{:<10} config #{}: {:8.1f} us per config'.format(name, index, total / ITERATIONS * 1000000))
+
+
+if __name__ == '__main__':
+    run()
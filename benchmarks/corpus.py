@@ -0,0 +1,342 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+#
+# Generator of synthetic APK and IPA files for the benchmarks, with a controllable number of entries,
+# Adobe Mobile SDK configuration files, resource table strings, signing certificates and total size. The
+# generated files only contain what the plugins look at, but are otherwise well-formed so that they can also
+# be opened with other tools.
+#
+import datetime
+import json
+import os
+import plistlib
+import random
+import shutil
+import struct
+import zipfile
+
+from asn1crypto import cms, x509 as asn1_x509
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import dsa, ec, padding as rsa_padding, rsa
+from cryptography.x509.oid import NameOID
+
+from truegaze.apk_signing import SIGNATURE_V2_ID, SIGNATURE_V3_ID, SIGNING_BLOCK_MAGIC
+
+# Supported certificate key types, with the extension of the v1 signature file and the v2/v3 algorithm ID
+KEY_TYPES = {
+    'rsa': ('RSA', 0x0103),
+    'dsa': ('DSA', 0x0301),
+    'ecdsa': ('EC', 0x0201),
+}
+
+# Default key size for each key type
+DEFAULT_KEY_SIZES = {'rsa': 2048, 'dsa': 2048, 'ecdsa': 256}
+
+# Elliptic curves for each ECDSA key size
+CURVES = {256: ec.SECP256R1, 384: ec.SECP384R1, 521: ec.SECP521R1}
+
+# Supported signature schemes
+SCHEMES = ('v1', 'v2', 'v3')
+
+# Package and bundle names used in the generated files
+PACKAGE_NAME = 'com.example.benchmark'
+APP_DIR = 'Payload/Benchmark.app/'
+
+# Firebase database URL stored in the resource table if requested
+FIREBASE_DB_URL = 'https://benchmark.firebaseio.com'
+
+# Size of the random data used to pad files to their total size, and of each padding entry
+PADDING_CHUNK_SIZE = 1024 * 1024
+PADDING_ENTRY_SIZE = 16 * 1024 * 1024
+
+# Sample Adobe Mobile SDK configurations, alternating between one with several issues and a valid one
+ADOBE_CONFIGS = [
+    {"analytics": {"ssl": False}, "mediaHeartbeat": {}, "remotes": {"messages": "http://example.com/"}},
+    {"analytics": {"ssl": True}, "mediaHeartbeat": {"ssl": True}},
+]
+
+
+def make_key(key_type, key_size=None):
+    key_size = key_size or DEFAULT_KEY_SIZES[key_type]
+    if key_type == 'rsa':
+        return rsa.generate_private_key(public_exponent=65537, key_size=key_size, backend=default_backend())
+    elif key_type == 'dsa':
+        return dsa.generate_private_key(key_size=key_size, backend=default_backend())
+    elif key_type == 'ecdsa':
+        return ec.generate_private_key(CURVES[key_size](), default_backend())
+    raise ValueError('Unknown key type: ' + key_type)
+
+
+def make_certificate(key):
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'benchmark')])
+    now = datetime.datetime.utcnow()
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()) \
+        .serial_number(1).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=365)) \
+        .sign(key, hashes.SHA256(), default_backend())
+    return cert.public_bytes(serialization.Encoding.DER)
+
+
+def sign(key, data):
+    if isinstance(key, rsa.RSAPrivateKey):
+        return key.sign(data, rsa_padding.PKCS1v15(), hashes.SHA256())
+    elif isinstance(key, dsa.DSAPrivateKey):
+        return key.sign(data, hashes.SHA256())
+    return key.sign(data, ec.ECDSA(hashes.SHA256()))
+
+
+def make_v1_signature(key, key_type, certificate, signature_file):
+    # PKCS#7 SignedData over the .SF file, in the same form as jarsigner and apksigner produce
+    certificate = asn1_x509.Certificate.load(certificate)
+    algorithm = {'rsa': 'rsassa_pkcs1v15', 'dsa': 'dsa', 'ecdsa': 'ecdsa'}[key_type]
+    signer_info = cms.SignerInfo({
+        'version': 'v1',
+        'sid': cms.SignerIdentifier({'issuer_and_serial_number': cms.IssuerAndSerialNumber({
+            'issuer': certificate.issuer, 'serial_number': certificate.serial_number})}),
+        'digest_algorithm': {'algorithm': 'sha256'},
+        'signature_algorithm': {'algorithm': algorithm},
+        'signature': sign(key, signature_file),
+    })
+    signed_data = cms.SignedData({
+        'version': 'v1',
+        'digest_algorithms': [{'algorithm': 'sha256'}],
+        'encap_content_info': {'content_type': 'data'},
+        'certificates': [certificate],
+        'signer_infos': [signer_info],
+    })
+    return cms.ContentInfo({'content_type': 'signed_data', 'content': signed_data}).dump()
+
+
+def prefixed(data):
+    return struct.pack('<I', len(data)) + data
+
+
+def make_signer(key, algorithm, certificate, is_v3):
+    signed_data = prefixed(b'') + prefixed(prefixed(certificate)) + prefixed(b'')
+    if is_v3:
+        signed_data += struct.pack('<II', 24, 0x7fffffff)
+    signer = prefixed(signed_data)
+    if is_v3:
+        signer += struct.pack('<II', 24, 0x7fffffff)
+    signer += prefixed(prefixed(struct.pack('<I', algorithm) + prefixed(sign(key, signed_data))))
+    public_key = key.public_key().public_bytes(serialization.Encoding.DER,
+                                               serialization.PublicFormat.SubjectPublicKeyInfo)
+    signer += prefixed(public_key)
+    return prefixed(prefixed(signer))
+
+
+def insert_signing_block(path, pairs):
+    # Insert an APK Signing Block right before the central directory, only the central directory is moved
+    with open(path, 'r+b') as file:
+        file.seek(-22, os.SEEK_END)
+        eocd = bytearray(file.read(22))
+        size, offset = struct.unpack_from('<II', eocd, 12)
+        file.seek(offset)
+        central_directory = file.read(size)
+
+        entries = b''.join(struct.pack('<QI', len(value) + 4, pair_id) + value for pair_id, value in pairs)
+        block_size = len(entries) + 24
+        block = struct.pack('<Q', block_size) + entries + struct.pack('<Q', block_size) + SIGNING_BLOCK_MAGIC
+        struct.pack_into('<I', eocd, 16, offset + len(block))
+
+        file.seek(offset)
+        file.truncate()
+        file.write(block + central_directory + bytes(eocd))
+
+
+def pad(data):
+    return data + b'\x00' * (-len(data) % 4)
+
+
+def make_string_pool(strings, utf8=True):
+    data = bytearray()
+    offsets = list()
+    for string in strings:
+        offsets.append(len(data))
+        if utf8:
+            encoded = string.encode('utf-8')
+            data += struct.pack('<BB', len(string), len(encoded)) + encoded + b'\x00'
+        else:
+            data += struct.pack('<H', len(string)) + string.encode('utf-16-le') + b'\x00\x00'
+    data = pad(bytes(data))
+    strings_start = 28 + len(strings) * 4
+    return struct.pack('<HHIIIIII', 0x0001, 28, strings_start + len(data), len(strings), 0, 0x100 if utf8 else 0,
+                       strings_start, 0) + struct.pack('<' + str(len(strings)) + 'I', *offsets) + data
+
+
+def make_arsc(string_count, locales=0, firebase=False):
+    # Resource table with a single package holding string_count string resources, translated into the given
+    # number of other locales, and optionally the Firebase database URL
+    keys = ['string_' + str(index) for index in range(string_count)]
+    values = ['Value of string ' + str(index) for index in range(string_count)]
+    if firebase:
+        keys += ['firebase_database_url', 'project_id']
+        values += [FIREBASE_DB_URL, 'benchmark']
+
+    languages = [b'\x00\x00'] + [bytes([97 + index // 26 % 26, 97 + index % 26]) for index in range(locales)]
+    strings = list()
+    chunks = list()
+    for language in languages:
+        first = len(strings)
+        strings.extend(values)
+        entries = b''.join(struct.pack('<HHIHBBI', 8, 0, index, 8, 0, 0x03, first + index)
+                           for index in range(len(keys)))
+        config = struct.pack('<IHH', 28, 0, 0) + language + b'\x00' * 18
+        header_size = 20 + len(config)
+        entries_start = header_size + len(keys) * 4
+        chunks.append(struct.pack('<HHIBBHII', 0x0201, header_size, entries_start + len(entries), 1, 0, 0,
+                                  len(keys), entries_start) + config +
+                      struct.pack('<' + str(len(keys)) + 'I', *range(0, len(keys) * 16, 16)) + entries)
+
+    type_strings = make_string_pool(['string'], utf8=False)
+    key_strings = make_string_pool(keys)
+    body = type_strings + key_strings + b''.join(chunks)
+    package = struct.pack('<HHII', 0x0200, 288, 288 + len(body), 0x7f) + \
+        PACKAGE_NAME.encode('utf-16-le').ljust(256, b'\x00') + \
+        struct.pack('<IIIII', 288, 1, 288 + len(type_strings), len(keys), 0) + body
+
+    body = make_string_pool(strings) + package
+    return struct.pack('<HHII', 0x0002, 12, 12 + len(body), 1) + body
+
+
+def make_manifest():
+    # Binary XML with a single <manifest package="..."> element
+    strings = make_string_pool(['package', 'manifest', PACKAGE_NAME], utf8=False)
+    attribute = struct.pack('<IIIHBBI', 0xFFFFFFFF, 0, 2, 8, 0, 0x03, 2)
+    start = struct.pack('<HHIII', 0x0102, 16, 36 + len(attribute), 1, 0xFFFFFFFF) + \
+        struct.pack('<IIHHHHHH', 0xFFFFFFFF, 1, 20, 20, 1, 0, 0, 0) + attribute
+    end = struct.pack('<HHIIIII', 0x0103, 16, 24, 1, 0xFFFFFFFF, 0xFFFFFFFF, 1)
+    body = strings + start + end
+    return struct.pack('<HHI', 0x0003, 8, 8 + len(body)) + body
+
+
+def write_filler(zip_file, prefix, entries, rng):
+    # Small compressed files, like the resources and assets of a real app
+    for index in range(entries):
+        data = ' '.join(str(rng.randrange(1000)) for _ in range(rng.randrange(8, 64)))
+        zip_file.writestr(prefix + 'res/raw/file_' + str(index) + '.txt', data, zipfile.ZIP_DEFLATED)
+
+
+def write_adobe_configs(zip_file, prefix, count):
+    for index in range(count):
+        name = 'ADBMobileConfig.json' if index == 0 else 'ADBMobileConfig-' + str(index) + '.json'
+        zip_file.writestr(prefix + name, json.dumps(ADOBE_CONFIGS[index % len(ADOBE_CONFIGS)]),
+                          zipfile.ZIP_DEFLATED)
+
+
+def write_padding(zip_file, prefix, total_size, rng):
+    # Stored random data up to the total size, written in chunks so that large files don't need much memory
+    chunk = bytes(rng.getrandbits(8) for _ in range(PADDING_CHUNK_SIZE))
+    index = 0
+    remaining = total_size - zip_file.fp.tell()
+    while remaining > 0:
+        size = min(remaining, PADDING_ENTRY_SIZE)
+        info = zipfile.ZipInfo(prefix + 'assets/padding_' + str(index) + '.bin', (1980, 1, 1, 0, 0, 0))
+        with zip_file.open(info, 'w', force_zip64=size > 0x7fffffff) as entry:
+            written = 0
+            while written < size:
+                written += entry.write(chunk[:size - written])
+        index += 1
+        remaining = total_size - zip_file.fp.tell()
+
+
+def make_apk(path, entries=100, adobe_configs=0, arsc_strings=100, arsc_locales=0, firebase=False, key_type='rsa',
+             key_size=None, schemes=('v1', 'v2'), total_size=0, seed=0):
+    """
+    Writes a synthetic APK file
+
+    :param path: path of the file to write
+    :param entries: number of filler files
+    :param adobe_configs: number of ADBMobileConfig*.json files
+    :param arsc_strings: number of string resources in resources.arsc
+    :param arsc_locales: number of locales the string resources are translated into
+    :param firebase: whether to include a Firebase database URL in the string resources
+    :param key_type: type of the signing key, one of KEY_TYPES
+    :param key_size: size of the signing key in bits, or None for the default size
+    :param schemes: signature schemes to sign the file with, any of SCHEMES
+    :param total_size: minimum size of the file in bytes, reached by adding random data
+    :param seed: seed for the random contents
+    """
+    rng = random.Random(seed)
+    extension, algorithm = KEY_TYPES[key_type]
+    key = make_key(key_type, key_size)
+    certificate = make_certificate(key)
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zip_file:
+        zip_file.writestr('AndroidManifest.xml', make_manifest())
+        zip_file.writestr('resources.arsc', make_arsc(arsc_strings, arsc_locales, firebase), zipfile.ZIP_STORED)
+        zip_file.writestr('classes.dex', b'dex\n035\x00' + bytes(rng.getrandbits(8) for _ in range(4096)))
+        write_filler(zip_file, '', entries, rng)
+        write_adobe_configs(zip_file, 'assets/', adobe_configs)
+        write_padding(zip_file, '', total_size, rng)
+        if 'v1' in schemes:
+            signature_file = b'Signature-Version: 1.0\r\nCreated-By: benchmark\r\n\r\n'
+            zip_file.writestr('META-INF/MANIFEST.MF', b'Manifest-Version: 1.0\r\n\r\n')
+            zip_file.writestr('META-INF/CERT.SF', signature_file)
+            zip_file.writestr('META-INF/CERT.' + extension,
+                              make_v1_signature(key, key_type, certificate, signature_file))
+
+    pairs = list()
+    if 'v2' in schemes:
+        pairs.append((SIGNATURE_V2_ID, make_signer(key, algorithm, certificate, False)))
+    if 'v3' in schemes:
+        pairs.append((SIGNATURE_V3_ID, make_signer(key, algorithm, certificate, True)))
+    if pairs:
+        insert_signing_block(path, pairs)
+
+
+def make_ipa(path, entries=100, adobe_configs=0, total_size=0, seed=0):
+    """
+    Writes a synthetic IPA file
+
+    :param path: path of the file to write
+    :param entries: number of filler files
+    :param adobe_configs: number of ADBMobileConfig*.json files
+    :param total_size: minimum size of the file in bytes, reached by adding random data
+    :param seed: seed for the random contents
+    """
+    rng = random.Random(seed)
+    plist = dict(CFBundleIdentifier=PACKAGE_NAME, CFBundleShortVersionString='1.0', CFBundleExecutable='Benchmark')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zip_file:
+        zip_file.writestr(APP_DIR + 'Info.plist', plistlib.dumps(plist, fmt=plistlib.FMT_BINARY))
+        zip_file.writestr(APP_DIR + 'Benchmark', b'\xcf\xfa\xed\xfe' + bytes(rng.getrandbits(8) for _ in range(4096)))
+        write_filler(zip_file, APP_DIR, entries, rng)
+        write_adobe_configs(zip_file, APP_DIR, adobe_configs)
+        write_padding(zip_file, APP_DIR, total_size, rng)
+
+
+def make_file(path, spec):
+    """
+    Writes a synthetic APK or IPA file, based on the file extension
+
+    :param path: path of the file to write
+    :param spec: dictionary of keyword arguments for make_apk() or make_ipa()
+    """
+    temp_path = path + '.tmp'
+    if path.endswith('.ipa'):
+        make_ipa(temp_path, **spec)
+    else:
+        make_apk(temp_path, **spec)
+    shutil.move(temp_path, path)
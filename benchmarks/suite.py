@@ -0,0 +1,300 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+#
+# Benchmark suite that times each plugin and the end-to-end scan of synthetic APK and IPA files, and measures
+# their peak memory use. Each scenario describes a generated file (see benchmarks.corpus) and runs in its own
+# process, so that scenarios don't share warm caches or memory high-water marks. Results can be saved as JSON
+# and compared against an earlier run.
+#
+# To run:
+# python -m benchmarks.suite --output results.json
+# python -m benchmarks.suite --scenario apk_small --scenario ipa_small --repeat 5 --baseline results.json
+# python -m benchmarks.suite --compare old.json new.json
+#
+import argparse
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.corpus import make_file
+from truegaze.context import ScanContext
+from truegaze.plugins import ACTIVE_PLUGINS
+from truegaze.plugins.adobe_mobile_sdk import VALIDATION_CACHE
+from truegaze.scanner import PluginRun, TruegazeScanner
+from truegaze.utils import TruegazeUtils
+
+# Generated file for each scenario, as keyword arguments for make_apk() or make_ipa()
+SCENARIOS = {
+    'apk_small': ('.apk', dict(entries=100, adobe_configs=1, arsc_strings=100, firebase=True)),
+    'apk_many_entries': ('.apk', dict(entries=50000)),
+    'apk_large_arsc': ('.apk', dict(arsc_strings=50000, arsc_locales=10, firebase=True)),
+    'apk_many_configs': ('.apk', dict(adobe_configs=200)),
+    'apk_large': ('.apk', dict(total_size=256 * 1024 * 1024)),
+    'apk_dsa_v1': ('.apk', dict(key_type='dsa', schemes=('v1',))),
+    'apk_ecdsa_v2_v3': ('.apk', dict(key_type='ecdsa', schemes=('v2', 'v3'))),
+    'ipa_small': ('.ipa', dict(entries=100, adobe_configs=1)),
+    'ipa_many_entries': ('.ipa', dict(entries=50000, adobe_configs=10)),
+}
+
+# Settings multiplied by the --scale option
+SCALED_SETTINGS = ['entries', 'adobe_configs', 'arsc_strings', 'total_size']
+
+# Default number of times each measurement is repeated
+DEFAULT_REPEAT = 3
+
+# Default directory where the generated files are kept between runs
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), 'truegaze-benchmarks')
+
+# Measurements shown when comparing results, the time ones are compared by their minimum
+MEASUREMENTS = ['min', 'peak_memory']
+
+
+def get_spec(name, scale):
+    extension, spec = SCENARIOS[name]
+    spec = dict(spec)
+    for setting in SCALED_SETTINGS:
+        if setting in spec:
+            spec[setting] = int(spec[setting] * scale)
+    return extension, spec
+
+
+def get_corpus_file(corpus_dir, name, scale):
+    # Files are named after a hash of their settings, so that they are only generated again when those change
+    extension, spec = get_spec(name, scale)
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    path = os.path.join(corpus_dir, name + '-' + digest + extension)
+    if not os.path.exists(path):
+        os.makedirs(corpus_dir, exist_ok=True)
+        print('Generating ' + path)
+        make_file(path, spec)
+    return path
+
+
+def summarize(times, peak_memory):
+    return dict(min=min(times), median=statistics.median(times), peak_memory=peak_memory)
+
+
+def measure(function, repeat):
+    # Times the function, then runs it once more under tracemalloc for its peak Python memory use. Results kept
+    # in memory by the plugins are cleared before each run, so that repeated runs aren't served from them.
+    times = list()
+    for _ in range(repeat):
+        VALIDATION_CACHE.clear()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    VALIDATION_CACHE.clear()
+    tracemalloc.start()
+    try:
+        function()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return summarize(times, peak_memory)
+
+
+def scan_end_to_end(filename):
+    with contextlib.redirect_stdout(io.StringIO()):
+        TruegazeScanner.scan_file(filename, False)
+
+
+def open_context(filename):
+    # Opens the file, detects its platform and finds the paths for all plugins, the shared work done before
+    # any plugin runs
+    path_patterns = [pattern for plugin in ACTIVE_PLUGINS
+                     for pattern in plugin.path_patterns + (plugin.input_patterns or [])]
+    context = ScanContext(filename, path_patterns)
+    context.open()
+    context.detect()
+    for pattern in path_patterns:
+        context.get_matching_paths(pattern)
+    return context
+
+
+def run_plugin(plugin, context):
+    run = PluginRun(plugin, context, False)
+    run.start()
+    run.finish()
+
+
+def run_scenario(filename, repeat):
+    """
+    Runs all of the measurements for a single file, called in a new process for each scenario
+
+    :param filename: file to scan
+    :param repeat: number of times to repeat each measurement
+    :return: dictionary of results
+    """
+    TruegazeScanner.warm_up()
+    result = dict(file_size=os.path.getsize(filename))
+    result['end_to_end'] = measure(lambda: scan_end_to_end(filename), repeat)
+    result['detect'] = measure(lambda: open_context(filename).close(), repeat)
+
+    result['plugins'] = dict()
+    with open_context(filename) as context:
+        result['entries'] = len(context.zip_file.namelist())
+        for plugin in ACTIVE_PLUGINS:
+            if plugin.is_os_supported(context.is_android, context.is_ios):
+                result['plugins'][plugin.name] = measure(lambda: run_plugin(plugin, context), repeat)
+
+    result['max_rss'] = get_max_rss()
+    return result
+
+
+def get_max_rss():
+    # Maximum resident set size of the whole process, which unlike tracemalloc includes mapped files and memory
+    # allocated outside of Python. On Linux getrusage() keeps the parent's high-water mark across fork and exec,
+    # so the value for the process itself is read from /proc instead.
+    try:
+        with open('/proc/self/status', 'r') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def get_metadata(repeat, scale):
+    return dict(truegaze_version=TruegazeUtils.get_version(), python_version=platform.python_version(),
+                platform=platform.platform(), cpu_count=os.cpu_count(), repeat=repeat, scale=scale,
+                date=datetime.datetime.utcnow().isoformat() + 'Z')
+
+
+def run(scenarios=None, repeat=DEFAULT_REPEAT, scale=1.0, corpus_dir=DEFAULT_CORPUS_DIR):
+    """
+    Runs the benchmark scenarios
+
+    :param scenarios: names of the scenarios to run, or None for all of them
+    :param repeat: number of times to repeat each measurement
+    :param scale: factor applied to the sizes of the generated files
+    :param corpus_dir: directory where the generated files are kept
+    :return: dictionary of results, suitable for saving as JSON
+    """
+    results = dict(metadata=get_metadata(repeat, scale), scenarios=dict())
+    context = multiprocessing.get_context('spawn')
+    for name in scenarios or sorted(SCENARIOS):
+        filename = get_corpus_file(corpus_dir, name, scale)
+        with context.Pool(processes=1) as pool:
+            result = pool.apply(run_scenario, (filename, repeat))
+        results['scenarios'][name] = result
+        print_scenario(name, result)
+    return results
+
+
+def format_value(measurement, value):
+    if value is None:
+        return '-'
+    elif measurement in ('peak_memory', 'max_rss'):
+        return '{:.2f} MB'.format(value / 1024 / 1024)
+    return '{:.2f} ms'.format(value * 1000)
+
+
+def print_scenario(name, result):
+    print('{:<20} {:>8} entries, {:,} bytes'.format(name, result['entries'], result['file_size']))
+    rows = [('end-to-end', result['end_to_end']), ('detect', result['detect'])] + \
+        sorted(result['plugins'].items())
+    for label, values in rows:
+        print('  {:<18} min {:>12} median {:>12} peak memory {:>10}'.format(
+            label, format_value('min', values['min']), format_value('median', values['median']),
+            format_value('peak_memory', values['peak_memory'])))
+    print('  {:<18} {:>48}'.format('max RSS', format_value('max_rss', result['max_rss'])))
+
+
+def iter_measurements(result):
+    yield 'end-to-end', result['end_to_end']
+    yield 'detect', result['detect']
+    for name, values in sorted(result['plugins'].items()):
+        yield name, values
+
+
+def compare(old, new):
+    """
+    Prints the change in each measurement between two sets of results, only scenarios present in both are shown
+
+    :param old: dictionary of results from the earlier run
+    :param new: dictionary of results from the later run
+    """
+    print('{:<20} {:<18} {:<12} {:>12} {:>12} {:>8}'.format('scenario', 'measurement', '', 'old', 'new', 'change'))
+    for name in sorted(set(old['scenarios']) & set(new['scenarios'])):
+        old_values = dict(iter_measurements(old['scenarios'][name]))
+        for label, values in iter_measurements(new['scenarios'][name]):
+            for measurement in MEASUREMENTS:
+                old_value = old_values.get(label, dict()).get(measurement)
+                new_value = values[measurement]
+                change = '-'
+                if old_value:
+                    change = '{:+.1f}%'.format((new_value - old_value) / old_value * 100)
+                print('{:<20} {:<18} {:<12} {:>12} {:>12} {:>8}'.format(
+                    name, label, measurement, format_value(measurement, old_value),
+                    format_value(measurement, new_value), change))
+
+
+def load(filename):
+    with open(filename, 'r') as file:
+        return json.load(file)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmarks truegaze against synthetic APK and IPA files')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='scenario to run, can be given more than once (default: all)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='number of times to repeat each timing')
+    parser.add_argument('--scale', type=float, default=1.0, help='factor applied to the sizes of generated files')
+    parser.add_argument('--corpus-dir', default=DEFAULT_CORPUS_DIR, help='directory for the generated files')
+    parser.add_argument('--output', help='file to save the results to, as JSON')
+    parser.add_argument('--baseline', help='results of an earlier run to compare against')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two saved results without running anything')
+    args = parser.parse_args(args)
+
+    if args.compare:
+        compare(load(args.compare[0]), load(args.compare[1]))
+        return
+
+    results = run(args.scenario, args.repeat, args.scale, args.corpus_dir)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    if args.baseline:
+        print()
+        compare(load(args.baseline), results)
+
+
+if __name__ == '__main__':
+    main()
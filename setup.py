@@ -14,7 +14,7 @@ setup(
     author='Nightwatch Cybersecurity',
     author_email='research@nightwatchcybersecurity.com',
     license='Apache',
-    packages=find_packages(exclude=["scripts.*", "scripts", "tests.*", "tests"]),
+    packages=find_packages(exclude=["benchmarks.*", "benchmarks", "scripts.*", "scripts", "tests.*", "tests"]),
     include_package_data=True,
     install_requires=open('requirements.txt').read().splitlines(),
     entry_points={
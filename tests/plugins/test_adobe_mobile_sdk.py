@@ -24,7 +24,11 @@
 import io
 from zipfile import ZipFile
 
-from truegaze.plugins.adobe_mobile_sdk import AdobeMobileSdkPlugin
+import pytest
+
+from truegaze.cache import ResultCache
+from truegaze.context import ScanContext
+from truegaze.plugins.adobe_mobile_sdk import VALIDATION_CACHE, AdobeMobileSdkPlugin
 
 
 # Tests for AdobeMobileSdkPlugin
@@ -118,6 +122,70 @@ class TestAdobeMobileSdkPluginParseData(object):
         assert data['test2'] == 'str'
 
 
+# Tests for the get_messages method
+class TestAdobeMobileSdkPluginGetMessages(object):
+    @staticmethod
+    def make_plugin(cache=None):
+        VALIDATION_CACHE.clear()
+        return AdobeMobileSdkPlugin(ScanContext('test.apk', cache=cache), is_android=True, is_ios=False,
+                                    do_online=False)
+
+    @staticmethod
+    def make_zip(data, path='assets/ADBMobileConfig.json'):
+        buffer = io.BytesIO()
+        with ZipFile(buffer, 'w') as zip_file:
+            zip_file.writestr(path, data)
+        return ZipFile(buffer)
+
+    def test_messages(self):
+        plugin = TestAdobeMobileSdkPluginGetMessages.make_plugin()
+        messages = plugin.get_messages(TestAdobeMobileSdkPluginGetMessages.make_zip('{"analytics": {}}'),
+                                       'assets/ADBMobileConfig.json')
+        assert messages == AdobeMobileSdkPlugin.validate({"analytics": {}})
+        assert plugin.get_messages(TestAdobeMobileSdkPluginGetMessages.make_zip('{"welcome,'),
+                                   'assets/ADBMobileConfig.json') is None
+
+    def test_same_crc_not_read(self, monkeypatch):
+        plugin = TestAdobeMobileSdkPluginGetMessages.make_plugin()
+        first = plugin.get_messages(TestAdobeMobileSdkPluginGetMessages.make_zip('{"analytics": {}}'),
+                                    'assets/ADBMobileConfig.json')
+
+        # Another app with the same file under a different path reuses the result without reading it
+        zip_file = TestAdobeMobileSdkPluginGetMessages.make_zip('{"analytics": {}}', 'ADBMobileConfig.json')
+        monkeypatch.setattr(zip_file, 'read', lambda path: pytest.fail('File should not be read'))
+        assert plugin.get_messages(zip_file, 'ADBMobileConfig.json') == first
+
+    def test_same_contents_not_validated(self, monkeypatch):
+        plugin = TestAdobeMobileSdkPluginGetMessages.make_plugin()
+        zip_file = TestAdobeMobileSdkPluginGetMessages.make_zip('{"analytics": {}}')
+        first = plugin.get_messages(zip_file, 'assets/ADBMobileConfig.json')
+
+        # Only the content hash is kept, so the file is read but not parsed or validated again
+        for key in list(VALIDATION_CACHE._entries):
+            if key.startswith('crc:'):
+                del VALIDATION_CACHE._entries[key]
+        monkeypatch.setattr(AdobeMobileSdkPlugin, 'validate', lambda data: pytest.fail('Should not be validated'))
+        assert plugin.get_messages(zip_file, 'assets/ADBMobileConfig.json') == first
+
+    def test_persistent(self, tmpdir, monkeypatch):
+        cache = ResultCache(str(tmpdir))
+        plugin = TestAdobeMobileSdkPluginGetMessages.make_plugin(cache)
+        first = plugin.get_messages(TestAdobeMobileSdkPluginGetMessages.make_zip('{"analytics": {}}'),
+                                    'assets/ADBMobileConfig.json')
+
+        # A new process starts with an empty memory cache, but finds the result on disk
+        plugin = TestAdobeMobileSdkPluginGetMessages.make_plugin(cache)
+        monkeypatch.setattr(AdobeMobileSdkPlugin, 'validate', lambda data: pytest.fail('Should not be validated'))
+        assert plugin.get_messages(TestAdobeMobileSdkPluginGetMessages.make_zip('{"analytics": {}}'),
+                                   'assets/ADBMobileConfig.json') == first
+
+
+# Tests for the get_validator method
+class TestAdobeMobileSdkPluginGetValidator(object):
+    def test_compiled_once(self):
+        assert AdobeMobileSdkPlugin.get_validator() is AdobeMobileSdkPlugin.get_validator()
+
+
 # Testing validation - analytics / ssl setting
 class TestAdobeMobileSdkPluginIsSSLSettingCorrect(object):
     def test_empty(self):
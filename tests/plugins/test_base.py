@@ -23,7 +23,9 @@
 #
 import pytest
 
+from truegaze.context import ScanContext
 from truegaze.plugins.base import BasePlugin
+from truegaze.profiler import Profiler
 
 
 # Tests for BasePlugin
@@ -49,7 +51,20 @@ class TestBasePlugin(object):
         assert BasePlugin({}, False, False, False).is_online_testing_supported() is False
         assert BasePlugin({}, False, False, True).is_online_testing_supported() is False
 
+    def test_finish(self):
+        assert BasePlugin({}, True, True, True).finish() is None
+
     def test_scan_not_implemented(self):
         plugin = BasePlugin({}, True, True, True)
         with pytest.raises(NotImplementedError):
             assert plugin.scan()
+
+    def test_phase_without_profiler(self):
+        with BasePlugin({}, True, True, True).phase('parse'):
+            pass
+
+    def test_phase(self):
+        context = ScanContext('test.apk', profiler=Profiler(trace_memory=False))
+        with BasePlugin(context, True, True, True).phase('parse'):
+            pass
+        assert list(context.profiler.stats) == [('Base Plugin', 'parse')]
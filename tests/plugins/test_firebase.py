@@ -21,8 +21,15 @@
 # specific language governing permissions and limitations
 # under the License.
 #
+import os
+from zipfile import ZipFile
+
+from truegaze.online import OnlineClient
+from truegaze.plugins import firebase
 from truegaze.plugins.firebase import FirebasePlugin
 
+TEST_APK = os.path.join(os.path.dirname(__file__), '..', '..', 'test_data', 'helloworld.apk')
+
 
 # Tests for FirebasePlugin
 # TODO: Add tests for click output
@@ -54,6 +61,42 @@ class TestFirebasePlugin(object):
         assert plugin.is_online_testing_supported() is True
 
 
+# Tests for FirebasePlugin.get_resources() and FirebasePlugin.get_db_name()
+class TestFirebasePluginGetDbName(object):
+    def test_get_resources_none(self):
+        with ZipFile(TEST_APK) as zip_file:
+            assert FirebasePlugin.get_resources(zip_file) == {}
+
+    def test_get_resources_no_table(self, tmp_path):
+        filename = str(tmp_path / 'test.apk')
+        with ZipFile(filename, 'w') as zip_file:
+            zip_file.writestr('AndroidManifest.xml', 'manifest data')
+        with ZipFile(filename) as zip_file:
+            assert FirebasePlugin.get_resources(zip_file) == {}
+
+    def test_get_resources_invalid_table(self, tmp_path):
+        filename = str(tmp_path / 'test.apk')
+        with ZipFile(filename, 'w') as zip_file:
+            zip_file.writestr('resources.arsc', 'not a resource table')
+        with ZipFile(filename) as zip_file:
+            assert FirebasePlugin.get_resources(zip_file) == {}
+
+    def test_get_resources_package_name(self, monkeypatch):
+        calls = list()
+        monkeypatch.setattr(firebase.ArscReader, 'get_strings',
+                            lambda data, names, package_name=None: calls.append((names, package_name)) or {})
+        with ZipFile(TEST_APK) as zip_file:
+            assert FirebasePlugin.get_resources(zip_file, 'com.example') == {}
+        assert calls == [(['firebase_database_url'], 'com.example')]
+
+    def test_get_db_name(self):
+        resources = {'firebase_database_url': 'https://test-db.firebaseio.com', 'project_id': 'test'}
+        assert FirebasePlugin.get_db_name(resources) == 'test-db'
+
+    def test_get_db_name_none(self):
+        assert FirebasePlugin.get_db_name({'project_id': 'test'}) is None
+
+
 class TestFirebasePluginCheckFirebaseDb(object):
     def test_check_firebase_db_valid(self, requests_mock):
         db_name = 'test'
@@ -116,4 +159,53 @@ class TestFirebasePluginCheckBucket(object):
         db_name = 'test'
         requests_mock.head('https://storage.googleapis.com/' + db_name + '.appspot.com', status_code=301)
         message = FirebasePlugin.check_bucket(db_name)
-        assert message is None
\ No newline at end of file
+        assert message is None
+
+
+class TestFirebasePluginLocalServer(object):
+    class Context(object):
+        def __init__(self, client):
+            self.zip_file = ZipFile(TEST_APK)
+            self.online_client = client
+            self.app_info = None
+
+    @staticmethod
+    def use_local_server(monkeypatch, local_server):
+        monkeypatch.setattr(firebase, 'FIREBASE_DB_URL', local_server.url + '/{}/.json')
+        monkeypatch.setattr(firebase, 'BUCKET_URL', local_server.url + '/bucket/{}.appspot.com')
+        monkeypatch.setattr(FirebasePlugin, 'get_db_name', staticmethod(lambda resources: 'test'))
+
+    def test_checks(self, monkeypatch, local_server):
+        TestFirebasePluginLocalServer.use_local_server(monkeypatch, local_server)
+        local_server.routes['/test/.json'] = (200, 0)
+        client = OnlineClient()
+        assert FirebasePlugin.check_firebase_db('test', client) == \
+            '---- ISSUE: Unprotected Firebase DB found - ' + local_server.url + '/test/.json'
+        assert FirebasePlugin.check_bucket('test', client) is None
+        client.close()
+
+    def test_scan(self, monkeypatch, local_server, capsys):
+        TestFirebasePluginLocalServer.use_local_server(monkeypatch, local_server)
+        local_server.routes['/test/.json'] = (200, 0)
+        local_server.routes['/bucket/test.appspot.com'] = (200, 0)
+        client = OnlineClient()
+        plugin = FirebasePlugin(TestFirebasePluginLocalServer.Context(client), True, False, True)
+        plugin.scan()
+        plugin.finish()
+        output = capsys.readouterr().out
+        assert '-- Found 2 issues' in output
+        assert sorted(local_server.requests) == [('GET', '/test/.json'), ('HEAD', '/bucket/test.appspot.com')]
+        client.close()
+
+    def test_scan_timeout(self, monkeypatch, local_server, capsys):
+        TestFirebasePluginLocalServer.use_local_server(monkeypatch, local_server)
+        local_server.routes['/test/.json'] = (200, 2)
+        local_server.routes['/bucket/test.appspot.com'] = (200, 0)
+        client = OnlineClient(timeout=0.2)
+        plugin = FirebasePlugin(TestFirebasePluginLocalServer.Context(client), True, False, True)
+        plugin.scan()
+        plugin.finish()
+        output = capsys.readouterr().out
+        assert '-- ERROR: Unable to complete online check' in output
+        assert '-- Found 1 issues' in output
+        client.close()
@@ -21,6 +21,9 @@
 # specific language governing permissions and limitations
 # under the License.
 #
+import subprocess
+import sys
+
 from truegaze.plugins import ACTIVE_PLUGINS
 from truegaze.plugins.base import BasePlugin
 from truegaze.plugins.adobe_mobile_sdk import AdobeMobileSdkPlugin
@@ -32,7 +35,42 @@ from truegaze.plugins.weak_key import WeakKeyPlugin
 class TestPluginsPackage(object):
     def test_active_plugins(self):
         assert len(ACTIVE_PLUGINS) == 3
-        assert BasePlugin not in ACTIVE_PLUGINS
-        assert AdobeMobileSdkPlugin in ACTIVE_PLUGINS
-        assert FirebasePlugin in ACTIVE_PLUGINS
-        assert WeakKeyPlugin in ACTIVE_PLUGINS
+        classes = [plugin.load() for plugin in ACTIVE_PLUGINS]
+        assert BasePlugin not in classes
+        assert AdobeMobileSdkPlugin in classes
+        assert FirebasePlugin in classes
+        assert WeakKeyPlugin in classes
+
+    def test_metadata_matches_classes(self):
+        for plugin in ACTIVE_PLUGINS:
+            cls = plugin.load()
+            assert plugin.class_name == cls.__name__
+            assert plugin.name == cls.name
+            assert plugin.desc == cls.desc
+            assert plugin.version == cls.version
+            assert plugin.supports_android == cls.supports_android
+            assert plugin.supports_ios == cls.supports_ios
+            assert plugin.supports_online == cls.supports_online
+            assert [item.pattern for item in plugin.path_patterns] == [item.pattern for item in cls.path_patterns]
+            if cls.input_patterns is None:
+                assert plugin.input_patterns is None
+            else:
+                assert [item.pattern for item in plugin.input_patterns] == \
+                    [item.pattern for item in cls.input_patterns]
+            assert [item.pattern for item in plugin.required_patterns] == \
+                [item.pattern for item in cls.required_patterns]
+            assert plugin.required_content == cls.required_content
+            assert plugin.not_applicable == cls.not_applicable
+
+    def test_is_os_supported(self):
+        for plugin in ACTIVE_PLUGINS:
+            for is_android, is_ios in [(False, False), (True, False), (False, True), (True, True)]:
+                instance = plugin.load()({}, is_android, is_ios, False)
+                assert bool(plugin.is_os_supported(is_android, is_ios)) == instance.is_os_supported()
+
+    def test_lazy_imports(self):
+        code = 'import sys, truegaze.cli; print(sorted(m for m in sys.modules ' \
+               'if m.split(".")[0] in ("androguard", "roca", "jsonschema", "requests", "tldextract") ' \
+               'or m.startswith("truegaze.plugins.")))'
+        output = subprocess.check_output([sys.executable, '-c', code]).decode().strip()
+        assert output == '[]'
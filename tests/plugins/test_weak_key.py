@@ -21,8 +21,31 @@
 # specific language governing permissions and limitations
 # under the License.
 #
+import datetime
+import os
+from zipfile import ZipFile
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import dsa, utils
+from cryptography.x509.oid import NameOID
+
+from truegaze.apk_signing import ApkSigner, ApkSigningInfo
 from truegaze.plugins.weak_key import WeakKeyPlugin
 
+TEST_APK = os.path.join(os.path.dirname(__file__), '..', '..', 'test_data', 'helloworld.apk')
+
+
+def make_dsa_certificate():
+    key = dsa.generate_private_key(key_size=1024, backend=default_backend())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'test')])
+    now = datetime.datetime.utcnow()
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()) \
+        .serial_number(1).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1)) \
+        .sign(key, hashes.SHA256(), default_backend())
+    return cert.public_bytes(serialization.Encoding.DER)
+
 
 # Tests for WeakKeyPlugin
 # TODO: Add tests for click output
@@ -54,3 +77,63 @@ class TestWeakKeyPlugin(object):
         assert plugin.is_online_testing_supported() is False
 
 
+class TestWeakKeyPluginScan(object):
+    class Context(object):
+        def __init__(self, zip_file):
+            self.zip_file = zip_file
+
+        def get_matching_paths(self, pattern):
+            return [path for path in self.zip_file.namelist() if pattern.match(path)]
+
+    def test_scan(self, capsys):
+        with ZipFile(TEST_APK) as zip_file:
+            WeakKeyPlugin(TestWeakKeyPluginScan.Context(zip_file), True, False, False).scan()
+        output = capsys.readouterr().out
+        assert '-- Found 1 issues' in output
+        assert 'Key is less than 2048 bits, size is 1024 bits' in output
+
+    def test_scan_corrupt_certificate(self, monkeypatch, capsys):
+        signing_info = ApkSigningInfo([], [ApkSigner([b'\x30\x82\x01\x00'], [(0x0101, b'signature')])], [])
+        monkeypatch.setattr(ApkSigningInfo, 'read', staticmethod(lambda zip_file, paths: signing_info))
+        with ZipFile(TEST_APK) as zip_file:
+            WeakKeyPlugin(TestWeakKeyPluginScan.Context(zip_file), True, False, False).scan()
+        assert '-- Unable to read the signatures in the APK File, skipping: ' in capsys.readouterr().out
+
+
+class TestWeakKeyPluginGetRoca(object):
+    def test_built_once(self):
+        assert WeakKeyPlugin.get_roca() is WeakKeyPlugin.get_roca()
+
+
+class TestWeakKeyPluginGetCertificates(object):
+    def test_unique(self):
+        with ZipFile(TEST_APK) as zip_file:
+            certs = WeakKeyPlugin.get_certificates(ApkSigningInfo.read(zip_file))
+        assert len(certs) == 1
+        assert certs[0].public_key.algorithm == 'rsa'
+
+    def test_empty(self):
+        assert WeakKeyPlugin.get_certificates(ApkSigningInfo([], [], [])) == []
+
+
+class TestWeakKeyPluginGetSignatures(object):
+    def test_rsa_ignored(self):
+        with ZipFile(TEST_APK) as zip_file:
+            assert WeakKeyPlugin.get_signatures(ApkSigningInfo.read(zip_file)) == []
+
+    def test_dsa(self):
+        cert = make_dsa_certificate()
+        info = ApkSigningInfo([ApkSigner([cert], [(None, b'sig1')])], [ApkSigner([cert], [(0x0301, b'sig2')])], [])
+        assert WeakKeyPlugin.get_signatures(info) == [b'sig1', b'sig2']
+
+
+class TestWeakKeyPluginCheckForWeakSignatures(object):
+    def test_unique_r(self):
+        signatures = [utils.encode_dss_signature(1, 2), utils.encode_dss_signature(3, 4)]
+        assert WeakKeyPlugin.check_for_weak_signatures(signatures) == []
+
+    def test_repeated_r(self):
+        signatures = [utils.encode_dss_signature(1, 2), utils.encode_dss_signature(1, 4)]
+        messages = WeakKeyPlugin.check_for_weak_signatures(signatures)
+        assert len(messages) == 2
+        assert messages[0].startswith('---- ISSUE: DSA "r" value occurs more than once')
@@ -0,0 +1,153 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import io
+import os
+import struct
+from zipfile import ZipFile
+
+from asn1crypto import x509
+import pytest
+
+from truegaze.apk_signing import SIGNATURE_V2_ID, SIGNATURE_V3_ID, SIGNING_BLOCK_MAGIC, ApkSigningError, \
+    ApkSigningInfo
+
+TEST_APK = os.path.join(os.path.dirname(__file__), '..', 'test_data', 'helloworld.apk')
+
+# SHA-256 fingerprint of the certificate used to sign the test APK
+TEST_FINGERPRINT = '4D D3 8C C5 61 1F B7 11 4E 69 A0 98 B8 11 37 73 4F BE 3B 65 F5 90 DD DC 4F 26 66 4D E4 37 4A 8F'
+
+
+def prefixed(data):
+    return struct.pack('<I', len(data)) + data
+
+
+def make_signer(certificates, signatures, is_v3=False):
+    signed_data = prefixed(b'') + prefixed(b''.join(prefixed(cert) for cert in certificates)) + prefixed(b'')
+    signer = prefixed(signed_data)
+    if is_v3:
+        signer += struct.pack('<II', 24, 0x7fffffff)
+    signer += prefixed(b''.join(prefixed(struct.pack('<I', algorithm) + prefixed(signature))
+                                for algorithm, signature in signatures))
+    signer += prefixed(b'public key')
+    return prefixed(prefixed(signer))
+
+
+def make_apk(pairs, comment=b''):
+    # Build a ZIP with an APK Signing Block inserted right before the central directory
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w') as zip_file:
+        zip_file.writestr('AndroidManifest.xml', 'manifest data')
+    data = buffer.getvalue()
+    eocd = data.rfind(b'PK\x05\x06')
+    central_directory = struct.unpack_from('<I', data, eocd + 16)[0]
+
+    entries = b''.join(struct.pack('<QI', len(value) + 4, pair_id) + value for pair_id, value in pairs)
+    block_size = len(entries) + 24
+    block = struct.pack('<Q', block_size) + entries + struct.pack('<Q', block_size) + SIGNING_BLOCK_MAGIC
+
+    eocd_record = bytearray(data[eocd:eocd + 22])
+    struct.pack_into('<I', eocd_record, 16, central_directory + len(block))
+    struct.pack_into('<H', eocd_record, 20, len(comment))
+    data = data[:central_directory] + block + data[central_directory:eocd] + bytes(eocd_record) + comment
+    return ZipFile(io.BytesIO(data))
+
+
+def get_test_certificate():
+    with ZipFile(TEST_APK) as zip_file:
+        return ApkSigningInfo.read_v1_signers(zip_file)[0].certificates[0]
+
+
+# Tests for apk_signing.ApkSigningInfo.read()
+class TestApkSigningInfoRead(object):
+    def test_test_apk(self):
+        with ZipFile(TEST_APK) as zip_file:
+            info = ApkSigningInfo.read(zip_file)
+        assert len(info.v1_signers) == 1
+        assert len(info.v2_signers) == 1
+        assert len(info.v3_signers) == 0
+        for signer in info.signers:
+            assert [cert.sha256_fingerprint for cert in signer.get_certificates()] == [TEST_FINGERPRINT]
+            assert len(signer.signatures) == 1
+        assert info.v1_signers[0].signatures[0][0] is None
+        assert info.v2_signers[0].signatures[0][0] == 0x0103
+
+    def test_unsigned(self):
+        buffer = io.BytesIO()
+        with ZipFile(buffer, 'w') as zip_file:
+            zip_file.writestr('AndroidManifest.xml', 'manifest data')
+        info = ApkSigningInfo.read(ZipFile(buffer))
+        assert info.signers == []
+
+    def test_v1_without_sf_file(self):
+        buffer = io.BytesIO()
+        with ZipFile(TEST_APK) as source, ZipFile(buffer, 'w') as zip_file:
+            zip_file.writestr('META-INF/CERT.RSA', source.read('META-INF/CERT.RSA'))
+        assert ApkSigningInfo.read_v1_signers(ZipFile(buffer)) == []
+
+    def test_v2_and_v3(self):
+        cert = get_test_certificate()
+        zip_file = make_apk([(SIGNATURE_V2_ID, make_signer([cert], [(0x0101, b'v2 signature')])),
+                             (SIGNATURE_V3_ID, make_signer([cert, cert], [(0x0201, b'v3 signature')], True)),
+                             (0x42726577, b'\x00' * 100)])
+        info = ApkSigningInfo.read(zip_file)
+        assert info.v1_signers == []
+        assert info.v2_signers[0].certificates == [cert]
+        assert info.v2_signers[0].signatures == [(0x0101, b'v2 signature')]
+        assert info.v3_signers[0].certificates == [cert, cert]
+        assert info.v3_signers[0].signatures == [(0x0201, b'v3 signature')]
+        assert isinstance(info.v3_signers[0].get_certificates()[0], x509.Certificate)
+
+    def test_with_comment(self):
+        cert = get_test_certificate()
+        zip_file = make_apk([(SIGNATURE_V2_ID, make_signer([cert], [(0x0101, b'sig')]))],
+                            comment=b'a zip comment')
+        assert len(ApkSigningInfo.read(zip_file).v2_signers) == 1
+
+    def test_truncated_signer(self):
+        zip_file = make_apk([(SIGNATURE_V2_ID, prefixed(prefixed(b'\xff\xff\x00\x00')))])
+        with pytest.raises(ApkSigningError):
+            ApkSigningInfo.read(zip_file)
+
+    def test_truncated_signature(self):
+        signed_data = prefixed(b'') + prefixed(prefixed(get_test_certificate())) + prefixed(b'')
+        signer = prefixed(signed_data) + prefixed(prefixed(b'\x01\x01')) + prefixed(b'public key')
+        zip_file = make_apk([(SIGNATURE_V2_ID, prefixed(prefixed(signer)))])
+        with pytest.raises(ApkSigningError):
+            ApkSigningInfo.read(zip_file)
+
+
+# Tests for apk_signing.ApkSigningInfo.find_central_directory()
+class TestApkSigningInfoFindCentralDirectory(object):
+    def test_not_zip(self):
+        assert ApkSigningInfo.find_central_directory(io.BytesIO(b'foobar data')) is None
+
+    def test_empty(self):
+        assert ApkSigningInfo.find_central_directory(io.BytesIO()) is None
+
+    def test_valid(self):
+        buffer = io.BytesIO()
+        with ZipFile(buffer, 'w') as zip_file:
+            zip_file.writestr('test', 'testdata')
+        data = buffer.getvalue()
+        assert ApkSigningInfo.find_central_directory(buffer) == data.find(b'PK\x01\x02')
@@ -0,0 +1,382 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import io
+import os
+import struct
+import zipfile
+from zipfile import ZipFile
+
+import pytest
+
+from truegaze.archive import RATIO_CHECK_SIZE, ArchiveView, EntryLimitError, MappedZipFile, ZipIndex
+
+TEST_APK = os.path.join(os.path.dirname(__file__), '..', 'test_data', 'helloworld.apk')
+
+
+def make_zip(path, comment=b''):
+    with ZipFile(path, 'w') as zip_file:
+        zip_file.writestr('stored.txt', 'stored data', compress_type=zipfile.ZIP_STORED)
+        zip_file.writestr('deflated.txt', 'deflated data ' * 100, compress_type=zipfile.ZIP_DEFLATED)
+        zip_file.writestr('empty.txt', '', compress_type=zipfile.ZIP_STORED)
+        zip_file.writestr('dir/nested.json', '{}')
+        zip_file.writestr('dir/other.txt', 'other')
+        zip_file.comment = comment
+    return path
+
+
+def patch_central_directory(path, name, offset, value):
+    # Overwrite a 32-bit field in the central directory record of an entry
+    with open(path, 'rb') as file:
+        data = bytearray(file.read())
+    position = data.rfind(b'PK\x01\x02', 0, data.rfind(name.encode('utf-8')))
+    data[position + offset:position + offset + 4] = struct.pack('<I', value)
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def get_central_directory(path):
+    # Read the central directory and the number of entries from the end of central directory record
+    with open(path, 'rb') as file:
+        data = file.read()
+    eocd = data.rfind(b'PK\x05\x06')
+    count, size, offset = struct.unpack_from('<HII', data, eocd + 10)
+    return data[offset:offset + size], count
+
+
+# Tests for archive.ZipIndex
+class TestZipIndex(object):
+    def test_parse(self, tmpdir):
+        index = ZipIndex.parse(*get_central_directory(make_zip(str(tmpdir.join('test.zip')))))
+        assert len(index) == 5
+        assert index.get_name(1) == 'deflated.txt'
+        assert index.file_sizes[1] == len('deflated data ' * 100)
+        assert index.find('dir/nested.json') == 3
+        assert index.find('dir/nested') is None
+        assert list(index.find_prefix('dir/')) == [3, 4]
+        assert list(index.find_prefix('dir/o')) == [4]
+        assert list(index.find_extension('.json')) == [3]
+
+    def test_parse_truncated(self, tmpdir):
+        data, count = get_central_directory(make_zip(str(tmpdir.join('test.zip'))))
+        with pytest.raises(zipfile.BadZipFile):
+            ZipIndex.parse(data[:-10], count)
+
+    def test_empty(self):
+        index = ZipIndex()
+        assert len(index) == 0
+        assert index.find('test.txt') is None
+        assert list(index.find_prefix('')) == []
+
+    def test_names(self, tmpdir):
+        with MappedZipFile(make_zip(str(tmpdir.join('test.zip')))) as zip_file:
+            assert len(zip_file.index) == 5
+            assert list(zip_file.index.iter_names()) == \
+                ['stored.txt', 'deflated.txt', 'empty.txt', 'dir/nested.json', 'dir/other.txt']
+
+    def test_find(self, tmpdir):
+        with MappedZipFile(make_zip(str(tmpdir.join('test.zip')))) as zip_file:
+            assert zip_file.index.find('stored.txt') == 0
+            assert zip_file.index.find('dir/other.txt') == 4
+            assert zip_file.index.find('other.txt') is None
+            assert zip_file.index.find('dir/') is None
+
+    def test_find_duplicate(self):
+        buffer = io.BytesIO()
+        with pytest.warns(UserWarning):
+            with ZipFile(buffer, 'w') as zip_file:
+                zip_file.writestr('test.txt', 'first')
+                zip_file.writestr('test.txt', 'second')
+        with MappedZipFile(buffer) as zip_file:
+            assert zip_file.index.find('test.txt') == 1
+            assert zip_file.read('test.txt') == b'second'
+
+    def test_find_prefix(self, tmpdir):
+        with MappedZipFile(make_zip(str(tmpdir.join('test.zip')))) as zip_file:
+            assert list(zip_file.index.find_prefix('dir/')) == [3, 4]
+            assert list(zip_file.index.find_prefix('missing/')) == []
+            assert list(zip_file.index.find_prefix('')) == [0, 1, 2, 3, 4]
+
+    def test_find_extension(self, tmpdir):
+        with MappedZipFile(make_zip(str(tmpdir.join('test.zip')))) as zip_file:
+            assert list(zip_file.index.find_extension('.txt')) == [0, 1, 2, 4]
+            assert list(zip_file.index.find_extension('.json')) == [3]
+            assert list(zip_file.index.find_extension('.doc')) == []
+
+    def test_legacy_encoding(self):
+        buffer = io.BytesIO()
+        with ZipFile(buffer, 'w') as zip_file:
+            zip_file.writestr('tést.txt', 'data')
+        with MappedZipFile(buffer) as zip_file:
+            assert zip_file.namelist() == ['tést.txt']
+            assert zip_file.read('tést.txt') == b'data'
+
+    def test_null_in_name(self, tmpdir):
+        path = make_zip(str(tmpdir.join('test.zip')))
+        with open(path, 'rb') as file:
+            data = bytearray(file.read())
+        position = data.rfind(b'dir/nested.json')
+        data[position:position + 15] = b'dir/n\x00sted.json'
+        with open(path, 'wb') as file:
+            file.write(data)
+        with MappedZipFile(path) as zip_file, ZipFile(path) as expected:
+            assert zip_file.namelist() == expected.namelist()
+            assert zip_file.index.get_name(3) == 'dir/n'
+            assert zip_file.index.find('dir/n') == 3
+            assert zip_file.index.find('dir/other.txt') == 4
+
+    def test_matches_zipfile(self):
+        with MappedZipFile(TEST_APK) as zip_file, ZipFile(TEST_APK) as expected:
+            assert zip_file.namelist() == expected.namelist()
+            for info in zip_file.infolist():
+                expected_info = expected.getinfo(info.filename)
+                for field in ['date_time', 'compress_type', 'flag_bits', 'CRC', 'compress_size', 'file_size',
+                              'header_offset', 'external_attr']:
+                    assert getattr(info, field) == getattr(expected_info, field)
+
+    def test_zip64(self):
+        buffer = io.BytesIO()
+        with ZipFile(buffer, 'w', allowZip64=True) as zip_file:
+            with zip_file.open('large.txt', 'w', force_zip64=True) as file:
+                file.write(b'data')
+        with MappedZipFile(buffer) as zip_file:
+            assert zip_file.read('large.txt') == b'data'
+
+    def test_prepended_data(self, tmpdir):
+        buffer = io.BytesIO()
+        make_zip(buffer)
+        path = tmpdir.join('test.zip')
+        path.write_binary(b'prepended data' + buffer.getvalue())
+        with MappedZipFile(str(path)) as zip_file:
+            assert zip_file.read('dir/other.txt') == b'other'
+
+
+# Tests for archive.MappedZipFile
+class TestMappedZipFile(object):
+    def test_getinfo(self, tmpdir):
+        with MappedZipFile(make_zip(str(tmpdir.join('test.zip')))) as zip_file:
+            info = zip_file.getinfo('deflated.txt')
+            assert info.filename == 'deflated.txt'
+            assert info.file_size == 1400
+            assert info.compress_type == zipfile.ZIP_DEFLATED
+
+    def test_getinfo_missing(self, tmpdir):
+        with MappedZipFile(make_zip(str(tmpdir.join('test.zip')))) as zip_file:
+            with pytest.raises(KeyError):
+                zip_file.getinfo('missing.txt')
+
+    def test_comment_with_signature(self, tmpdir):
+        path = make_zip(str(tmpdir.join('test.zip')), comment=b'PK\x05\x06' + b'\x00' * 30)
+        with MappedZipFile(path) as zip_file:
+            assert len(zip_file.index) == 5
+
+    def test_invalid(self, tmpdir):
+        path = tmpdir.join('test.zip')
+        path.write('not a zip file')
+        with pytest.raises(zipfile.BadZipFile):
+            MappedZipFile(str(path))
+
+    def test_invalid_empty(self, tmpdir):
+        path = tmpdir.join('test.zip')
+        path.write('')
+        with pytest.raises(zipfile.BadZipFile):
+            MappedZipFile(str(path))
+
+    def test_invalid_central_directory(self, tmpdir):
+        path = make_zip(str(tmpdir.join('test.zip')))
+        patch_central_directory(path, 'dir/other.txt', 0, 0)
+        with pytest.raises(zipfile.BadZipFile):
+            MappedZipFile(path)
+
+    def test_close(self, tmpdir):
+        zip_file = MappedZipFile(make_zip(str(tmpdir.join('test.zip'))))
+        zip_file.close()
+        assert not zip_file.is_mapped
+        assert zip_file.fp is None
+
+    def test_close_with_view(self, tmpdir):
+        zip_file = MappedZipFile(make_zip(str(tmpdir.join('test.zip'))))
+        view = zip_file.read_view('stored.txt')
+        zip_file.close()
+        assert not zip_file.is_mapped
+        assert view == b'stored data'
+
+    def test_close_file_object(self):
+        buffer = io.BytesIO()
+        make_zip(buffer)
+        MappedZipFile(buffer).close()
+        assert not buffer.closed
+
+
+# Tests for archive.MappedZipFile.read_view() and archive.MappedZipFile.read()
+class TestMappedZipFileRead(object):
+    def test_stored(self, tmpdir):
+        with MappedZipFile(make_zip(str(tmpdir.join('test.zip')))) as zip_file:
+            assert zip_file.is_mapped
+            view = zip_file.read_view('stored.txt')
+            assert isinstance(view, memoryview)
+            assert view == b'stored data'
+            view.release()
+            assert zip_file.read('stored.txt') == b'stored data'
+
+    def test_stored_empty(self, tmpdir):
+        with MappedZipFile(make_zip(str(tmpdir.join('test.zip')))) as zip_file:
+            assert zip_file.read_view('empty.txt') == b''
+
+    def test_deflated(self, tmpdir):
+        with MappedZipFile(make_zip(str(tmpdir.join('test.zip')))) as zip_file:
+            data = zip_file.read_view('deflated.txt')
+            assert isinstance(data, bytes)
+            assert data == b'deflated data ' * 100
+
+    def test_zip_info(self, tmpdir):
+        with MappedZipFile(make_zip(str(tmpdir.join('test.zip')))) as zip_file:
+            assert zip_file.read_view(zip_file.getinfo('stored.txt')) == b'stored data'
+
+    def test_missing(self, tmpdir):
+        with MappedZipFile(make_zip(str(tmpdir.join('test.zip')))) as zip_file:
+            with pytest.raises(KeyError):
+                zip_file.read_view('missing.txt')
+
+    def test_matches_zipfile(self):
+        with MappedZipFile(TEST_APK) as zip_file, ZipFile(TEST_APK) as expected:
+            for name in expected.namelist():
+                assert zip_file.read_view(name) == expected.read(name)
+                assert zip_file.read(name) == expected.read(name)
+
+    def test_bad_crc(self, tmpdir):
+        path = make_zip(str(tmpdir.join('test.zip')))
+        patch_central_directory(path, 'deflated.txt', 16, 0)
+        patch_central_directory(path, 'stored.txt', 16, 0)
+        with MappedZipFile(path) as zip_file:
+            with pytest.raises(zipfile.BadZipFile):
+                zip_file.read_view('deflated.txt')
+            assert zip_file.read_view('stored.txt') == b'stored data'
+            with pytest.raises(zipfile.BadZipFile):
+                zip_file.read('stored.txt')
+
+    def test_bad_local_header(self, tmpdir):
+        path = make_zip(str(tmpdir.join('test.zip')))
+        patch_central_directory(path, 'stored.txt', 42, 1)
+        with MappedZipFile(path) as zip_file:
+            with pytest.raises(zipfile.BadZipFile):
+                zip_file.read_view('stored.txt')
+
+    def test_not_mapped(self):
+        buffer = io.BytesIO()
+        make_zip(buffer)
+        with MappedZipFile(buffer) as zip_file:
+            assert not zip_file.is_mapped
+            assert zip_file.read_view('stored.txt') == b'stored data'
+            assert zip_file.read('deflated.txt') == b'deflated data ' * 100
+
+
+# Tests for archive.MappedZipFile.iter_entry() and the read limits
+class TestMappedZipFileLimits(object):
+    @staticmethod
+    def make_bomb(path, size=RATIO_CHECK_SIZE * 4):
+        with ZipFile(path, 'w') as zip_file:
+            zip_file.writestr('bomb.txt', b'\x00' * size, compress_type=zipfile.ZIP_DEFLATED)
+            zip_file.writestr('stored.txt', b'stored data' * 1000, compress_type=zipfile.ZIP_STORED)
+        return path
+
+    def test_iter_entry_chunks(self, tmpdir):
+        path = TestMappedZipFileLimits.make_bomb(str(tmpdir.join('test.zip')))
+        with MappedZipFile(path, max_ratio=None) as zip_file:
+            chunks = list(zip_file.iter_entry('bomb.txt', chunk_size=1024))
+            assert max(len(chunk) for chunk in chunks) <= 1024
+            assert b''.join(chunks) == b'\x00' * RATIO_CHECK_SIZE * 4
+
+    def test_no_limits(self, tmpdir):
+        path = TestMappedZipFileLimits.make_bomb(str(tmpdir.join('test.zip')))
+        with MappedZipFile(path, max_entry_size=None, max_ratio=None) as zip_file:
+            assert len(zip_file.read('bomb.txt')) == RATIO_CHECK_SIZE * 4
+
+    def test_ratio(self, tmpdir):
+        path = TestMappedZipFileLimits.make_bomb(str(tmpdir.join('test.zip')))
+        with MappedZipFile(path) as zip_file:
+            with pytest.raises(EntryLimitError) as error:
+                zip_file.read('bomb.txt')
+            assert error.value.name == 'bomb.txt'
+            assert 'compression ratio' in str(error.value)
+
+    def test_ratio_small_files(self, tmpdir):
+        path = TestMappedZipFileLimits.make_bomb(str(tmpdir.join('test.zip')), RATIO_CHECK_SIZE)
+        with MappedZipFile(path) as zip_file:
+            assert len(zip_file.read('bomb.txt')) == RATIO_CHECK_SIZE
+
+    def test_size(self, tmpdir):
+        path = TestMappedZipFileLimits.make_bomb(str(tmpdir.join('test.zip')))
+        with MappedZipFile(path, max_entry_size=1000, max_ratio=None) as zip_file:
+            with pytest.raises(EntryLimitError) as error:
+                zip_file.read_view('stored.txt')
+            assert 'larger than the limit of 1000 bytes' in str(error.value)
+
+    def test_size_while_streaming(self, tmpdir):
+        # The size in the central directory can't be trusted, so the limit is also checked while decompressing
+        path = TestMappedZipFileLimits.make_bomb(str(tmpdir.join('test.zip')))
+        patch_central_directory(path, 'bomb.txt', 24, 10)
+        with MappedZipFile(path, max_entry_size=RATIO_CHECK_SIZE, max_ratio=None) as zip_file:
+            chunks = zip_file.iter_entry('bomb.txt')
+            with pytest.raises(EntryLimitError):
+                for chunk in chunks:
+                    assert len(chunk) <= RATIO_CHECK_SIZE
+
+    def test_stored_size_mismatch(self, tmpdir):
+        # A STORED entry claiming to be small can't be used to read a large compressed size past the limit
+        path = TestMappedZipFileLimits.make_bomb(str(tmpdir.join('test.zip')))
+        patch_central_directory(path, 'stored.txt', 24, 10)
+        with MappedZipFile(path, max_entry_size=1000, max_ratio=None) as zip_file:
+            with pytest.raises(zipfile.BadZipFile):
+                zip_file.read_view('stored.txt')
+            with pytest.raises(zipfile.BadZipFile):
+                zip_file.read('stored.txt')
+
+
+# Tests for archive.ArchiveView
+class TestArchiveView(object):
+    def test_read_and_seek(self):
+        view = ArchiveView(b'0123456789', 'test')
+        assert view.read(3) == b'012'
+        assert view.tell() == 3
+        view.seek(-2, io.SEEK_END)
+        assert view.read() == b'89'
+        assert view.read(5) == b''
+        view.seek(-4, io.SEEK_CUR)
+        assert view.read(2) == b'67'
+        assert view.name == 'test'
+
+    def test_negative_seek(self):
+        with pytest.raises(ValueError):
+            ArchiveView(b'data').seek(-1)
+
+    def test_open_archive(self):
+        with open(TEST_APK, 'rb') as file:
+            data = file.read()
+        with MappedZipFile(ArchiveView(memoryview(data))) as zip_file:
+            assert zip_file.is_mapped
+            assert zip_file.read_at(0, 4) == b'PK\x03\x04'
+            assert isinstance(zip_file.read_view('resources.arsc'), memoryview)
+            assert zip_file.read('AndroidManifest.xml') == ZipFile(TEST_APK).read('AndroidManifest.xml')
+            view = zip_file.fp
+        assert view.closed
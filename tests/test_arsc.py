@@ -0,0 +1,203 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import os
+import struct
+from zipfile import ZipFile
+
+import pytest
+
+from truegaze.arsc import ArscError, ArscReader, ArscStringPool
+
+TEST_APK = os.path.join(os.path.dirname(__file__), '..', 'test_data', 'helloworld.apk')
+
+
+def pad(data):
+    return data + b'\x00' * (-len(data) % 4)
+
+
+def make_string_pool(strings, utf8=True):
+    data = b''
+    offsets = list()
+    for string in strings:
+        offsets.append(len(data))
+        if utf8:
+            encoded = string.encode('utf-8')
+            data += struct.pack('<BB', len(string), len(encoded)) + encoded + b'\x00'
+        else:
+            data += struct.pack('<H', len(string)) + string.encode('utf-16-le') + b'\x00\x00'
+    data = pad(data)
+    header_size = 28
+    strings_start = header_size + len(strings) * 4
+    header = struct.pack('<HHIIIIII', 0x0001, header_size, strings_start + len(data), len(strings), 0,
+                         0x100 if utf8 else 0, strings_start, 0)
+    return header + struct.pack('<' + str(len(strings)) + 'I', *offsets) + data
+
+
+def make_type(type_id, entries, language=b'\x00\x00'):
+    # Entries are (key index, value type, value) tuples, None for missing entries and a key index alone
+    # for complex entries
+    data = b''
+    offsets = list()
+    for entry in entries:
+        if entry is None:
+            offsets.append(0xFFFFFFFF)
+            continue
+        offsets.append(len(data))
+        if isinstance(entry, int):
+            data += struct.pack('<HHIII', 16, 0x0001, entry, 0, 0)
+        else:
+            key, value_type, value = entry
+            data += struct.pack('<HHIHBBI', 8, 0, key, 8, 0, value_type, value)
+    config = struct.pack('<IHH', 28, 0, 0) + language + b'\x00' * 18
+    header_size = 20 + len(config)
+    entries_start = header_size + len(entries) * 4
+    return struct.pack('<HHIBBHII', 0x0201, header_size, entries_start + len(data), type_id, 0, 0,
+                       len(entries), entries_start) + config + \
+        struct.pack('<' + str(len(entries)) + 'I', *offsets) + data
+
+
+def make_package(name, types, keys, chunks):
+    type_strings = make_string_pool(types, utf8=False)
+    key_strings = make_string_pool(keys)
+    header_size = 288
+    body = type_strings + key_strings + b''.join(chunks)
+    header = struct.pack('<HHII', 0x0200, header_size, header_size + len(body), 0x7f) + \
+        pad(name.encode('utf-16-le')).ljust(256, b'\x00') + \
+        struct.pack('<IIIII', header_size, len(types), header_size + len(type_strings), len(keys), 0)
+    return header + body
+
+
+def make_table(strings, packages):
+    body = make_string_pool(strings) + b''.join(packages)
+    return struct.pack('<HHII', 0x0002, 12, 12 + len(body), len(packages)) + body
+
+
+def make_test_table():
+    strings = ['https://test.firebaseio.com', 'test', 'https://test-fr.firebaseio.com', 'Hello']
+    keys = ['app_name', 'firebase_database_url', 'project_id', 'google_api_key', 'style']
+    chunks = [
+        make_type(1, [4]),
+        make_type(2, [(0, 0x03, 3), (1, 0x03, 0), (2, 0x03, 1), (3, 0x10, 5)]),
+        make_type(2, [None, (1, 0x03, 2), None, None], language=b'fr'),
+    ]
+    return make_table(strings, [make_package('com.example', ['style', 'string'], keys, chunks)])
+
+
+# Tests for ArscStringPool
+class TestArscStringPool(object):
+    def test_get_utf8(self):
+        pool = ArscStringPool(make_string_pool(['first', 'sécond']), 0)
+        assert pool.count == 2
+        assert pool.get(0) == 'first'
+        assert pool.get(1) == 'sécond'
+        assert pool.get(2) is None
+
+    def test_get_utf16(self):
+        pool = ArscStringPool(make_string_pool(['first', 'sécond'], utf8=False), 0)
+        assert pool.get(0) == 'first'
+        assert pool.get(1) == 'sécond'
+
+    def test_find(self):
+        pool = ArscStringPool(make_string_pool(['first', 'second', 'third'], utf8=False), 0)
+        assert pool.find(['third', 'first', 'missing']) == {0: 'first', 2: 'third'}
+
+    def test_not_a_pool(self):
+        with pytest.raises(ArscError):
+            ArscStringPool(make_type(1, []), 0)
+
+    def test_truncated(self):
+        with pytest.raises(ArscError):
+            ArscStringPool(make_string_pool(['first', 'second'])[:-8], 0)
+
+    def test_out_of_range(self):
+        data = bytearray(make_string_pool(['first', 'second']))
+        struct.pack_into('<I', data, 32, 0xFFFF)
+        pool = ArscStringPool(bytes(data), 0)
+        assert pool.get(0) == 'first'
+        with pytest.raises(ArscError):
+            pool.get(1)
+        with pytest.raises(ArscError):
+            pool.get_raw(5)
+
+
+# Tests for ArscReader.get_strings()
+class TestArscReaderGetStrings(object):
+    def test_default_config(self):
+        values = ArscReader.get_strings(make_test_table(), ['firebase_database_url', 'project_id'])
+        assert values == {'firebase_database_url': 'https://test.firebaseio.com', 'project_id': 'test'}
+
+    def test_skips_non_string_values(self):
+        assert ArscReader.get_strings(make_test_table(), ['google_api_key']) == {}
+
+    def test_skips_other_types(self):
+        assert ArscReader.get_strings(make_test_table(), ['style']) == {}
+
+    def test_missing(self):
+        assert ArscReader.get_strings(make_test_table(), ['google_storage_bucket']) == {}
+
+    def test_package_name(self):
+        table = make_test_table()
+        assert ArscReader.get_strings(table, ['project_id'], 'com.example') == {'project_id': 'test'}
+        assert ArscReader.get_strings(table, ['project_id'], 'com.other') == {}
+
+    def test_memoryview(self):
+        assert ArscReader.get_strings(memoryview(make_test_table()), ['project_id']) == {'project_id': 'test'}
+
+    def test_not_a_table(self):
+        with pytest.raises(ArscError):
+            ArscReader.get_strings(make_string_pool(['test']), ['test'])
+
+    def test_truncated(self):
+        with pytest.raises(ArscError):
+            ArscReader.get_strings(make_test_table()[:-10], ['project_id'])
+
+    def test_corrupted_key_pool_offset(self):
+        table = bytearray(make_test_table())
+        package = 12 + len(make_string_pool(['https://test.firebaseio.com', 'test', 'https://test-fr.firebaseio.com',
+                                             'Hello']))
+        for offset in [0xFFFFFF00, 20, 284]:
+            struct.pack_into('<I', table, package + 276, offset)
+            with pytest.raises(ArscError):
+                ArscReader.get_strings(bytes(table), ['project_id'])
+
+    def test_corrupted(self):
+        # Any corrupted word either still parses or raises ArscError, never anything else
+        table = make_test_table()
+        for position in range(0, len(table) - 3):
+            for value in [b'\xff\xff\xff\xff', b'\x00\x00\x00\x00', b'\x7f\x00\x00\x00']:
+                corrupted = table[:position] + value + table[position + 4:]
+                try:
+                    ArscReader.get_strings(corrupted, ['firebase_database_url', 'project_id'])
+                except ArscError:
+                    pass
+
+    def test_matches_androguard(self):
+        from androguard.core.bytecodes.apk import APK
+        apk = APK(TEST_APK)
+        resources = apk.get_android_resources()
+        names = ['app_name', 'abc_action_mode_done', 'search_menu_title', 'status_bar_notification_info_overflow']
+        with ZipFile(TEST_APK) as zip_file:
+            values = ArscReader.get_strings(zip_file.read('resources.arsc'), names)
+        for name in names:
+            assert values[name] == resources.get_string(apk.package, name)[1]
@@ -0,0 +1,129 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import os
+import struct
+from zipfile import ZipFile
+
+import pytest
+
+from truegaze.axml import MIN_SDK_VERSION_ID, VERSION_CODE_ID, VERSION_NAME_ID, AxmlError, AxmlReader
+
+TEST_APK = os.path.join(os.path.dirname(__file__), '..', 'test_data', 'helloworld.apk')
+
+
+def make_string_pool(strings):
+    data = b''
+    offsets = list()
+    for string in strings:
+        offsets.append(len(data))
+        data += struct.pack('<H', len(string)) + string.encode('utf-16-le') + b'\x00\x00'
+    data += b'\x00' * (-len(data) % 4)
+    strings_start = 28 + len(strings) * 4
+    return struct.pack('<HHIIIIII', 0x0001, 28, strings_start + len(data), len(strings), 0, 0, strings_start, 0) + \
+        struct.pack('<' + str(len(strings)) + 'I', *offsets) + data
+
+
+def make_element(name, attributes):
+    # Attributes are (name index, value type, value) tuples, string values also set the raw value
+    data = b''
+    for attribute, value_type, value in attributes:
+        raw_value = value if value_type == 0x03 else 0xFFFFFFFF
+        data += struct.pack('<IIIHBBI', 0xFFFFFFFF, attribute, raw_value, 8, 0, value_type, value)
+    return struct.pack('<HHIII', 0x0102, 16, 36 + len(data), 1, 0xFFFFFFFF) + \
+        struct.pack('<IIHHHHHH', 0xFFFFFFFF, name, 20, 20, len(attributes), 0, 0, 0) + data
+
+
+def make_document(strings, resource_ids, elements):
+    resource_map = struct.pack('<HHI', 0x0180, 8, 8 + len(resource_ids) * 4) + \
+        struct.pack('<' + str(len(resource_ids)) + 'I', *resource_ids)
+    body = make_string_pool(strings) + resource_map + b''.join(elements)
+    return struct.pack('<HHI', 0x0003, 8, 8 + len(body)) + body
+
+
+def make_test_manifest():
+    # Names of the android: attributes are stripped, they are only known by their resource IDs
+    strings = ['', '', '', 'package', 'manifest', 'uses-sdk', 'com.example', '2.0', 'application']
+    return make_document(strings, [VERSION_CODE_ID, VERSION_NAME_ID, MIN_SDK_VERSION_ID], [
+        make_element(4, [(1, 0x03, 7), (0, 0x10, 20), (3, 0x03, 6)]),
+        make_element(5, [(2, 0x10, 21)]),
+        make_element(8, []),
+    ])
+
+
+# Tests for AxmlReader
+class TestAxmlReader(object):
+    def test_get_manifest_info(self):
+        assert AxmlReader.get_manifest_info(make_test_manifest()) == \
+            dict(package='com.example', version_code=20, version_name='2.0', min_sdk=21)
+
+    def test_memoryview(self):
+        assert AxmlReader.get_manifest_info(memoryview(make_test_manifest()))['package'] == 'com.example'
+
+    def test_no_uses_sdk(self):
+        data = make_document(['package', 'manifest', 'com.example'], [], [make_element(1, [(0, 0x03, 2)])])
+        assert AxmlReader.get_manifest_info(data) == \
+            dict(package='com.example', version_code=None, version_name=None, min_sdk=None)
+
+    def test_reference_value(self):
+        strings = ['', 'manifest']
+        data = make_document(strings, [VERSION_NAME_ID], [make_element(1, [(0, 0x01, 0x7F010000)])])
+        assert AxmlReader.get_manifest_info(data)['version_name'] is None
+
+    def test_stops_at_uses_sdk(self):
+        # The element after <uses-sdk> is malformed, but never read
+        malformed = struct.pack('<HHIII', 0x0102, 16, 36, 1, 0xFFFFFFFF) + \
+            struct.pack('<IIHHHHHH', 0xFFFFFFFF, 2, 20, 0, 1, 0, 0, 0)
+        data = make_document(['manifest', 'uses-sdk', 'application'], [],
+                             [make_element(0, []), make_element(1, []), malformed])
+        assert AxmlReader.get_manifest_info(data)['package'] is None
+        with pytest.raises(AxmlError):
+            AxmlReader.get_manifest_info(make_document(['manifest', 'uses-sdk', 'application'], [],
+                                                       [make_element(0, []), malformed]))
+
+    def test_helloworld(self):
+        with ZipFile(TEST_APK) as zip_file:
+            data = zip_file.read('AndroidManifest.xml')
+        assert AxmlReader.get_manifest_info(data) == \
+            dict(package='opensecurity.helloworld', version_code=1, version_name='1.0', min_sdk=16)
+
+    def test_not_xml(self):
+        with pytest.raises(AxmlError):
+            AxmlReader.get_manifest_info(b'manifest data')
+        with pytest.raises(AxmlError):
+            AxmlReader.get_manifest_info(struct.pack('<HHI', 0x0002, 8, 8))
+
+    def test_wrong_root(self):
+        data = make_document(['resources'], [], [make_element(0, [])])
+        with pytest.raises(AxmlError):
+            AxmlReader.get_manifest_info(data)
+
+    def test_no_elements(self):
+        with pytest.raises(AxmlError):
+            AxmlReader.get_manifest_info(make_document(['manifest'], [], []))
+
+    def test_truncated(self):
+        data = make_test_manifest()
+        for size in [4, 40, len(data) // 2]:
+            with pytest.raises(AxmlError):
+                AxmlReader.get_manifest_info(data[:size])
@@ -0,0 +1,177 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import os
+import pickle
+import sqlite3
+import time
+
+from truegaze.cache import CACHE_FILENAME, MemoryCache, ProbeCache, ResultCache
+
+
+# Tests for cache.ResultCache
+class TestResultCache(object):
+    def test_default_dir_env(self, monkeypatch):
+        monkeypatch.setenv('TRUEGAZE_CACHE_DIR', '/tmp/some/dir')
+        assert ResultCache.get_default_dir() == '/tmp/some/dir'
+
+    def test_default_dir_xdg(self, monkeypatch):
+        monkeypatch.delenv('TRUEGAZE_CACHE_DIR', raising=False)
+        monkeypatch.setenv('XDG_CACHE_HOME', '/tmp/xdg')
+        assert ResultCache.get_default_dir() == os.path.join('/tmp/xdg', 'truegaze')
+
+    def test_make_key(self):
+        key1 = ResultCache.make_key('abcd', 'Plugin', '1.0', '0.1.7', False)
+        key2 = ResultCache.make_key('abcd', 'Plugin', '1.0', '0.1.7', True)
+        key3 = ResultCache.make_key('abcd', 'Plugin', '1.1', '0.1.7', False)
+        key4 = ResultCache.make_key('abcd', 'Plugin', '1.0', '0.1.7', False, 'limits=1:2')
+        assert len({key1, key2, key3, key4}) == 4
+        assert ResultCache.make_key('abcd', 'Plugin', '1.0', '0.1.7', False, None) == key1
+
+    def test_get_missing(self, tmpdir):
+        cache = ResultCache(str(tmpdir))
+        assert cache.get('missing') is None
+
+    def test_put_get(self, tmpdir):
+        cache = ResultCache(str(tmpdir))
+        cache.put('key', 'value')
+        assert cache.get('key') == 'value'
+        cache.put('key', 'value2')
+        assert cache.get('key') == 'value2'
+
+    def test_persistent(self, tmpdir):
+        cache = ResultCache(str(tmpdir))
+        cache.put('key', 'value')
+        cache.close()
+        assert ResultCache(str(tmpdir)).get('key') == 'value'
+
+    def test_refresh(self, tmpdir):
+        ResultCache(str(tmpdir)).put('key', 'value')
+        cache = ResultCache(str(tmpdir), refresh=True)
+        assert cache.get('key') is None
+        cache.put('key', 'value2')
+        assert ResultCache(str(tmpdir)).get('key') == 'value2'
+
+    def test_eviction(self, tmpdir):
+        cache = ResultCache(str(tmpdir), max_size=30)
+        cache.put('key1', 'a' * 10)
+        cache.put('key2', 'b' * 10)
+        cache.get('key1')
+        cache.put('key3', 'c' * 10)
+        assert cache.get('key1') is not None
+        assert cache.get('key2') is None
+        assert cache.get('key3') is not None
+
+    def test_total_size(self, tmpdir):
+        cache = ResultCache(str(tmpdir))
+        cache.put('key1', 'a' * 10)
+        cache.put('key2', 'b' * 10)
+        cache.put('key1', 'c' * 20)
+        cache._connect().execute('DELETE FROM results WHERE key = ?', ('key2',))
+        assert cache._connect().execute('SELECT total FROM results_size').fetchone()[0] == 24
+
+    def test_total_size_existing(self, tmpdir):
+        # Caches created before the total size was kept get it on the first connection
+        connection = sqlite3.connect(str(tmpdir.join(CACHE_FILENAME)))
+        with connection:
+            connection.execute('CREATE TABLE results (key TEXT PRIMARY KEY, value TEXT, size INTEGER, accessed REAL)')
+            connection.execute("INSERT INTO results VALUES ('key1', 'value', 9, 0)")
+        connection.close()
+        cache = ResultCache(str(tmpdir), max_size=20)
+        cache.put('key2', 'a' * 10)
+        assert cache.get('key1') is None
+        assert cache.get('key2') is not None
+
+    def test_pickle(self, tmpdir):
+        cache = ResultCache(str(tmpdir))
+        cache.put('key', 'value')
+        copy = pickle.loads(pickle.dumps(cache))
+        assert copy.get('key') == 'value'
+
+
+# Tests for cache.MemoryCache
+class TestMemoryCache(object):
+    def test_get_put(self):
+        cache = MemoryCache()
+        assert cache.get('key') is None
+        cache.put('key', 'value')
+        assert cache.get('key') == 'value'
+
+    def test_evict(self):
+        cache = MemoryCache(max_entries=2)
+        cache.put('first', '1')
+        cache.put('second', '2')
+        assert cache.get('first') == '1'
+        cache.put('third', '3')
+        assert len(cache) == 2
+        assert cache.get('second') is None
+        assert cache.get('first') == '1'
+        assert cache.get('third') == '3'
+
+    def test_clear(self):
+        cache = MemoryCache()
+        cache.put('key', 'value')
+        cache.clear()
+        assert len(cache) == 0
+
+
+# Tests for cache.ProbeCache
+class TestProbeCache(object):
+    def test_get_missing(self, tmpdir):
+        assert ProbeCache(str(tmpdir)).get('missing') is None
+
+    def test_put_get(self, tmpdir):
+        cache = ProbeCache(str(tmpdir))
+        cache.put('key1', 'message')
+        cache.put('key2', None)
+        cache.put('key3', error='timed out')
+        assert cache.get('key1') == ('message', None)
+        assert cache.get('key2') == (None, None)
+        assert cache.get('key3') == (None, 'timed out')
+
+    def test_shared_with_results(self, tmpdir):
+        ProbeCache(str(tmpdir)).put('key', 'message')
+        ResultCache(str(tmpdir)).put('key', 'value')
+        assert ProbeCache(str(tmpdir)).get('key') == ('message', None)
+        assert ResultCache(str(tmpdir)).get('key') == 'value'
+
+    def test_ttl(self, tmpdir, monkeypatch):
+        cache = ProbeCache(str(tmpdir), ttl=100, error_ttl=10)
+        cache.put('key1', 'message')
+        cache.put('key2', error='timed out')
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now + 50)
+        assert cache.get('key1') == ('message', None)
+        assert cache.get('key2') is None
+        monkeypatch.setattr(time, 'time', lambda: now + 150)
+        assert cache.get('key1') is None
+
+    def test_refresh(self, tmpdir):
+        ProbeCache(str(tmpdir)).put('key', 'message')
+        assert ProbeCache(str(tmpdir), refresh=True).get('key') is None
+
+    def test_pickle(self, tmpdir):
+        cache = ProbeCache(str(tmpdir))
+        cache.put('key', 'message')
+        copy = pickle.loads(pickle.dumps(cache))
+        assert copy.get('key') == ('message', None)
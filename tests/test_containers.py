@@ -0,0 +1,160 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import io
+import json
+import os
+import plistlib
+import zipfile
+
+import pytest
+
+from truegaze.archive import EntryLimitError, MappedZipFile
+from truegaze.containers import TruegazeContainers
+from truegaze.context import ScanContext
+from truegaze.scanner import STATUS_OK, TruegazeScanner
+
+TEST_APK = os.path.join(os.path.dirname(__file__), '..', 'test_data', 'helloworld.apk')
+
+
+def make_bundle(entries, compression=zipfile.ZIP_STORED):
+    # Entries are (name, data) tuples, with None as the data for a copy of the test APK
+    with open(TEST_APK, 'rb') as file:
+        apk = file.read()
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as zip_file:
+        for name, data in entries:
+            zip_file.writestr(name, apk if data is None else data)
+    return buffer
+
+
+def open_bundle(entries, compression=zipfile.ZIP_STORED, **kwargs):
+    return MappedZipFile(make_bundle(entries, compression), **kwargs)
+
+
+# Tests for containers.TruegazeContainers.find_base_apk()
+class TestContainersFindBaseApk(object):
+    def test_not_a_bundle(self):
+        assert TruegazeContainers.find_base_apk(MappedZipFile(TEST_APK)) is None
+
+    def test_apks(self):
+        zip_file = open_bundle([('toc.pb', b''), ('splits/base-xxhdpi.apk', None), ('splits/base-master.apk', None)])
+        assert TruegazeContainers.find_base_apk(zip_file) == 'splits/base-master.apk'
+
+    def test_xapk(self):
+        manifest = dict(package_name='com.example', split_apks=[dict(file='config.en.apk', id='config.en'),
+                                                                dict(file='main.apk', id='base')])
+        zip_file = open_bundle([('manifest.json', json.dumps(manifest)), ('config.en.apk', None),
+                                ('main.apk', None)])
+        assert TruegazeContainers.find_base_apk(zip_file) == 'main.apk'
+
+    def test_xapk_package_name(self):
+        zip_file = open_bundle([('manifest.json', json.dumps(dict(package_name='com.example'))),
+                                ('config.en.apk', None), ('com.example.apk', None)])
+        assert TruegazeContainers.find_base_apk(zip_file) == 'com.example.apk'
+
+    def test_invalid_xapk_manifest(self):
+        zip_file = open_bundle([('manifest.json', '[1, 2'), ('base.apk', None)])
+        assert TruegazeContainers.find_base_apk(zip_file) == 'base.apk'
+
+    def test_unknown_names(self):
+        zip_file = open_bundle([('small.apk', b'data'), ('large.apk', None)])
+        assert TruegazeContainers.find_base_apk(zip_file) is None
+
+
+# Tests for containers.TruegazeContainers.open_nested()
+class TestContainersOpenNested(object):
+    def test_stored(self):
+        outer = MappedZipFile(make_bundle([('base.apk', None)]))
+        inner = TruegazeContainers.open_nested(outer, 'base.apk')
+        assert inner.is_mapped
+        assert inner.read('AndroidManifest.xml') == MappedZipFile(TEST_APK).read('AndroidManifest.xml')
+        assert inner.filename.endswith('!/base.apk')
+        inner.close()
+        outer.close()
+
+    def test_deflated(self):
+        outer = open_bundle([('base.apk', None)], zipfile.ZIP_DEFLATED)
+        inner = TruegazeContainers.open_nested(outer, 'base.apk')
+        assert len(inner.namelist()) == len(MappedZipFile(TEST_APK).namelist())
+
+    def test_over_limits(self):
+        outer = open_bundle([('base.apk', None)], zipfile.ZIP_DEFLATED, max_entry_size=1024)
+        with pytest.raises(EntryLimitError):
+            TruegazeContainers.open_nested(outer, 'base.apk')
+
+    def test_not_a_zip(self):
+        outer = open_bundle([('base.apk', b'not a zip file')])
+        assert TruegazeContainers.open_nested(outer, 'base.apk') is None
+
+
+# Tests for scanning bundles
+class TestContainersScan(object):
+    def test_context(self):
+        context = ScanContext(make_bundle([('splits/base-master.apk', None)]))
+        assert context.detect() is True
+        assert context.is_android
+        assert context.nested_path == 'splits/base-master.apk'
+        assert context.get_location(context.android_manifest) == 'splits/base-master.apk!/AndroidManifest.xml'
+        assert 'classes.dex' in context.zip_file.namelist()
+        context.close()
+
+    def test_context_reopen(self):
+        # Detection results restored from the cache only have the path of the base APK
+        context = ScanContext(make_bundle([('splits/base-master.apk', None)]))
+        context.nested_path = 'splits/base-master.apk'
+        assert 'classes.dex' in context.zip_file.namelist()
+
+    def test_invalid_base_apk(self):
+        context = ScanContext(make_bundle([('base.apk', b'not a zip file')]))
+        assert context.detect() is False
+
+    def test_ios_with_apk(self):
+        plist = plistlib.dumps(dict(CFBundleIdentifier='com.example.app', CFBundleShortVersionString='1.0'))
+        context = ScanContext(make_bundle([('Payload/Test.app/Info.plist', plist),
+                                           ('Payload/Test.app/assets/base.apk', None), ('base.apk', None)]))
+        assert context.detect() is True
+        assert context.is_ios
+        assert context.nested_path is None
+
+    def test_base_apk_without_manifest(self):
+        inner = io.BytesIO()
+        with zipfile.ZipFile(inner, 'w') as zip_file:
+            zip_file.writestr('classes.dex', b'code')
+        context = ScanContext(make_bundle([('base.apk', inner.getvalue()), ('other.txt', b'data')]))
+        assert context.detect() is False
+        assert context.nested_path is None
+        assert 'other.txt' in context.zip_file.namelist()
+        context.close()
+
+    def test_scan_file(self, tmpdir, capsys):
+        path = str(tmpdir.join('test.apks'))
+        with open(path, 'wb') as file:
+            file.write(make_bundle([('toc.pb', b''), ('splits/base-master.apk', None)]).getvalue())
+        assert TruegazeScanner.scan_file(path, False) == STATUS_OK
+        output = capsys.readouterr().out
+        assert 'manifest located at: splits/base-master.apk!/AndroidManifest.xml' in output
+
+        TruegazeScanner.scan_file(TEST_APK, False)
+        expected = capsys.readouterr().out
+        assert output.split('\n', 3)[3] == expected.split('\n', 3)[3]
@@ -0,0 +1,171 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import io, os, plistlib, re
+from zipfile import ZipFile
+
+from truegaze.archive import STREAM_CHUNK_SIZE, ZipIndex
+from truegaze.context import ScanContext
+from truegaze.utils import AAB_MANIFEST, ANDROID_MANIFEST
+
+TEST_APK = os.path.join(os.path.dirname(__file__), '..', 'test_data', 'helloworld.apk')
+
+
+# Tests for context.ScanContext
+class TestScanContext(object):
+    @staticmethod
+    def make_zip(path, data):
+        buffer = io.BytesIO()
+        with ZipFile(buffer, 'w') as zip_file:
+            zip_file.writestr(path, data)
+        return buffer
+
+    def test_open_not_found(self):
+        context = ScanContext('blablabla')
+        assert context.open() is False
+        assert context.zip_file is None
+
+    def test_open_invalid(self):
+        context = ScanContext(io.BytesIO(b'foobar data'))
+        assert context.open() is False
+
+    def test_detect_unknown(self):
+        context = ScanContext(TestScanContext.make_zip('test', 'testdata'))
+        assert context.open() is True
+        assert context.detect() is False
+        assert context.is_android is False
+        assert context.is_ios is False
+
+    def test_detect_android(self):
+        with ZipFile(TEST_APK) as zip_file:
+            manifest = zip_file.read(ANDROID_MANIFEST)
+        context = ScanContext(TestScanContext.make_zip(ANDROID_MANIFEST, manifest))
+        context.open()
+        assert context.detect() is True
+        assert context.is_android is True
+        assert context.is_ios is False
+        assert context.android_manifest == ANDROID_MANIFEST
+        assert context.app_info['package'] == 'opensecurity.helloworld'
+        assert context.get_app_name() == 'opensecurity.helloworld version 1.0 (1), minimum SDK 16'
+
+    def test_detect_android_invalid(self):
+        context = ScanContext(TestScanContext.make_zip(ANDROID_MANIFEST, 'manifest data'))
+        context.open()
+        assert context.detect() is False
+        assert context.is_android is False
+        assert context.detect_error.startswith('Invalid Android manifest "AndroidManifest.xml" - ')
+
+    def test_detect_app_bundle(self):
+        context = ScanContext(TestScanContext.make_zip(AAB_MANIFEST, 'protobuf data'))
+        context.open()
+        assert context.detect() is True
+        assert context.is_android is True
+        assert context.app_info is None
+        assert context.get_app_name() is None
+
+    def test_detect_ios(self):
+        plist = plistlib.dumps(dict(CFBundleIdentifier='com.example.app', CFBundleShortVersionString='1.0'))
+        context = ScanContext(TestScanContext.make_zip('Payload/Test.app/Info.plist', plist))
+        context.open()
+        assert context.detect() is True
+        assert context.is_android is False
+        assert context.is_ios is True
+        assert context.ios_manifest == 'Payload/Test.app/Info.plist'
+
+    def test_detect_ios_over_limit(self):
+        plist = plistlib.dumps(dict(CFBundleIdentifier='com.example.app', CFBundleShortVersionString='1.0'))
+        context = ScanContext(TestScanContext.make_zip('Payload/Test.app/Info.plist', plist), max_entry_size=10)
+        context.open()
+        assert context.detect() is False
+        assert 'Payload/Test.app/Info.plist' in context.detect_error
+
+    def test_get_matching_paths_single_pass(self, monkeypatch):
+        buffer = io.BytesIO()
+        with ZipFile(buffer, 'w') as zip_file:
+            zip_file.writestr('test1.txt', '')
+            zip_file.writestr('test/test2.doc', '')
+        pattern1 = re.compile(r'.*\.txt')
+        pattern2 = re.compile(r'.*\.doc')
+        context = ScanContext(buffer, [pattern1, pattern2])
+        context.open()
+
+        calls = []
+        iter_names = ZipIndex.iter_names
+        monkeypatch.setattr(ZipIndex, 'iter_names', lambda self: calls.append(1) or iter_names(self))
+        assert context.get_matching_paths(pattern1) == ['test1.txt']
+        assert context.get_matching_paths(pattern2) == ['test/test2.doc']
+        assert len(calls) == 1
+
+        # Patterns that were not registered up front get their own pass
+        assert context.get_matching_paths(re.compile(r'test/.*')) == ['test/test2.doc']
+        assert len(calls) == 2
+
+    @staticmethod
+    def get_fingerprint(files, patterns):
+        buffer = io.BytesIO()
+        with ZipFile(buffer, 'w') as zip_file:
+            for path, data in files.items():
+                zip_file.writestr(path, data)
+        with ScanContext(buffer) as context:
+            context.android_manifest = ANDROID_MANIFEST
+            return context.get_fingerprint(patterns)
+
+    def test_get_fingerprint(self):
+        patterns = [re.compile(r'.*\.json')]
+        fingerprint = TestScanContext.get_fingerprint({'config.json': '{}', 'other.txt': 'first'}, patterns)
+        assert fingerprint == TestScanContext.get_fingerprint({'config.json': '{}', 'other.txt': 'second'},
+                                                              patterns)
+        assert fingerprint != TestScanContext.get_fingerprint({'config.json': '{ }'}, patterns)
+        assert fingerprint != TestScanContext.get_fingerprint({'config2.json': '{}'}, patterns)
+        assert fingerprint != TestScanContext.get_fingerprint({'config.json': '{}'}, [re.compile(r'.*\.txt')])
+
+    def test_get_fingerprint_platform(self):
+        buffer = TestScanContext.make_zip('config.json', '{}')
+        patterns = [re.compile(r'.*\.json')]
+        with ScanContext(buffer) as context:
+            context.android_manifest = ANDROID_MANIFEST
+            android = context.get_fingerprint(patterns)
+            context.android_manifest = None
+            context.ios_manifest = 'Payload/Test.app/Info.plist'
+            assert context.get_fingerprint(patterns) != android
+
+    def test_entry_contains(self):
+        with ScanContext(TestScanContext.make_zip('resources.arsc', b'foo firebase bar')) as context:
+            assert context.entry_contains('resources.arsc', [b'other', b'firebase']) is True
+            assert context.entry_contains('resources.arsc', [b'other']) is False
+            assert context.entry_contains('missing.arsc', [b'firebase']) is False
+
+    def test_entry_contains_across_chunks(self):
+        data = b' ' * (STREAM_CHUNK_SIZE - 4) + b'firebase' + b' ' * STREAM_CHUNK_SIZE
+        with ScanContext(TestScanContext.make_zip('resources.arsc', data)) as context:
+            assert context.entry_contains('resources.arsc', [b'firebase']) is True
+
+    def test_entry_contains_over_limit(self):
+        with ScanContext(TestScanContext.make_zip('resources.arsc', b' ' * 1000), max_entry_size=10) as context:
+            assert context.entry_contains('resources.arsc', [b'firebase']) is True
+
+    def test_close(self):
+        context = ScanContext(TestScanContext.make_zip('test', 'testdata'))
+        context.open()
+        context.close()
+        assert context.zip_file is None
@@ -0,0 +1,111 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import io
+import os
+
+from truegaze.inputs import TruegazeInputs
+
+
+def make_tree(tmpdir):
+    tmpdir.join('b.apk').write('')
+    tmpdir.join('a.IPA').write('')
+    tmpdir.join('notes.txt').write('')
+    tmpdir.mkdir('sub').join('c.apk').write('')
+    tmpdir.join('sub').mkdir('deeper').join('d.ipa').write('')
+    return str(tmpdir)
+
+
+# Tests for inputs.TruegazeInputs.iter_directory()
+class TestInputsIterDirectory(object):
+    def test_default_extensions(self, tmpdir):
+        root = make_tree(tmpdir)
+        assert list(TruegazeInputs.iter_directory(root)) == [
+            os.path.join(root, 'a.IPA'), os.path.join(root, 'b.apk'),
+            os.path.join(root, 'sub', 'c.apk'), os.path.join(root, 'sub', 'deeper', 'd.ipa')]
+
+    def test_extensions(self, tmpdir):
+        root = make_tree(tmpdir)
+        assert list(TruegazeInputs.iter_directory(root, ['.txt'])) == [os.path.join(root, 'notes.txt')]
+
+    def test_all_files(self, tmpdir):
+        assert len(list(TruegazeInputs.iter_directory(make_tree(tmpdir), None))) == 5
+
+    def test_symlink_loop(self, tmpdir):
+        root = make_tree(tmpdir)
+        os.symlink(root, os.path.join(root, 'sub', 'loop'))
+        assert len(list(TruegazeInputs.iter_directory(root))) == 4
+
+    def test_lazy(self, tmpdir):
+        files = TruegazeInputs.iter_directory(make_tree(tmpdir))
+        assert next(files).endswith('a.IPA')
+
+
+# Tests for inputs.TruegazeInputs.iter_list_file()
+class TestInputsIterListFile(object):
+    def test_newlines(self):
+        data = io.BytesIO(b'first.apk\r\nsecond file.ipa\n\n  \nthird.apk')
+        assert list(TruegazeInputs.iter_list_file(data)) == ['first.apk', 'second file.ipa', 'third.apk']
+
+    def test_nul(self):
+        data = io.BytesIO(b'first.apk\x00with\nnewline.ipa\x00')
+        assert list(TruegazeInputs.iter_list_file(data)) == ['first.apk', 'with\nnewline.ipa']
+
+    def test_empty(self):
+        assert list(TruegazeInputs.iter_list_file(io.BytesIO())) == []
+
+    def test_chunks(self, monkeypatch):
+        monkeypatch.setattr('truegaze.inputs.LIST_CHUNK_SIZE', 4)
+        data = io.BytesIO(b'first.apk\nsecond.ipa\n')
+        assert list(TruegazeInputs.iter_list_file(data)) == ['first.apk', 'second.ipa']
+
+
+# Tests for inputs.TruegazeInputs.iter_inputs()
+class TestInputsIterInputs(object):
+    def test_all_sources(self, tmpdir):
+        root = make_tree(tmpdir)
+        listed = os.path.join(root, 'notes.txt')
+        inputs = TruegazeInputs.iter_inputs(['given.txt'], [os.path.join(root, 'sub')],
+                                            [io.BytesIO(os.fsencode(listed) + b'\n')])
+        assert list(inputs) == ['given.txt', os.path.join(root, 'sub', 'c.apk'),
+                                os.path.join(root, 'sub', 'deeper', 'd.ipa'), listed]
+
+    def test_missing_listed(self, tmpdir, capsys):
+        root = make_tree(tmpdir)
+        data = io.BytesIO(os.fsencode(os.path.join(root, 'missing.apk')) + b'\n' +
+                          os.fsencode(os.path.join(root, 'sub')) + b'\n' + os.fsencode(os.path.join(root, 'b.apk')))
+        assert list(TruegazeInputs.iter_inputs(list_files=[data])) == [os.path.join(root, 'b.apk')]
+        output = capsys.readouterr().out
+        assert 'ERROR: Skipping "' + os.path.join(root, 'missing.apk') + '" - file not found' in output
+        assert 'ERROR: Skipping "' + os.path.join(root, 'sub') + '" - not a regular file' in output
+
+    def test_extensions(self, tmpdir):
+        root = make_tree(tmpdir)
+        inputs = TruegazeInputs.iter_inputs(['given.apk', 'given.txt'], [root], [io.BytesIO(b'listed.ipa\n')],
+                                            ['.apk'])
+        assert list(inputs) == ['given.apk', os.path.join(root, 'b.apk'), os.path.join(root, 'sub', 'c.apk')]
+
+    def test_has_extension(self):
+        assert TruegazeInputs.has_extension('test.APK', ['.apk'])
+        assert not TruegazeInputs.has_extension('test.apk.txt', ['.apk'])
+        assert TruegazeInputs.has_extension('test.txt', None)
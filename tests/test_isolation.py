@@ -0,0 +1,72 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import os
+import signal
+import time
+
+import pytest
+
+from truegaze.isolation import CallTimeoutError, IsolatedCall, IsolationError
+
+pytestmark = pytest.mark.skipif(not IsolatedCall.is_supported(), reason='requires os.fork()')
+
+
+def fail():
+    raise ValueError('test failure')
+
+
+# Tests for isolation.IsolatedCall.run()
+class TestIsolatedCallRun(object):
+    def test_result(self):
+        assert IsolatedCall.run(lambda: 'result') == 'result'
+
+    def test_runs_in_child(self):
+        assert IsolatedCall.run(os.getpid) != os.getpid()
+
+    def test_large_result(self):
+        assert len(IsolatedCall.run(lambda: b'x' * 1024 * 1024, timeout=10)) == 1024 * 1024
+
+    def test_parent_memory_is_shared(self):
+        data = {'key': 'value'}
+        assert IsolatedCall.run(lambda: data['key']) == 'value'
+
+    def test_exception(self):
+        with pytest.raises(IsolationError) as error:
+            IsolatedCall.run(fail)
+        assert str(error.value) == 'ValueError: test failure'
+
+    def test_timeout(self):
+        start = time.monotonic()
+        with pytest.raises(CallTimeoutError):
+            IsolatedCall.run(lambda: time.sleep(10), timeout=0.1)
+        assert time.monotonic() - start < 5
+
+    def test_killed(self):
+        with pytest.raises(IsolationError) as error:
+            IsolatedCall.run(lambda: os.kill(os.getpid(), signal.SIGKILL))
+        assert 'signal ' + str(int(signal.SIGKILL)) in str(error.value)
+
+    def test_unpicklable_result(self):
+        with pytest.raises(IsolationError):
+            IsolatedCall.run(lambda: lambda: None)
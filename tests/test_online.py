@@ -0,0 +1,198 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import pickle
+import time
+
+import pytest
+import requests
+
+from truegaze.cache import ProbeCache
+from truegaze import online
+from truegaze.online import OnlineClient, ProbeError, TokenBucket
+
+
+# Tests for online.OnlineClient
+class TestOnlineClient(object):
+    def test_default(self):
+        assert OnlineClient.get_default() is OnlineClient.get_default()
+
+    def test_get_head(self, local_server):
+        local_server.routes['/test'] = (200, 0)
+        client = OnlineClient()
+        assert client.get(local_server.url + '/test').status_code == 200
+        assert client.head(local_server.url + '/test').status_code == 200
+        assert client.get(local_server.url + '/missing').status_code == 404
+        assert local_server.requests == [('GET', '/test'), ('HEAD', '/test'), ('GET', '/missing')]
+        client.close()
+
+    def test_session_reused(self, local_server):
+        client = OnlineClient()
+        assert client.session is client.session
+        client.close()
+
+    def test_timeout(self, local_server):
+        local_server.routes['/slow'] = (200, 2)
+        client = OnlineClient(timeout=0.2)
+        with pytest.raises(requests.Timeout):
+            client.get(local_server.url + '/slow')
+        client.close()
+
+    def test_concurrency_limit(self, local_server):
+        local_server.routes['/slow'] = (200, 0.2)
+        client = OnlineClient(max_concurrency=2)
+        futures = [client.submit(client.get, local_server.url + '/slow') for _ in range(6)]
+        assert all(future.result().status_code == 200 for future in futures)
+        assert local_server.max_in_flight == 2
+        client.close()
+
+    def test_concurrent(self, local_server):
+        local_server.routes['/slow'] = (200, 0.2)
+        client = OnlineClient(max_concurrency=4)
+        futures = [client.submit(client.get, local_server.url + '/slow') for _ in range(4)]
+        assert all(future.result().status_code == 200 for future in futures)
+        assert local_server.max_in_flight == 4
+        client.close()
+
+    def test_pickle(self, local_server):
+        client = OnlineClient(timeout=5, max_concurrency=3)
+        client.session
+        copy = pickle.loads(pickle.dumps(client))
+        assert copy.timeout == 5
+        assert copy.max_concurrency == 3
+        local_server.routes['/test'] = (200, 0)
+        assert copy.get(local_server.url + '/test').status_code == 200
+        copy.close()
+        client.close()
+
+
+# Tests for online.TokenBucket
+class TestTokenBucket(object):
+    def test_burst(self):
+        bucket = TokenBucket(10, burst=5)
+        assert sum(bucket.acquire() for _ in range(5)) == 0
+
+    def test_rate(self):
+        bucket = TokenBucket(20, burst=1)
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        assert time.monotonic() - start >= 0.15
+
+
+# Tests for the rate limits and retries in online.OnlineClient
+class TestOnlineClientRetries(object):
+    def test_retry_throttled(self, local_server, monkeypatch):
+        monkeypatch.setattr(online, 'BACKOFF_DELAY', 0.01)
+        local_server.routes['/test'] = [(429, 0), (503, 0), (200, 0)]
+        client = OnlineClient(retries=2)
+        assert client.get(local_server.url + '/test').status_code == 200
+        assert len(local_server.requests) == 3
+        client.close()
+
+    def test_retries_exhausted(self, local_server, monkeypatch):
+        monkeypatch.setattr(online, 'BACKOFF_DELAY', 0.01)
+        local_server.routes['/test'] = [(500, 0)]
+        client = OnlineClient(retries=2)
+        assert client.get(local_server.url + '/test').status_code == 500
+        assert len(local_server.requests) == 3
+        client.close()
+
+    def test_no_retry_client_error(self, local_server):
+        local_server.routes['/test'] = [(401, 0), (200, 0)]
+        client = OnlineClient(retries=2)
+        assert client.head(local_server.url + '/test').status_code == 401
+        assert len(local_server.requests) == 1
+        client.close()
+
+    def test_backoff_delay(self):
+        class Response(object):
+            def __init__(self, headers):
+                self.headers = headers
+
+        assert OnlineClient.get_backoff_delay(Response({}), 0) == online.BACKOFF_DELAY
+        assert OnlineClient.get_backoff_delay(Response({}), 2) == online.BACKOFF_DELAY * 4
+        assert OnlineClient.get_backoff_delay(Response({'Retry-After': '5'}), 0) == 5
+        assert OnlineClient.get_backoff_delay(Response({'Retry-After': '3600'}), 0) == online.MAX_BACKOFF_DELAY
+        assert OnlineClient.get_backoff_delay(Response({'Retry-After': 'junk'}), 0) == online.BACKOFF_DELAY
+
+    def test_rate_limit_per_host(self, local_server):
+        local_server.routes['/test'] = (200, 0)
+        client = OnlineClient(rate_limit=10)
+        start = time.monotonic()
+        for _ in range(13):
+            client.get(local_server.url + '/test')
+        assert time.monotonic() - start >= 0.25
+        assert client.get_bucket('127.0.0.1:1') is not client.get_bucket('127.0.0.1:2')
+        client.close()
+
+
+# Tests for online.OnlineClient.probe()
+class TestOnlineClientProbe(object):
+    @staticmethod
+    def check(client, url):
+        return client.get(url).status_code
+
+    def test_coalesced(self, local_server):
+        local_server.routes['/slow'] = (200, 0.2)
+        client = OnlineClient()
+        url = local_server.url + '/slow'
+        futures = [client.probe(url, TestOnlineClientProbe.check, client, url) for _ in range(5)]
+        assert [future.result() for future in futures] == [200] * 5
+        assert len(local_server.requests) == 1
+        client.close()
+
+    def test_cached(self, local_server, tmpdir):
+        local_server.routes['/test'] = (200, 0)
+        url = local_server.url + '/test'
+        client = OnlineClient(probe_cache=ProbeCache(str(tmpdir)))
+        assert client.probe(url, TestOnlineClientProbe.check, client, url).result() == 200
+        client.close()
+
+        # A new client, like one from a later run, should reuse the result
+        client = OnlineClient(probe_cache=ProbeCache(str(tmpdir)))
+        assert client.probe(url, TestOnlineClientProbe.check, client, url).result() == 200
+        assert len(local_server.requests) == 1
+        client.close()
+
+    def test_error_cached(self, local_server, tmpdir):
+        local_server.routes['/slow'] = (200, 2)
+        url = local_server.url + '/slow'
+        client = OnlineClient(timeout=0.2, probe_cache=ProbeCache(str(tmpdir)))
+        for _ in range(2):
+            with pytest.raises(ProbeError):
+                client.probe(url, TestOnlineClientProbe.check, client, url).result()
+        assert len(local_server.requests) == 1
+        client.close()
+
+    def test_unexpected_error(self):
+        def fail():
+            raise ValueError('unexpected')
+
+        client = OnlineClient()
+        with pytest.raises(ValueError):
+            client.probe('key', fail).result()
+        # The failed probe should not be left in flight
+        with pytest.raises(ValueError):
+            client.probe('key', fail).result()
+        client.close()
@@ -0,0 +1,175 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import os
+import pickle
+import pstats
+import time
+import tracemalloc
+
+import pytest
+
+from truegaze.profiler import SCAN_NAME, Profiler
+from truegaze.scanner import STATUS_OK, TruegazeScanner
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), '..', 'test_data')
+TEST_APK = os.path.join(TEST_DATA, 'helloworld.apk')
+
+
+@pytest.fixture
+def profiler():
+    profiler = Profiler()
+    yield profiler
+    profiler.close()
+
+
+# Tests for profiler.Profiler.phase()
+class TestProfilerPhase(object):
+    def test_single(self, profiler):
+        with profiler.phase('test', 'check'):
+            time.sleep(0.01)
+        calls, wall_time, cpu_time, peak_memory = profiler.stats[('test', 'check')]
+        assert calls == 1
+        assert wall_time >= 0.01
+        assert cpu_time < wall_time
+
+    def test_repeated(self, profiler):
+        for _ in range(3):
+            with profiler.phase('test', 'check'):
+                pass
+        assert profiler.stats[('test', 'check')][0] == 3
+
+    def test_nested_times_are_exclusive(self, profiler):
+        with profiler.phase('test', 'check'):
+            with profiler.phase('test', 'parse'):
+                time.sleep(0.05)
+        assert profiler.stats[('test', 'parse')][1] >= 0.05
+        assert profiler.stats[('test', 'check')][1] < 0.05
+
+    @pytest.mark.skipif(not hasattr(tracemalloc, 'reset_peak'), reason='requires tracemalloc.reset_peak()')
+    def test_nested_memory_is_inclusive(self, profiler):
+        with profiler.phase('test', 'check'):
+            with profiler.phase('test', 'parse'):
+                data = bytearray(1024 * 1024)
+            del data
+        assert profiler.stats[('test', 'parse')][3] >= 1024 * 1024
+        assert profiler.stats[('test', 'check')][3] >= 1024 * 1024
+
+    def test_exception(self, profiler):
+        with pytest.raises(ValueError):
+            with profiler.phase('test', 'check'):
+                raise ValueError()
+        assert profiler.stats[('test', 'check')][0] == 1
+
+    def test_without_memory(self):
+        profiler = Profiler(trace_memory=False)
+        with profiler.phase('test', 'check'):
+            data = bytearray(1024 * 1024)
+        del data
+        assert profiler.stats[('test', 'check')][3] == 0
+        assert not tracemalloc.is_tracing()
+
+
+# Tests for profiler.Profiler.measure()
+class TestProfilerMeasure(object):
+    def test_disabled(self):
+        with Profiler.measure(None, 'test', 'check'):
+            pass
+
+    def test_enabled(self, profiler):
+        with Profiler.measure(profiler, 'test', 'check'):
+            pass
+        assert list(profiler.stats) == [('test', 'check')]
+
+
+# Tests for profiler.Profiler.merge()
+class TestProfilerMerge(object):
+    def test_merge(self, profiler):
+        profiler.add(('test', 'check'), 1, 1.0, 0.5, 100)
+        profiler.merge({('test', 'check'): [2, 2.0, 1.0, 50], ('test', 'parse'): [1, 0.1, 0.1, 10]})
+        assert profiler.stats == {('test', 'check'): [3, 3.0, 1.5, 100], ('test', 'parse'): [1, 0.1, 0.1, 10]}
+
+    def test_none(self, profiler):
+        profiler.merge(None)
+        assert profiler.stats == {}
+
+    def test_copies_start_empty(self, profiler):
+        profiler.add(('test', 'check'), 1, 1.0, 0.5, 100)
+        assert pickle.loads(pickle.dumps(profiler)).stats == {}
+
+
+# Tests for profiler.Profiler.profile_file()
+class TestProfilerProfileFile(object):
+    def test_without_dir(self, profiler):
+        with profiler.profile_file(TEST_APK):
+            pass
+
+    def test_dump(self, tmpdir):
+        profile_dir = str(tmpdir.join('profiles'))
+        with Profiler.profile(Profiler(profile_dir, trace_memory=False), TEST_APK):
+            sum(range(1000))
+        path = Profiler.get_dump_path(profile_dir, TEST_APK)
+        assert os.path.basename(path).startswith('helloworld.apk.')
+        assert pstats.Stats(path).total_calls > 0
+
+    def test_dump_path_per_directory(self):
+        assert Profiler.get_dump_path('out', 'a/test.apk') != Profiler.get_dump_path('out', 'b/test.apk')
+
+
+# Tests for profiler.Profiler.get_table()
+class TestProfilerGetTable(object):
+    def test_order(self, profiler):
+        profiler.add(('WeakKeyPlugin', 'check'), 1, 0.1, 0.1, 0)
+        profiler.add(('WeakKeyPlugin', 'parse'), 1, 0.1, 0.1, 0)
+        profiler.add((SCAN_NAME, 'detect'), 1, 0.1, 0.1, 0)
+        profiler.add((SCAN_NAME, 'open'), 1, 0.1, 0.1, 0)
+        table = str(profiler.get_table())
+        positions = [table.index(text) for text in ['open', 'detect', 'parse', 'check']]
+        assert positions == sorted(positions)
+
+
+# Tests for the profiler when scanning files
+class TestProfilerScan(object):
+    def test_scan_file(self, profiler):
+        assert TruegazeScanner.scan_file(TEST_APK, False, profiler=profiler) == STATUS_OK
+        assert (SCAN_NAME, 'open') in profiler.stats
+        assert (SCAN_NAME, 'detect') in profiler.stats
+        assert ('WeakKeyPlugin', 'parse') in profiler.stats
+        assert ('WeakKeyPlugin', 'check') in profiler.stats
+        assert ('WeakKeyPlugin', 'report') in profiler.stats
+        assert ('FirebasePlugin', 'preflight') in profiler.stats
+        assert ('FirebasePlugin', 'check') not in profiler.stats
+
+    def test_scan_file_captured(self):
+        profiler = Profiler(trace_memory=False)
+        _, status, _, stats = TruegazeScanner.scan_file_captured((TEST_APK, False, dict(profiler=profiler)))
+        assert status == STATUS_OK
+        assert (SCAN_NAME, 'open') in stats
+        assert profiler.stats == {}
+
+    def test_scan_files_parallel(self):
+        profiler = Profiler(trace_memory=False)
+        results = list(TruegazeScanner.scan_files_parallel([TEST_APK, TEST_APK], False, 2, profiler=profiler))
+        for _, _, _, stats in results:
+            profiler.merge(stats)
+        assert profiler.stats[(SCAN_NAME, 'open')][0] == 2
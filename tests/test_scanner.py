@@ -0,0 +1,413 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import os
+import re
+import time
+import zipfile
+
+import pytest
+
+from truegaze.archive import DEFAULT_MAX_ENTRY_SIZE, DEFAULT_MAX_RATIO
+from truegaze.cache import ResultCache
+from truegaze.context import ScanContext
+from truegaze.isolation import IsolatedCall
+from truegaze.plugins import ACTIVE_PLUGINS, PluginInfo
+from truegaze.plugins.adobe_mobile_sdk import AdobeMobileSdkPlugin
+from truegaze.plugins.base import BasePlugin
+from truegaze.plugins.weak_key import WeakKeyPlugin
+from truegaze.scanner import PENDING_FILES_PER_JOB, STATUS_OK, STATUS_UNABLE_TO_OPEN, STATUS_UNKNOWN_PLATFORM, \
+    STATUS_WORKER_FAILED, PluginRun, TruegazeScanner
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), '..', 'test_data')
+TEST_APK = os.path.join(TEST_DATA, 'helloworld.apk')
+TEST_IPA = os.path.join(TEST_DATA, 'helloworld.ipa')
+
+
+def get_manifest():
+    with zipfile.ZipFile(TEST_APK) as zip_file:
+        return zip_file.read('AndroidManifest.xml')
+
+
+# Tests for scanner.scan_file()
+class TestScannerScanFile(object):
+    def test_not_zip(self, tmpdir):
+        path = tmpdir.join('test.apk')
+        path.write('foobar data')
+        assert TruegazeScanner.scan_file(str(path), False) == STATUS_UNABLE_TO_OPEN
+
+    def test_missing_cached(self, tmpdir, capsys):
+        cache = ResultCache(str(tmpdir.join('cache')))
+        assert TruegazeScanner.scan_file(str(tmpdir.join('missing.apk')), False, cache) == STATUS_UNABLE_TO_OPEN
+        assert 'ERROR: Unable to open file' in capsys.readouterr().out
+
+    def test_unknown_platform(self, tmpdir):
+        path = str(tmpdir.join('test.apk'))
+        with zipfile.ZipFile(path, 'w') as zip_file:
+            zip_file.writestr('test', 'testdata')
+        assert TruegazeScanner.scan_file(path, False) == STATUS_UNKNOWN_PLATFORM
+
+    def test_android(self, capsys):
+        assert TruegazeScanner.scan_file(TEST_APK, False) == STATUS_OK
+        output = capsys.readouterr().out
+        assert 'Identified as an Android application' in output
+        assert 'Application: opensecurity.helloworld version 1.0 (1), minimum SDK 16' in output
+        assert 'Scanning using the "WeakKeyPlugin" plugin' in output
+
+    def test_ios(self, capsys):
+        assert TruegazeScanner.scan_file(TEST_IPA, False) == STATUS_OK
+        assert 'Identified as an iOS application' in capsys.readouterr().out
+
+    def test_cached(self, tmpdir, monkeypatch, capsys):
+        cache = ResultCache(str(tmpdir))
+        assert TruegazeScanner.scan_file(TEST_APK, False, cache) == STATUS_OK
+        first = capsys.readouterr().out
+
+        # Second scan should be served entirely from the cache without opening the file
+        def fail_open(self):
+            raise AssertionError('File should not be opened')
+        monkeypatch.setattr(ScanContext, 'open', fail_open)
+        assert TruegazeScanner.scan_file(TEST_APK, False, cache) == STATUS_OK
+        assert capsys.readouterr().out == first
+
+    def test_invalid_manifest(self, tmpdir, capsys):
+        path = str(tmpdir.join('test.apk'))
+        with zipfile.ZipFile(path, 'w') as zip_file:
+            zip_file.writestr('AndroidManifest.xml', 'manifest data')
+        assert TruegazeScanner.scan_file(path, False) == STATUS_UNKNOWN_PLATFORM
+        assert 'ERROR: Invalid Android manifest "AndroidManifest.xml" - ' in capsys.readouterr().out
+
+    def test_cached_error(self, tmpdir):
+        path = str(tmpdir.join('test.apk'))
+        with zipfile.ZipFile(path, 'w') as zip_file:
+            zip_file.writestr('test', 'testdata')
+        cache = ResultCache(str(tmpdir.join('cache')))
+        assert TruegazeScanner.scan_file(path, False, cache) == STATUS_UNKNOWN_PLATFORM
+        assert TruegazeScanner.scan_file(path, False, cache) == STATUS_UNKNOWN_PLATFORM
+
+    def test_entry_limits(self, tmpdir, capsys):
+        path = str(tmpdir.join('test.apk'))
+        with zipfile.ZipFile(path, 'w') as zip_file:
+            zip_file.writestr('AndroidManifest.xml', get_manifest())
+            zip_file.writestr('assets/ADBMobileConfig.json', '{"analytics": {}}' + ' ' * 10000)
+        assert TruegazeScanner.scan_file(path, False, max_entry_size=10000) == STATUS_OK
+        assert '---- ISSUE: File "assets/ADBMobileConfig.json" is larger than the limit of 10000 bytes' in \
+            capsys.readouterr().out
+
+    def test_entry_limits_detection(self, tmpdir, capsys):
+        path = str(tmpdir.join('test.ipa'))
+        with zipfile.ZipFile(path, 'w') as zip_file:
+            zip_file.writestr('Payload/Test.app/Info.plist', ' ' * 1000)
+        cache = ResultCache(str(tmpdir.join('cache')))
+        for _ in range(2):
+            assert TruegazeScanner.scan_file(path, False, cache, max_entry_size=10) == STATUS_UNKNOWN_PLATFORM
+            assert 'ERROR: File "Payload/Test.app/Info.plist" is larger than the limit' in capsys.readouterr().out
+
+    def test_entry_limits_cache(self, tmpdir, capsys):
+        cache = ResultCache(str(tmpdir))
+        TruegazeScanner.scan_file(TEST_APK, False, cache)
+        first = capsys.readouterr().out
+        TruegazeScanner.scan_file(TEST_APK, False, cache, max_entry_size=10)
+        assert capsys.readouterr().out != first
+
+    def test_bad_crc(self, tmpdir, capsys):
+        # A corrupt entry passes the pre-flight check and is reported by the plugin
+        path = str(tmpdir.join('test.apk'))
+        with zipfile.ZipFile(path, 'w') as zip_file:
+            zip_file.writestr('AndroidManifest.xml', get_manifest())
+            zip_file.writestr('resources.arsc', b'firebase_database_url', compress_type=zipfile.ZIP_DEFLATED)
+        with open(path, 'rb') as file:
+            data = bytearray(file.read())
+        position = data.rfind(b'PK\x01\x02', 0, data.rfind(b'resources.arsc'))
+        data[position + 16:position + 20] = b'\x00\x00\x00\x00'
+        with open(path, 'wb') as file:
+            file.write(data)
+        assert TruegazeScanner.scan_file(path, False) == STATUS_OK
+        assert '---- ISSUE: Bad CRC-32 for entry: resources.arsc' in capsys.readouterr().out
+
+    def test_get_settings(self):
+        assert TruegazeScanner.get_settings(DEFAULT_MAX_ENTRY_SIZE, DEFAULT_MAX_RATIO) is None
+        assert TruegazeScanner.get_settings(1000, None) == 'limits=1000:None'
+
+    def test_incremental(self, tmpdir, monkeypatch, capsys):
+        # A new build with the same Adobe config only reruns the plugins whose inputs changed
+        cache = ResultCache(str(tmpdir.join('cache')))
+        for version in ['1', '2']:
+            with zipfile.ZipFile(str(tmpdir.join(version + '.apk')), 'w') as zip_file:
+                zip_file.writestr('AndroidManifest.xml', get_manifest())
+                zip_file.writestr('classes.dex', 'code ' + version)
+                zip_file.writestr('assets/ADBMobileConfig.json', '{"analytics": {"ssl": true}}')
+        assert TruegazeScanner.scan_file(str(tmpdir.join('1.apk')), False, cache) == STATUS_OK
+        first = capsys.readouterr().out
+
+        calls = []
+        scan = AdobeMobileSdkPlugin.scan
+        monkeypatch.setattr(AdobeMobileSdkPlugin, 'scan', lambda self: calls.append(1) or scan(self))
+        scan_weak_key = WeakKeyPlugin.scan
+        monkeypatch.setattr(WeakKeyPlugin, 'scan', lambda self: calls.append(2) or scan_weak_key(self))
+        assert TruegazeScanner.scan_file(str(tmpdir.join('2.apk')), False, cache) == STATUS_OK
+        assert calls == [2]
+        assert capsys.readouterr().out == first.replace('1.apk', '2.apk')
+
+        # Changing the config reruns the plugin
+        with zipfile.ZipFile(str(tmpdir.join('3.apk')), 'w') as zip_file:
+            zip_file.writestr('AndroidManifest.xml', get_manifest())
+            zip_file.writestr('assets/ADBMobileConfig.json', '{"analytics": {"ssl": false}}')
+        TruegazeScanner.scan_file(str(tmpdir.join('3.apk')), False, cache)
+        assert calls == [2, 1, 2]
+
+
+# Tests for scanner.scan_file_captured()
+class TestScannerScanFileCaptured(object):
+    def test_captured(self, capsys):
+        filename, status, output, stats = TruegazeScanner.scan_file_captured((TEST_APK, False, {}))
+        assert filename == TEST_APK
+        assert status == STATUS_OK
+        assert 'Identified as an Android application' in output
+        assert capsys.readouterr().out == ''
+
+
+# Tests for scanner.warm_up()
+class TestScannerWarmUp(object):
+    def test_warm_up(self, monkeypatch):
+        calls = []
+        for plugin in ACTIVE_PLUGINS:
+            monkeypatch.setattr(plugin.load(), 'warm_up', staticmethod(lambda name=plugin.name: calls.append(name)))
+        TruegazeScanner.warm_up()
+        assert calls == [plugin.name for plugin in ACTIVE_PLUGINS]
+
+
+# Tests for scanner.scan_files_parallel()
+class TestScannerScanFilesParallel(object):
+    def test_ordered(self):
+        filenames = [TEST_APK, TEST_IPA, TEST_APK]
+        results = list(TruegazeScanner.scan_files_parallel(filenames, False, 2, ordered=True))
+        assert [result[0] for result in results] == filenames
+        assert all(result[1] == STATUS_OK for result in results)
+        assert results[0][2] == TruegazeScanner.scan_file_captured((TEST_APK, False, {}))[2]
+
+    def test_unordered(self):
+        filenames = [TEST_APK, TEST_IPA]
+        results = list(TruegazeScanner.scan_files_parallel(filenames, False, 2, ordered=False))
+        assert sorted(result[0] for result in results) == sorted(filenames)
+
+    def test_generator_read_lazily(self):
+        read = []
+
+        def get_filenames():
+            for _ in range(100):
+                read.append(1)
+                yield TEST_IPA
+
+        results = TruegazeScanner.scan_files_parallel(get_filenames(), False, 1)
+        next(results)
+        assert len(read) <= 1 + PENDING_FILES_PER_JOB
+        results.close()
+
+    def test_worker_limits(self):
+        filenames = [TEST_APK, TEST_IPA, TEST_APK]
+        results = list(TruegazeScanner.scan_files_parallel(filenames, False, 1, max_files=1, max_memory=1))
+        assert [result[0] for result in results] == filenames
+        assert all(result[1] == STATUS_OK for result in results)
+
+    def test_worker_failed(self, monkeypatch):
+        scan_file = TruegazeScanner.scan_file
+        monkeypatch.setattr(TruegazeScanner, 'scan_file', staticmethod(
+            lambda filename, online, **options: os._exit(1) if filename == TEST_IPA else
+            scan_file(filename, online, **options)))
+        results = list(TruegazeScanner.scan_files_parallel([TEST_APK, TEST_IPA, TEST_APK], False, 1))
+        assert [result[1] for result in results] == [STATUS_OK, STATUS_WORKER_FAILED, STATUS_OK]
+        assert 'ERROR: The worker process scanning the file stopped' in results[1][2]
+
+    def test_stop_early(self):
+        filenames = (TEST_IPA for _ in range(100))
+        results = TruegazeScanner.scan_files_parallel(filenames, False, 2)
+        next(results)
+        results.close()
+
+
+# Plugin used to test the order of scan() and finish() calls
+class DeferredPlugin(BasePlugin):
+    name = 'DeferredPlugin'
+    supports_android = True
+    calls = []
+
+    def scan(self):
+        DeferredPlugin.calls.append('scan')
+        print('-- started')
+
+    def finish(self):
+        DeferredPlugin.calls.append('finish')
+        print('-- finished')
+
+
+# Plugin used to test timeouts, runs for as long as it is told to
+class SlowPlugin(BasePlugin):
+    name = 'SlowPlugin'
+    supports_android = True
+    delay = 0
+
+    def scan(self):
+        time.sleep(SlowPlugin.delay)
+        print('-- done')
+
+
+# Tests for scanner.PluginRun
+class TestScannerPluginRun(object):
+    PLUGIN = PluginInfo(__name__, 'DeferredPlugin', name='DeferredPlugin', desc='', version='1.0',
+                        supports_android=True, supports_ios=False)
+
+    def test_start_finish(self, capsys):
+        DeferredPlugin.calls = []
+        context = ScanContext(TEST_APK)
+        context.android_manifest = 'AndroidManifest.xml'
+        runs = [PluginRun(TestScannerPluginRun.PLUGIN, context, False) for _ in range(2)]
+        for run in runs:
+            run.start()
+        assert capsys.readouterr().out == ''
+        outputs = [run.finish() for run in runs]
+        assert DeferredPlugin.calls == ['scan', 'scan', 'finish', 'finish']
+        assert outputs[0] == '\nScanning using the "DeferredPlugin" plugin\n-- started\n-- finished\n'
+
+    def test_os_not_supported(self):
+        context = ScanContext(TEST_IPA)
+        context.ios_manifest = 'Payload/helloworld.app/Info.plist'
+        run = PluginRun(TestScannerPluginRun.PLUGIN, context, False)
+        run.start()
+        assert run.finish().endswith('-- OS is not supported by this plugin, skipping\n')
+
+    def test_not_applicable(self, tmpdir, capsys):
+        DeferredPlugin.calls = []
+        plugin = PluginInfo(__name__, 'DeferredPlugin', name='DeferredPlugin', desc='', version='1.0',
+                            supports_android=True, supports_ios=False,
+                            required_patterns=[re.compile(r'(.*/)?ADBMobileConfig(.*)\.json')],
+                            not_applicable='no config file')
+        context = ScanContext(TEST_APK)
+        context.android_manifest = 'AndroidManifest.xml'
+        cache = ResultCache(str(tmpdir))
+        for _ in range(2):
+            run = PluginRun(plugin, context, False, cache, 'hash')
+            run.start()
+            assert run.finish().endswith('-- Not applicable, no config file, skipping\n')
+        assert DeferredPlugin.calls == []
+
+    def test_applicable(self):
+        DeferredPlugin.calls = []
+        plugin = PluginInfo(__name__, 'DeferredPlugin', name='DeferredPlugin', desc='', version='1.0',
+                            supports_android=True, supports_ios=False, required_patterns=[re.compile(r'.*\.dex')],
+                            required_content=('AndroidManifest.xml', [b'no such signature', b'\x03\x00\x08\x00']))
+        context = ScanContext(TEST_APK)
+        context.android_manifest = 'AndroidManifest.xml'
+        run = PluginRun(plugin, context, False)
+        run.start()
+        assert run.finish().endswith('-- started\n-- finished\n')
+        assert DeferredPlugin.calls == ['scan', 'finish']
+
+    def test_online_not_cached(self, tmpdir):
+        DeferredPlugin.calls = []
+        plugin = PluginInfo(__name__, 'DeferredPlugin', name='DeferredPlugin', desc='', version='1.0',
+                            supports_android=True, supports_ios=False, supports_online=True)
+        cache = ResultCache(str(tmpdir))
+        context = ScanContext(TEST_APK)
+        context.android_manifest = 'AndroidManifest.xml'
+        for _ in range(2):
+            run = PluginRun(plugin, context, True, cache, 'hash')
+            run.start()
+            run.finish()
+        assert DeferredPlugin.calls == ['scan', 'finish', 'scan', 'finish']
+
+        # Offline runs of the same plugin are still cached
+        for _ in range(2):
+            run = PluginRun(plugin, context, False, cache, 'hash')
+            run.start()
+            run.finish()
+        assert DeferredPlugin.calls == ['scan', 'finish'] * 3
+
+    def test_cached_with_finish(self, tmpdir):
+        DeferredPlugin.calls = []
+        cache = ResultCache(str(tmpdir))
+        context = ScanContext(TEST_APK)
+        context.android_manifest = 'AndroidManifest.xml'
+        for _ in range(2):
+            run = PluginRun(TestScannerPluginRun.PLUGIN, context, False, cache, 'hash')
+            run.start()
+            assert run.finish().endswith('-- started\n-- finished\n')
+        assert DeferredPlugin.calls == ['scan', 'finish']
+
+
+# Tests for scanner.PluginRun with timeouts
+@pytest.mark.skipif(not IsolatedCall.is_supported(), reason='requires os.fork()')
+class TestScannerPluginRunTimeout(object):
+    PLUGIN = PluginInfo(__name__, 'SlowPlugin', name='SlowPlugin', desc='', version='1.0', supports_android=True,
+                        supports_ios=False)
+
+    @staticmethod
+    def run_plugin(cache=None, **kwargs):
+        context = ScanContext(TEST_APK, cache=cache)
+        context.android_manifest = 'AndroidManifest.xml'
+        run = PluginRun(TestScannerPluginRunTimeout.PLUGIN, context, False, cache, 'hash', **kwargs)
+        run.start()
+        return run.finish()
+
+    def test_finished(self, tmpdir):
+        SlowPlugin.delay = 0
+        cache = ResultCache(str(tmpdir))
+        assert TestScannerPluginRunTimeout.run_plugin(cache, timeout=10).endswith('-- done\n')
+        SlowPlugin.delay = 10
+        assert TestScannerPluginRunTimeout.run_plugin(cache, timeout=0.1).endswith('-- done\n')
+
+    def test_cache_in_child(self, tmpdir, monkeypatch):
+        cache = ResultCache(str(tmpdir))
+        cache.get('test')
+        monkeypatch.setattr(SlowPlugin, 'scan', lambda self: self.context.cache.put('test', 'from child'))
+        TestScannerPluginRunTimeout.run_plugin(cache, timeout=10)
+        assert cache.get('test') == 'from child'
+
+    def test_timeout(self, tmpdir):
+        SlowPlugin.delay = 10
+        cache = ResultCache(str(tmpdir))
+        output = TestScannerPluginRunTimeout.run_plugin(cache, timeout=0.1)
+        assert output.endswith('---- ISSUE: Plugin timed out after 0.1 seconds and was stopped, the file may be '
+                               'malformed\n')
+        SlowPlugin.delay = 0
+        assert TestScannerPluginRunTimeout.run_plugin(cache, timeout=10).endswith('-- done\n')
+
+    def test_deadline(self):
+        SlowPlugin.delay = 10
+        output = TestScannerPluginRunTimeout.run_plugin(deadline=time.monotonic() + 0.1)
+        assert '---- ISSUE: Plugin timed out' in output
+
+    def test_deadline_passed(self):
+        output = TestScannerPluginRunTimeout.run_plugin(deadline=time.monotonic() - 1)
+        assert output.endswith('---- ISSUE: Skipped, the time limit for the file was reached\n')
+
+    def test_failed(self, monkeypatch):
+        monkeypatch.setattr(SlowPlugin, 'scan', lambda self: 1 / 0)
+        output = TestScannerPluginRunTimeout.run_plugin(timeout=10)
+        assert output.endswith('-- ERROR: Plugin failed - ZeroDivisionError: division by zero\n')
+
+    def test_scan_file(self, capsys):
+        assert TruegazeScanner.scan_file(TEST_APK, False, plugin_timeout=30, file_timeout=60) == STATUS_OK
+        isolated = capsys.readouterr().out
+        TruegazeScanner.scan_file(TEST_APK, False)
+        assert isolated == capsys.readouterr().out
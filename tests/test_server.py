@@ -0,0 +1,179 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import json
+import multiprocessing
+import os
+import socket
+import stat
+import threading
+
+import pytest
+import requests
+
+from truegaze.scanner import STATUS_OK, TruegazeScanner
+from truegaze.server import ScanService
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), '..', 'test_data')
+TEST_APK = os.path.join(TEST_DATA, 'helloworld.apk')
+
+
+def exit_worker(filename):
+    os._exit(1)
+
+
+@pytest.fixture(scope='module')
+def service():
+    service = ScanService(jobs=1)
+    service.start()
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def server(service):
+    server = ScanService.create_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, kwargs=dict(poll_interval=0.05))
+    thread.start()
+    server.url = 'http://127.0.0.1:' + str(server.server_address[1])
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+# Tests for server.ScanService
+class TestScanService(object):
+    def test_scan(self, service):
+        result = service.scan(TEST_APK)
+        assert result['filename'] == TEST_APK
+        assert result['status'] == STATUS_OK
+        assert result['output'] == TruegazeScanner.scan_file_captured((TEST_APK, False, {}))[2]
+
+    def test_scan_unknown_platform(self, service, tmpdir):
+        path = tmpdir.join('test.apk')
+        path.write('foobar data')
+        assert service.scan(str(path))['status'] != STATUS_OK
+
+    def test_scan_worker_died(self, monkeypatch):
+        # The pool replaces the worker but never returns a result for its task
+        monkeypatch.setattr(ScanService, 'scan_in_worker', staticmethod(exit_worker))
+        service = ScanService(jobs=1, scan_timeout=1)
+        service.start()
+        try:
+            with pytest.raises(multiprocessing.TimeoutError) as error:
+                service.scan(TEST_APK)
+            assert 'the worker may have stopped' in str(error.value)
+        finally:
+            service.close()
+
+    def test_worker_warm_up(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(TruegazeScanner, 'warm_up', lambda: calls.append(1))
+        ScanService.init_worker(True, dict(max_ratio=10))
+        assert calls == [1]
+        assert ScanService._worker_online is True
+        assert ScanService._worker_options == dict(max_ratio=10)
+        ScanService.init_worker(False, {})
+
+
+# Tests for server.ScanRequestHandler over HTTP
+class TestScanServerHTTP(object):
+    def test_health(self, server):
+        response = requests.get(server.url + '/health')
+        assert response.status_code == 200
+        assert response.json()['status'] == 'ok'
+
+    def test_scan(self, server):
+        response = requests.post(server.url + '/scan', json=dict(filename=TEST_APK))
+        assert response.status_code == 200
+        assert response.headers['Content-Type'] == 'application/json'
+        assert response.json()['status'] == STATUS_OK
+        assert 'Identified as an Android application' in response.json()['output']
+
+    def test_scan_unknown_platform(self, server, tmpdir):
+        path = tmpdir.join('test.zip')
+        path.write('foobar data')
+        response = requests.post(server.url + '/scan', json=dict(filename=str(path)))
+        assert response.status_code == 200
+        assert response.json()['status'] != STATUS_OK
+
+    def test_scan_not_found(self, server):
+        response = requests.post(server.url + '/scan', json=dict(filename='blablabla'))
+        assert response.status_code == 404
+
+    def test_scan_error(self, server, monkeypatch):
+        def fail_scan(filename):
+            raise RuntimeError('worker pool is closed')
+        monkeypatch.setattr(server.service, 'scan', fail_scan)
+        response = requests.post(server.url + '/scan', json=dict(filename=TEST_APK))
+        assert response.status_code == 500
+        assert response.json() == dict(error='Scan failed: worker pool is closed')
+
+    def test_scan_invalid(self, server):
+        assert requests.post(server.url + '/scan', data='not json').status_code == 400
+        assert requests.post(server.url + '/scan', json=dict(file=TEST_APK)).status_code == 400
+        assert requests.post(server.url + '/scan', json=dict(filename=1)).status_code == 400
+        assert requests.post(server.url + '/scan', json=[TEST_APK]).status_code == 400
+
+    def test_scan_too_large(self, server):
+        assert requests.post(server.url + '/scan', data='x' * 100000).status_code == 413
+
+    def test_not_found(self, server):
+        assert requests.get(server.url + '/scan').status_code == 404
+        assert requests.post(server.url + '/other', json=dict(filename=TEST_APK)).status_code == 404
+
+
+# Tests for server.ScanRequestHandler over a Unix socket
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets are not supported')
+class TestScanServerUnixSocket(object):
+    def test_scan(self, service, tmpdir):
+        socket_path = str(tmpdir.join('truegaze.sock'))
+        server = ScanService.create_server(service, socket_path=socket_path)
+        thread = threading.Thread(target=server.serve_forever, kwargs=dict(poll_interval=0.05))
+        thread.start()
+        try:
+            assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+
+            body = json.dumps(dict(filename=TEST_APK)).encode()
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(socket_path)
+            client.sendall(b'POST /scan HTTP/1.0\r\nContent-Length: ' + str(len(body)).encode() + b'\r\n\r\n' +
+                           body)
+            response = b''
+            for chunk in iter(lambda: client.recv(65536), b''):
+                response += chunk
+            client.close()
+
+            headers, body = response.split(b'\r\n\r\n', 1)
+            assert headers.startswith(b'HTTP/1.0 200')
+            assert json.loads(body.decode())['status'] == STATUS_OK
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def test_replaces_stale_socket(self, service, tmpdir):
+        socket_path = str(tmpdir.join('truegaze.sock'))
+        ScanService.create_server(service, socket_path=socket_path).server_close()
+        ScanService.create_server(service, socket_path=socket_path).server_close()
@@ -21,10 +21,15 @@
 # specific language governing permissions and limitations
 # under the License.
 #
-import io, plistlib, re
+import io, os, plistlib, re
 from zipfile import ZipFile, ZipInfo
 
-from truegaze.utils import ANDROID_MANIFEST, TruegazeUtils
+import pytest
+
+from truegaze.axml import AxmlError
+from truegaze.utils import AAB_MANIFEST, ANDROID_MANIFEST, TruegazeUtils
+
+TEST_APK = os.path.join(os.path.dirname(__file__), '..', 'test_data', 'helloworld.apk')
 
 
 # Tests for utils.get_version()
@@ -34,6 +39,21 @@ class TestUtilsGetVersion(object):
         assert pattern.match(TruegazeUtils.get_version()) is not None
 
 
+# Tests for utils.get_file_hash()
+class TestUtilsGetFileHash(object):
+    def test_empty(self, tmpdir):
+        path = tmpdir.join('test')
+        path.write('')
+        assert TruegazeUtils.get_file_hash(str(path)) == \
+            'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'
+
+    def test_valid(self, tmpdir):
+        path = tmpdir.join('test')
+        path.write('testdata')
+        assert TruegazeUtils.get_file_hash(str(path)) == \
+            '810ff2fb242a5dee4220f2cb0e6a519891fb67f2f828a6cab4ef8894633b1f50'
+
+
 # Tests for utils.open_file_as_zip()
 class TestUtilsOpenFileAsZip(object):
     def test_not_found(self):
@@ -53,6 +73,25 @@ class TestUtilsOpenFileAsZip(object):
         assert TruegazeUtils.open_file_as_zip(zip_buffer) is not None
 
 
+# Tests for utils.read_zip_entry()
+class TestUtilsReadZipEntry(object):
+    def test_mapped(self, tmpdir):
+        path = str(tmpdir.join('test.zip'))
+        with ZipFile(path, 'w') as zip_file:
+            zip_file.writestr('testfile', 'testdata')
+        with TruegazeUtils.open_file_as_zip(path) as zip_file:
+            data = TruegazeUtils.read_zip_entry(zip_file, 'testfile')
+            assert isinstance(data, memoryview)
+            assert data == b'testdata'
+            data.release()
+
+    def test_regular(self):
+        zip_buffer = io.BytesIO()
+        with ZipFile(zip_buffer, 'w') as zip_file:
+            zip_file.writestr('testfile', 'testdata')
+        assert TruegazeUtils.read_zip_entry(ZipFile(zip_buffer), 'testfile') == b'testdata'
+
+
 # Tests for utils.get_android_manifest()
 class TestUtilsGetAndroidManifest(object):
     def test_empty(self):
@@ -86,6 +125,29 @@ class TestUtilsGetAndroidManifest(object):
         zip_file.writestr(ANDROID_MANIFEST, 'manifest data')
         assert TruegazeUtils.get_android_manifest(zip_file) == ANDROID_MANIFEST
 
+    def test_app_bundle(self):
+        zip_file = ZipFile(io.BytesIO(), 'a')
+        zip_file.writestr(AAB_MANIFEST, 'manifest data')
+        assert TruegazeUtils.get_android_manifest(zip_file) == AAB_MANIFEST
+
+
+# Tests for utils.get_android_app_info()
+class TestUtilsGetAndroidAppInfo(object):
+    def test_valid(self):
+        zip_file = ZipFile(TEST_APK)
+        assert TruegazeUtils.get_android_app_info(zip_file)['package'] == 'opensecurity.helloworld'
+
+    def test_invalid(self):
+        zip_file = ZipFile(io.BytesIO(), 'a')
+        zip_file.writestr(ANDROID_MANIFEST, 'manifest data')
+        with pytest.raises(AxmlError):
+            TruegazeUtils.get_android_app_info(zip_file)
+
+    def test_app_bundle(self):
+        zip_file = ZipFile(io.BytesIO(), 'a')
+        zip_file.writestr(AAB_MANIFEST, 'manifest data')
+        assert TruegazeUtils.get_android_app_info(zip_file, AAB_MANIFEST) is None
+
 
 # Tests for utils.get_ios_manifest()
 class TestUtilsGetiOSManifest(object):
@@ -198,3 +260,29 @@ class TestUtilsGetMatchingPathsFromZipFile(object):
         paths = TruegazeUtils.get_matching_paths_from_zip(zip_file, re.compile(r'.*est.*\.txt'))
         assert len(paths) == 1
         assert paths[0] == 'test/test.txt'
+
+
+# Tests for utils.get_matching_paths_for_patterns()
+class TestUtilsGetMatchingPathsForPatterns(object):
+    def test_empty(self):
+        zip_file = ZipFile(io.BytesIO(), 'a')
+        pattern = re.compile(r'.*')
+        assert TruegazeUtils.get_matching_paths_for_patterns(zip_file, [pattern]) == {pattern: []}
+
+    def test_no_patterns(self):
+        zip_file = ZipFile(io.BytesIO(), 'a')
+        zip_file.writestr('test', '')
+        assert TruegazeUtils.get_matching_paths_for_patterns(zip_file, []) == {}
+
+    def test_valid_multiple_patterns(self):
+        zip_file = ZipFile(io.BytesIO(), 'a')
+        zip_file.writestr('test1.txt', '')
+        zip_file.writestr('test/test2.doc', '')
+        zip_file.writestr('test/test/test3.md', '')
+        pattern1 = re.compile(r'.*\.txt')
+        pattern2 = re.compile(r'test/.*')
+        pattern3 = re.compile(r'.*\.pdf')
+        paths = TruegazeUtils.get_matching_paths_for_patterns(zip_file, [pattern1, pattern2, pattern3])
+        assert paths[pattern1] == ['test1.txt']
+        assert paths[pattern2] == ['test/test2.doc', 'test/test/test3.md']
+        assert paths[pattern3] == []
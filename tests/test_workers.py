@@ -0,0 +1,116 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import os
+
+import pytest
+
+from truegaze.workers import WorkerPool, get_rss, is_memory_limit_supported
+
+
+def square(value):
+    return value * value
+
+
+def get_pid(value):
+    return os.getpid()
+
+
+def crash_on_two(value):
+    if value == 2:
+        os._exit(1)
+    return value
+
+
+def fail(value):
+    raise ValueError('test failure')
+
+
+def allocate(size):
+    return len(bytearray(size))
+
+
+# Tests for workers.get_rss()
+class TestGetRss(object):
+    def test_positive(self):
+        assert get_rss() > 0
+
+
+# Tests for workers.WorkerPool.imap()
+class TestWorkerPoolImap(object):
+    def test_ordered(self):
+        assert list(WorkerPool(square, 2).imap(range(10))) == [value * value for value in range(10)]
+
+    def test_unordered(self):
+        assert sorted(WorkerPool(square, 2).imap(range(10), ordered=False)) == [value * value for value in range(10)]
+
+    def test_empty(self):
+        assert list(WorkerPool(square, 2).imap([])) == []
+
+    def test_workers_reused(self):
+        assert len(set(WorkerPool(get_pid, 1).imap(range(5)))) == 1
+
+    def test_max_files(self):
+        pool = WorkerPool(get_pid, 1, max_files=2)
+        assert len(set(pool.imap(range(6)))) == 3
+        assert pool.recycled == 3
+
+    def test_max_memory(self):
+        assert len(set(WorkerPool(get_pid, 1, max_memory=1).imap(range(3)))) == 3
+
+    def test_worker_died(self):
+        pool = WorkerPool(crash_on_two, 1, on_failure=lambda value: 'failed ' + str(value))
+        assert list(pool.imap(range(4))) == [0, 1, 'failed 2', 3]
+
+    def test_worker_died_without_handler(self):
+        with pytest.raises(EOFError):
+            list(WorkerPool(crash_on_two, 1).imap(range(4)))
+
+    def test_exception(self):
+        with pytest.raises(ValueError):
+            list(WorkerPool(fail, 2).imap(range(4)))
+
+    @pytest.mark.skipif(not is_memory_limit_supported(), reason='requires the resource module')
+    def test_memory_limit(self):
+        pool = WorkerPool(allocate, 1, memory_limit=512 * 1024 * 1024, on_failure=lambda value: None)
+        assert list(pool.imap([1024, 1024 * 1024 * 1024, 1024])) == [1024, None, 1024]
+
+    def test_read_lazily(self):
+        read = []
+
+        def get_tasks():
+            for value in range(100):
+                read.append(value)
+                yield value
+
+        results = WorkerPool(square, 2).imap(get_tasks(), max_pending=4)
+        next(results)
+        assert len(read) <= 5
+        results.close()
+
+    def test_stop_early(self):
+        pool = WorkerPool(square, 2)
+        results = pool.imap(range(100))
+        next(results)
+        results.close()
+        assert pool.workers == []
@@ -0,0 +1,264 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import re
+import struct
+
+from asn1crypto import cms, x509
+
+# Signature of the ZIP end of central directory record
+EOCD_SIGNATURE = b'PK\x05\x06'
+
+# Size of the end of central directory record, without the comment
+EOCD_SIZE = 22
+
+# Maximum size of the ZIP file comment that can follow the end of central directory record
+MAX_COMMENT_SIZE = 0xFFFF
+
+# Magic value at the end of the APK Signing Block
+SIGNING_BLOCK_MAGIC = b'APK Sig Block 42'
+
+# IDs of the v2 and v3 signature schemes in the APK Signing Block
+SIGNATURE_V2_ID = 0x7109871a
+SIGNATURE_V3_ID = 0xf05368c0
+
+# Regex pattern for the v1 (JAR) signature files
+SIGNATURE_FILE_PATTERN = re.compile(r'META-INF/.*\.(RSA|DSA|EC)$')
+
+
+class ApkSigningError(Exception):
+    """Raised when the signing information in an APK is malformed"""
+
+
+class ApkSigner(object):
+    """A signer found in an APK, with its certificates and signatures"""
+
+    def __init__(self, certificates, signatures):
+        """
+        Main constructor
+
+        :param certificates: list of DER encoded X.509 certificates
+        :param signatures: list of tuples of (signature algorithm ID, raw signature), the algorithm ID is None
+                           for v1 signatures
+        """
+        self.certificates = certificates
+        self.signatures = signatures
+
+    def get_certificates(self):
+        """
+        Parses the certificates
+
+        :return: list of asn1crypto.x509.Certificate
+        """
+        return [x509.Certificate.load(certificate) for certificate in self.certificates]
+
+
+class ApkSigningInfo(object):
+    """
+    Reads the signers of an APK directly from the ZIP, without parsing the manifest, resources or code. The v1
+    signers come from the META-INF signature files, and the v2 and v3 signers from the APK Signing Block which
+    is located via the ZIP end of central directory record.
+    """
+
+    def __init__(self, v1_signers, v2_signers, v3_signers):
+        """
+        Main constructor
+
+        :param v1_signers: list of ApkSigner from the JAR signature files
+        :param v2_signers: list of ApkSigner from the v2 signature scheme block
+        :param v3_signers: list of ApkSigner from the v3 signature scheme block
+        """
+        self.v1_signers = v1_signers
+        self.v2_signers = v2_signers
+        self.v3_signers = v3_signers
+
+    @property
+    def signers(self):
+        """All signers, regardless of the signature scheme"""
+        return self.v1_signers + self.v2_signers + self.v3_signers
+
+    @staticmethod
+    def read(zip_file, paths=None):
+        """
+        Reads the signers from an APK
+
+        :param zip_file: zipfile.ZipFile of the APK, which must be backed by a seekable file
+        :param paths: optional list of paths matching SIGNATURE_FILE_PATTERN, if they were already found
+        :return: ApkSigningInfo
+        """
+        v1_signers = ApkSigningInfo.read_v1_signers(zip_file, paths)
+        blocks = ApkSigningInfo.read_signing_block(zip_file.fp)
+        v2_signers = ApkSigningInfo.parse_signers(blocks.get(SIGNATURE_V2_ID), False)
+        v3_signers = ApkSigningInfo.parse_signers(blocks.get(SIGNATURE_V3_ID), True)
+        return ApkSigningInfo(v1_signers, v2_signers, v3_signers)
+
+    @staticmethod
+    def read_v1_signers(zip_file, paths=None):
+        """
+        Reads the signers from the JAR signature files, only files with a matching .SF file are used
+
+        :param zip_file: zipfile.ZipFile of the APK
+        :param paths: optional list of paths matching SIGNATURE_FILE_PATTERN, if they were already found
+        :return: list of ApkSigner
+        """
+        if paths is None:
+            paths = [path for path in zip_file.namelist() if SIGNATURE_FILE_PATTERN.match(path)]
+
+        signers = []
+        for path in paths:
+            try:
+                zip_file.getinfo(path.rsplit('.', 1)[0] + '.SF')
+            except KeyError:
+                continue
+
+            content = cms.ContentInfo.load(zip_file.read(path))['content']
+            certificates = [certificate.chosen.dump() for certificate in content['certificates']]
+            signatures = [(None, signer_info['signature'].contents) for signer_info in content['signer_infos']]
+            signers.append(ApkSigner(certificates, signatures))
+
+        return signers
+
+    @staticmethod
+    def find_central_directory(file):
+        """
+        Finds the start of the ZIP central directory via the end of central directory record
+
+        :param file: seekable binary file object of the APK
+        :return: offset of the central directory, or None if it was not found
+        """
+        file.seek(0, 2)
+        file_size = file.tell()
+        tail_size = min(file_size, EOCD_SIZE + MAX_COMMENT_SIZE)
+        file.seek(file_size - tail_size)
+        tail = file.read(tail_size)
+
+        # Search backwards, the record must cover the rest of the file including its comment
+        position = tail.rfind(EOCD_SIGNATURE)
+        while position >= 0:
+            if position + EOCD_SIZE <= len(tail):
+                comment_size = struct.unpack_from('<H', tail, position + 20)[0]
+                if position + EOCD_SIZE + comment_size == len(tail):
+                    return struct.unpack_from('<I', tail, position + 16)[0]
+            position = tail.rfind(EOCD_SIGNATURE, 0, position)
+
+        return None
+
+    @staticmethod
+    def read_signing_block(file):
+        """
+        Reads the ID-value pairs from the APK Signing Block, which sits right before the central directory
+
+        :param file: seekable binary file object of the APK
+        :return: dictionary of ID to value, empty if there is no signing block
+        """
+        central_directory = ApkSigningInfo.find_central_directory(file)
+        if central_directory is None or central_directory < 32:
+            return dict()
+
+        # The block ends with its size and a magic value
+        file.seek(central_directory - 24)
+        block_size, magic = struct.unpack('<Q16s', file.read(24))
+        if magic != SIGNING_BLOCK_MAGIC:
+            return dict()
+        if block_size < 24 or block_size + 8 > central_directory:
+            raise ApkSigningError('Invalid APK Signing Block size')
+
+        # The block starts with the same size, followed by the pairs
+        file.seek(central_directory - block_size - 8)
+        data = file.read(block_size - 16)
+        if struct.unpack_from('<Q', data)[0] != block_size:
+            raise ApkSigningError('APK Signing Block sizes do not match')
+
+        blocks = dict()
+        position = 8
+        while position + 12 <= len(data):
+            pair_size, pair_id = struct.unpack_from('<QI', data, position)
+            if pair_size < 4 or position + 8 + pair_size > len(data):
+                raise ApkSigningError('Invalid APK Signing Block entry size')
+            blocks[pair_id] = data[position + 12:position + 8 + pair_size]
+            position += 8 + pair_size
+
+        return blocks
+
+    @staticmethod
+    def parse_signers(block, is_v3):
+        """
+        Parses the signers from a v2 or v3 signature scheme block
+
+        :param block: value of the block from the APK Signing Block, or None
+        :param is_v3: whether this is a v3 block, which has extra SDK version fields
+        :return: list of ApkSigner
+        """
+        if block is None:
+            return []
+
+        signers = []
+        for signer in ApkSigningInfo.read_sequence(ApkSigningInfo.read_prefixed(block, 0)[0]):
+            signed_data, position = ApkSigningInfo.read_prefixed(signer, 0)
+            if is_v3:
+                position += 8  # minimum and maximum SDK versions
+            signatures = ApkSigningInfo.read_prefixed(signer, position)[0]
+
+            # Signed data contains the digests followed by the certificates
+            digests_end = ApkSigningInfo.read_prefixed(signed_data, 0)[1]
+            certificates = ApkSigningInfo.read_prefixed(signed_data, digests_end)[0]
+
+            # Each signature is the algorithm ID followed by the signature itself
+            signature_list = []
+            for item in ApkSigningInfo.read_sequence(signatures):
+                if len(item) < 4:
+                    raise ApkSigningError('Truncated APK signature data')
+                signature_list.append((struct.unpack_from('<I', item)[0], ApkSigningInfo.read_prefixed(item, 4)[0]))
+            signers.append(ApkSigner(list(ApkSigningInfo.read_sequence(certificates)), signature_list))
+
+        return signers
+
+    @staticmethod
+    def read_prefixed(data, position):
+        """
+        Reads a value prefixed with its 32-bit length
+
+        :param data: bytes to read from
+        :param position: offset of the length
+        :return: tuple of (value, offset after the value)
+        """
+        if position + 4 > len(data):
+            raise ApkSigningError('Truncated APK signature data')
+        size = struct.unpack_from('<I', data, position)[0]
+        end = position + 4 + size
+        if end > len(data):
+            raise ApkSigningError('Truncated APK signature data')
+        return data[position + 4:end], end
+
+    @staticmethod
+    def read_sequence(data):
+        """
+        Reads a sequence of length-prefixed values
+
+        :param data: bytes to read from
+        :return: generator of values
+        """
+        position = 0
+        while position < len(data):
+            value, position = ApkSigningInfo.read_prefixed(data, position)
+            yield value
@@ -0,0 +1,630 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+from array import array
+from bisect import bisect_left, bisect_right
+import io
+import mmap
+import os
+import struct
+import zipfile
+import zlib
+
+# Signature and size of the end of central directory record, without the comment
+EOCD_SIGNATURE = b'PK\x05\x06'
+EOCD_SIZE = 22
+
+# Maximum size of the ZIP file comment that can follow the end of central directory record
+MAX_COMMENT_SIZE = 0xFFFF
+
+# Signatures and sizes of the ZIP64 end of central directory locator and record
+ZIP64_LOCATOR_SIGNATURE = b'PK\x06\x07'
+ZIP64_LOCATOR_SIZE = 20
+ZIP64_EOCD_SIGNATURE = b'PK\x06\x06'
+ZIP64_EOCD_SIZE = 56
+
+# Signature and size of each central directory record, without the name, extra field and comment
+CENTRAL_DIRECTORY_SIGNATURE = b'PK\x01\x02'
+CENTRAL_DIRECTORY_SIZE = 46
+
+# Signature and size of the local file header that comes before each entry's data
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+LOCAL_HEADER_SIZE = 30
+
+# ID of the ZIP64 extra field, and the value marking fields that are stored in it
+ZIP64_EXTRA_ID = 0x0001
+ZIP64_LIMIT = 0xFFFFFFFF
+
+# Entry flags for encrypted entries and UTF-8 names
+FLAG_ENCRYPTED = 0x1
+FLAG_UTF8 = 0x800
+
+# Default maximum decompressed size of an entry in bytes
+DEFAULT_MAX_ENTRY_SIZE = 100 * 1024 * 1024
+
+# Default maximum ratio of decompressed to compressed size of an entry
+DEFAULT_MAX_RATIO = 200
+
+# Decompressed size after which the compression ratio is checked, so that small and highly compressible files
+# such as blank images don't trip it
+RATIO_CHECK_SIZE = 1024 * 1024
+
+# Size of the chunks that entries are read and decompressed in
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class EntryLimitError(Exception):
+    """Raised when an entry is larger or more compressed than the limits allow, which can mean a zip bomb"""
+
+    def __init__(self, name, message):
+        """
+        Main constructor
+
+        :param name: name of the entry
+        :param message: description of the limit that was exceeded
+        """
+        super(EntryLimitError, self).__init__('File "' + name + '" ' + message)
+        self.name = name
+
+
+class ZipIndex(object):
+    """
+    Compact index of a ZIP central directory. Names are kept in a single buffer separated by null bytes, and
+    the other fields in array columns, so that archives with hundreds of thousands of entries don't need a
+    ZipInfo object for each one. Lookups by name, prefix and extension search the name buffer directly.
+    """
+
+    def __init__(self):
+        """Main constructor, creates an empty index"""
+        self.names = bytearray(b'\x00')
+        self.name_offsets = array('Q')
+        self.header_offsets = array('Q')
+        self.compress_sizes = array('Q')
+        self.file_sizes = array('Q')
+        self.crcs = array('L')
+        self.methods = array('H')
+        self.flags = array('H')
+        self.date_times = array('L')
+        self.external_attrs = array('L')
+
+    def __len__(self):
+        return len(self.name_offsets)
+
+    @staticmethod
+    def parse(data, count, concat=0):
+        """
+        Parses the central directory
+
+        :param data: bytes or memoryview of the central directory
+        :param count: number of entries in the central directory
+        :param concat: number of bytes prepended to the archive, added to the offsets of the entries
+        :return: ZipIndex
+        """
+        index = ZipIndex()
+        position = 0
+        for _ in range(count):
+            if position + CENTRAL_DIRECTORY_SIZE > len(data) or \
+                    bytes(data[position:position + 4]) != CENTRAL_DIRECTORY_SIGNATURE:
+                raise zipfile.BadZipFile('Bad magic number for central directory')
+
+            flags, method, time, date, crc, compress_size, file_size, name_size, extra_size, comment_size, \
+                _, _, external_attr, header_offset = struct.unpack_from('<HHHHIIIHHHHHII', data, position + 8)
+            position += CENTRAL_DIRECTORY_SIZE
+            if position + name_size + extra_size + comment_size > len(data):
+                raise zipfile.BadZipFile('Truncated central directory')
+
+            # Names are stored as UTF-8, converting the ones that use the legacy encoding. They are cut off at the
+            # first null byte like zipfile does, which also keeps them from breaking up the name buffer.
+            name = bytes(data[position:position + name_size]).split(b'\x00', 1)[0]
+            if not flags & FLAG_UTF8:
+                name = name.decode('cp437').encode('utf-8')
+            position += name_size
+
+            # Sizes and offsets that don't fit in 32 bits are stored in the ZIP64 extra field
+            if ZIP64_LIMIT in (file_size, compress_size, header_offset):
+                file_size, compress_size, header_offset = ZipIndex.parse_zip64_extra(
+                    data[position:position + extra_size], file_size, compress_size, header_offset)
+            position += extra_size + comment_size
+
+            index.name_offsets.append(len(index.names))
+            index.names += name + b'\x00'
+            index.header_offsets.append(header_offset + concat)
+            index.compress_sizes.append(compress_size)
+            index.file_sizes.append(file_size)
+            index.crcs.append(crc)
+            index.methods.append(method)
+            index.flags.append(flags)
+            index.date_times.append((date << 16) | time)
+            index.external_attrs.append(external_attr)
+
+        return index
+
+    @staticmethod
+    def parse_zip64_extra(extra, file_size, compress_size, header_offset):
+        """
+        Reads the sizes and offset from the ZIP64 extra field, for the fields that are marked as stored there
+
+        :param extra: bytes or memoryview of the extra field
+        :param file_size: uncompressed size from the central directory
+        :param compress_size: compressed size from the central directory
+        :param header_offset: offset of the local file header from the central directory
+        :return: tuple of (file size, compressed size, header offset)
+        """
+        position = 0
+        while position + 4 <= len(extra):
+            field_id, field_size = struct.unpack_from('<HH', extra, position)
+            position += 4
+            if field_id == ZIP64_EXTRA_ID:
+                values = list()
+                for offset in range(0, field_size - field_size % 8, 8):
+                    values.append(struct.unpack_from('<Q', extra, position + offset)[0])
+                try:
+                    if file_size == ZIP64_LIMIT:
+                        file_size = values.pop(0)
+                    if compress_size == ZIP64_LIMIT:
+                        compress_size = values.pop(0)
+                    if header_offset == ZIP64_LIMIT:
+                        header_offset = values.pop(0)
+                except IndexError:
+                    raise zipfile.BadZipFile('Corrupt ZIP64 extra field')
+                break
+            position += field_size
+
+        return file_size, compress_size, header_offset
+
+    def get_name(self, index):
+        """
+        Gets the name of an entry
+
+        :param index: position of the entry in the central directory
+        :return: name
+        """
+        start = self.name_offsets[index]
+        end = self.name_offsets[index + 1] - 1 if index + 1 < len(self.name_offsets) else len(self.names) - 1
+        return self.names[start:end].decode('utf-8')
+
+    def iter_names(self):
+        """
+        Iterates over the names of all entries without building a list of them
+
+        :return: generator of names
+        """
+        for index in range(len(self.name_offsets)):
+            yield self.get_name(index)
+
+    def find(self, name):
+        """
+        Finds an entry by name, the last one wins if the name appears more than once like in zipfile
+
+        :param name: name of the entry
+        :return: position of the entry in the central directory, or None if it doesn't exist
+        """
+        position = self.names.rfind(b'\x00' + name.encode('utf-8') + b'\x00')
+        if position < 0:
+            return None
+        return bisect_left(self.name_offsets, position + 1)
+
+    def find_prefix(self, prefix):
+        """
+        Finds entries whose names start with a prefix
+
+        :param prefix: prefix to look for, such as a directory name ending with a slash
+        :return: generator of positions of the entries in the central directory
+        """
+        needle = b'\x00' + prefix.encode('utf-8')
+        position = self.names.find(needle, 0, len(self.names) - 1)
+        while position >= 0:
+            yield bisect_left(self.name_offsets, position + 1)
+            position = self.names.find(needle, position + 1, len(self.names) - 1)
+
+    def find_extension(self, extension):
+        """
+        Finds entries whose names end with an extension
+
+        :param extension: extension to look for, including the dot
+        :return: generator of positions of the entries in the central directory
+        """
+        needle = extension.encode('utf-8') + b'\x00'
+        position = self.names.find(needle, 1)
+        while position >= 0:
+            yield bisect_right(self.name_offsets, position) - 1
+            position = self.names.find(needle, position + 1)
+
+    def get_info(self, index):
+        """
+        Builds a ZipInfo object for an entry, for callers that need one
+
+        :param index: position of the entry in the central directory
+        :return: zipfile.ZipInfo
+        """
+        date_time = self.date_times[index]
+        date, time = date_time >> 16, date_time & 0xFFFF
+        info = zipfile.ZipInfo(self.get_name(index), ((date >> 9) + 1980, (date >> 5) & 0xF, date & 0x1F,
+                                                      time >> 11, (time >> 5) & 0x3F, (time & 0x1F) * 2))
+        info.compress_type = self.methods[index]
+        info.flag_bits = self.flags[index]
+        info.CRC = self.crcs[index]
+        info.compress_size = self.compress_sizes[index]
+        info.file_size = self.file_sizes[index]
+        info.header_offset = self.header_offsets[index]
+        info.external_attr = self.external_attrs[index]
+        return info
+
+
+class ArchiveView(io.RawIOBase):
+    """
+    Read-only seekable file over a buffer, such as a STORED entry of a memory mapped archive or a decompressed
+    entry, used to open archives nested inside other archives without copying or extracting them to disk
+    """
+
+    def __init__(self, buffer, name=None):
+        """
+        Main constructor
+
+        :param buffer: bytes, memoryview or other object supporting the buffer protocol
+        :param name: optional name of the file
+        """
+        super(ArchiveView, self).__init__()
+        self.view = memoryview(buffer)
+        self.name = name
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = max(0, min(len(buffer), len(self.view) - self._position))
+        buffer[:size] = self.view[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        if offset < 0:
+            raise ValueError('Negative seek position ' + str(offset))
+        self._position = offset
+        return offset
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        """Closes the file and releases the buffer, unless views into it are still in use"""
+        try:
+            self.view.release()
+        except BufferError:
+            pass
+        super(ArchiveView, self).close()
+
+
+class MappedZipFile(object):
+    """
+    Read-only ZIP file backed by a memory map of the whole archive and a compact ZipIndex of its central
+    directory. It supports the subset of the zipfile.ZipFile API used by the scanner, building ZipInfo objects
+    only when asked for one. Entries can also be read with read_view(), which returns a memoryview into the map
+    for STORED entries without copying them, and decompresses DEFLATE entries straight from the mapped region.
+    Pages are loaded by the OS as they are touched, so large archives don't need to fit in memory. Archives
+    nested inside other archives are opened through an ArchiveView, which is used in place of the map and closed
+    along with the archive. Files without a file descriptor, such as BytesIO objects, are read with regular seeks
+    and reads instead.
+
+    All reads are streamed and bounded, raising EntryLimitError as soon as an entry goes over the maximum size
+    or compression ratio, so that a single crafted entry can't use up the memory of the process.
+    """
+
+    def __init__(self, file, max_entry_size=DEFAULT_MAX_ENTRY_SIZE, max_ratio=DEFAULT_MAX_RATIO):
+        """
+        Main constructor
+
+        :param file: path or seekable binary file object to open
+        :param max_entry_size: maximum decompressed size of an entry in bytes, None for no limit
+        :param max_ratio: maximum ratio of decompressed to compressed size of an entry, None for no limit
+        """
+        self.max_entry_size = max_entry_size
+        self.max_ratio = max_ratio
+        self._map = None
+        self._own_fp = isinstance(file, (str, bytes, os.PathLike))
+        self.fp = open(file, 'rb') if self._own_fp else file
+        self.filename = file if self._own_fp else getattr(file, 'name', None)
+        try:
+            if isinstance(self.fp, ArchiveView):
+                self._map = self.fp.view
+            else:
+                try:
+                    self._map = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+                except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+                    pass
+            self.index = self.read_index()
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def is_mapped(self):
+        """Whether the archive is memory mapped"""
+        return self._map is not None
+
+    def get_size(self):
+        """
+        Gets the size of the archive
+
+        :return: size in bytes
+        """
+        if self._map is not None:
+            return len(self._map)
+        self.fp.seek(0, 2)
+        return self.fp.tell()
+
+    def read_at(self, offset, size):
+        """
+        Reads bytes from the archive
+
+        :param offset: offset to read from
+        :param size: number of bytes to read
+        :return: bytes, shorter than the size if the end of the archive was reached
+        """
+        if self._map is not None:
+            data = self._map[offset:offset + size]
+            return data if isinstance(data, bytes) else data.tobytes()
+        self.fp.seek(offset)
+        data = self.fp.read(size)
+        if not isinstance(data, bytes):
+            raise zipfile.BadZipFile('File is not a zip file')
+        return data
+
+    def read_index(self):
+        """
+        Finds the central directory via the end of central directory record and indexes it
+
+        :return: ZipIndex
+        """
+        size = self.get_size()
+        tail_offset = max(0, size - EOCD_SIZE - MAX_COMMENT_SIZE)
+        tail = self.read_at(tail_offset, size - tail_offset)
+
+        # Prefer the record that covers the rest of the file including its comment, since the comment itself
+        # can contain the signature
+        eocd = None
+        position = tail.rfind(EOCD_SIGNATURE)
+        while position >= 0:
+            if position + EOCD_SIZE <= len(tail):
+                eocd = position if eocd is None else eocd
+                comment_size = struct.unpack_from('<H', tail, position + 20)[0]
+                if position + EOCD_SIZE + comment_size == len(tail):
+                    eocd = position
+                    break
+            position = tail.rfind(EOCD_SIGNATURE, 0, position)
+        if eocd is None:
+            raise zipfile.BadZipFile('File is not a zip file')
+
+        count, cd_size, cd_offset = struct.unpack_from('<HII', tail, eocd + 10)
+        cd_end = tail_offset + eocd
+
+        # ZIP64 archives have their own record with the real values right before the locator
+        locator_offset = cd_end - ZIP64_LOCATOR_SIZE
+        if locator_offset >= 0 and self.read_at(locator_offset, 4) == ZIP64_LOCATOR_SIGNATURE:
+            zip64_offset = struct.unpack('<Q', self.read_at(locator_offset + 8, 8))[0]
+            zip64_eocd = self.read_at(zip64_offset, ZIP64_EOCD_SIZE)
+            if len(zip64_eocd) != ZIP64_EOCD_SIZE or zip64_eocd[0:4] != ZIP64_EOCD_SIGNATURE:
+                raise zipfile.BadZipFile('Corrupt ZIP64 end of central directory record')
+            count, cd_size, cd_offset = struct.unpack_from('<QQQ', zip64_eocd, 32)
+            cd_end = locator_offset - ZIP64_EOCD_SIZE
+
+        # Data prepended to the archive shifts all of the offsets, same as in zipfile
+        concat = cd_end - cd_size - cd_offset
+        if concat < 0:
+            raise zipfile.BadZipFile('Bad offset for central directory')
+
+        if self._map is not None:
+            data = memoryview(self._map)[cd_offset + concat:cd_end]
+            try:
+                return ZipIndex.parse(data, count, concat)
+            finally:
+                data.release()
+        return ZipIndex.parse(self.read_at(cd_offset + concat, cd_size), count, concat)
+
+    def namelist(self):
+        """
+        Gets the names of all entries, prefer index.iter_names() for large archives
+
+        :return: list of names
+        """
+        return list(self.index.iter_names())
+
+    def infolist(self):
+        """
+        Gets ZipInfo objects for all entries
+
+        :return: list of zipfile.ZipInfo
+        """
+        return [self.index.get_info(index) for index in range(len(self.index))]
+
+    def getinfo(self, name):
+        """
+        Gets a ZipInfo object for an entry
+
+        :param name: name of the entry
+        :return: zipfile.ZipInfo
+        """
+        index = self.index.find(name)
+        if index is None:
+            raise KeyError('There is no item named ' + repr(name) + ' in the archive')
+        return self.index.get_info(index)
+
+    def get_data_offset(self, info):
+        """
+        Gets the offset of an entry's data by reading its local file header
+
+        :param info: zipfile.ZipInfo of the entry
+        :return: offset of the first byte of data in the archive
+        """
+        offset = info.header_offset
+        header = self.read_at(offset, LOCAL_HEADER_SIZE)
+        if len(header) != LOCAL_HEADER_SIZE or header[0:4] != LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile('Bad local file header for entry: ' + info.filename)
+
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        offset += LOCAL_HEADER_SIZE + name_length + extra_length
+        if offset + info.compress_size > self.get_size():
+            raise zipfile.BadZipFile('Truncated data for entry: ' + info.filename)
+        return offset
+
+    def check_limits(self, info, size, compress_size):
+        """
+        Checks an entry against the size and ratio limits
+
+        :param info: zipfile.ZipInfo of the entry
+        :param size: decompressed size, so far or in total
+        :param compress_size: compressed size that the decompressed size came from
+        """
+        if self.max_entry_size is not None and size > self.max_entry_size:
+            raise EntryLimitError(info.filename, 'is larger than the limit of ' + str(self.max_entry_size) +
+                                  ' bytes')
+        if self.max_ratio is not None and size > RATIO_CHECK_SIZE and size > compress_size * self.max_ratio:
+            raise EntryLimitError(info.filename, 'has a compression ratio above the limit of ' +
+                                  str(self.max_ratio) + ':1')
+
+    def get_entry(self, name):
+        """
+        Gets an entry that can be read, checking the size it claims to have against the limits
+
+        :param name: name or zipfile.ZipInfo of the entry
+        :return: tuple of (zipfile.ZipInfo, offset of the data)
+        """
+        info = name if isinstance(name, zipfile.ZipInfo) else self.getinfo(name)
+        if info.flag_bits & FLAG_ENCRYPTED:
+            raise RuntimeError('File ' + repr(info.filename) + ' is encrypted, password required for extraction')
+        if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise NotImplementedError('That compression method is not supported')
+
+        # STORED entries are read using their compressed size, so it has to match the size checked by the limits
+        if info.compress_type == zipfile.ZIP_STORED and info.compress_size != info.file_size:
+            raise zipfile.BadZipFile('Sizes of stored entry do not match: ' + info.filename)
+        self.check_limits(info, info.file_size, info.compress_size)
+        return info, self.get_data_offset(info)
+
+    def iter_raw(self, offset, size, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Reads a range of the archive in chunks
+
+        :param offset: offset to read from
+        :param size: number of bytes to read
+        :param chunk_size: size of each chunk
+        :return: generator of bytes, or memoryviews if the archive is mapped
+        """
+        for position in range(offset, offset + size, chunk_size):
+            length = min(chunk_size, offset + size - position)
+            if self._map is not None:
+                with memoryview(self._map) as view:
+                    yield view[position:position + length]
+            else:
+                yield self.read_at(position, length)
+
+    def iter_entry(self, name, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Reads an entry in chunks, decompressing it as it goes and stopping as soon as it exceeds the limits.
+        The CRC is checked once the whole entry was read.
+
+        :param name: name or zipfile.ZipInfo of the entry
+        :param chunk_size: maximum size of each chunk
+        :return: generator of bytes, or memoryviews for STORED entries if the archive is mapped
+        """
+        info, offset = self.get_entry(name)
+        crc = 0
+        size = 0
+        if info.compress_type == zipfile.ZIP_STORED:
+            for chunk in self.iter_raw(offset, info.compress_size, chunk_size):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                yield chunk
+        else:
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            consumed = 0
+            for data in self.iter_raw(offset, info.compress_size, chunk_size):
+                consumed += len(data)
+                while len(data) > 0:
+                    # Limit the output of each call, since a small compressed chunk can expand a thousand times
+                    try:
+                        chunk = decompressor.decompress(data, chunk_size)
+                    except zlib.error as error:
+                        raise zipfile.BadZipFile('Unable to decompress entry: ' + info.filename + ' - ' + str(error))
+                    data = decompressor.unconsumed_tail
+                    size += len(chunk)
+                    self.check_limits(info, size, consumed - len(data))
+                    crc = zlib.crc32(chunk, crc)
+                    yield chunk
+
+            chunk = decompressor.flush()
+            size += len(chunk)
+            self.check_limits(info, size, consumed)
+            crc = zlib.crc32(chunk, crc)
+            yield chunk
+
+        if crc != info.CRC:
+            raise zipfile.BadZipFile('Bad CRC-32 for entry: ' + info.filename)
+
+    def read_view(self, name):
+        """
+        Reads an entry, returning a view into the mapped archive for STORED entries instead of copying them.
+        Unlike read(), the CRC of those entries is not checked since that would mean touching every byte.
+
+        :param name: name or zipfile.ZipInfo of the entry
+        :return: memoryview for STORED entries if the archive is mapped, bytes otherwise
+        """
+        info, offset = self.get_entry(name)
+        if info.compress_type == zipfile.ZIP_STORED and self._map is not None:
+            return memoryview(self._map)[offset:offset + info.compress_size]
+        return self.read(info)
+
+    def read(self, name):
+        """
+        Reads an entry into memory, same as zipfile.ZipFile.read() but within the limits
+
+        :param name: name or zipfile.ZipInfo of the entry
+        :return: bytes
+        """
+        return b''.join(self.iter_entry(name))
+
+    def close(self):
+        """Closes the archive and the memory map, the map is left to the garbage collector if views are in use"""
+        if self._map is not None and not isinstance(self._map, memoryview):
+            try:
+                self._map.close()
+            except BufferError:
+                pass
+        self._map = None
+        if self.fp is not None and (self._own_fp or isinstance(self.fp, ArchiveView)):
+            self.fp.close()
+        self.fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,303 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import struct
+
+# Chunk types used in the resource table, see ResourceTypes.h in the Android framework
+RES_STRING_POOL_TYPE = 0x0001
+RES_TABLE_TYPE = 0x0002
+RES_TABLE_PACKAGE_TYPE = 0x0200
+RES_TABLE_TYPE_TYPE = 0x0201
+
+# String pool flag for UTF-8 strings, UTF-16 is used otherwise
+UTF8_FLAG = 0x100
+
+# Type table flag for sparse entries, stored as (index, offset / 4) pairs
+SPARSE_FLAG = 0x01
+
+# Entry flag for complex entries, which hold a map instead of a single value
+COMPLEX_FLAG = 0x0001
+
+# Offset of entries that don't exist in a type table
+NO_ENTRY = 0xFFFFFFFF
+
+# Value type of strings
+TYPE_STRING = 0x03
+
+
+class ArscError(Exception):
+    """Raised when the resource table is malformed"""
+
+
+class ArscStringPool(object):
+    """String pool chunk, strings are decoded only when asked for"""
+
+    def __init__(self, data, offset):
+        """
+        Main constructor
+
+        :param data: bytes or memoryview of the resource table
+        :param offset: offset of the string pool chunk
+        """
+        chunk_type, header_size, size = ArscReader.read_chunk_header(data, offset)
+        if chunk_type != RES_STRING_POOL_TYPE:
+            raise ArscError('Expected a string pool at offset ' + str(offset))
+        if header_size < 28:
+            raise ArscError('String pool header is truncated at offset ' + str(offset))
+
+        count, _, flags, strings_start, _ = struct.unpack_from('<IIIII', data, offset + 8)
+        self.data = data
+        self.count = count
+        self.utf8 = (flags & UTF8_FLAG) != 0
+        self.offsets_start = offset + header_size
+        self.strings_start = offset + strings_start
+        self.end = offset + size
+        if self.offsets_start + count * 4 > self.end or self.end > len(data):
+            raise ArscError('String pool is truncated')
+        if count > 0 and not self.offsets_start <= self.strings_start < self.end:
+            raise ArscError('Strings are outside of the string pool')
+
+    def get_raw(self, index):
+        """
+        Gets the encoded bytes of a string without decoding it
+
+        :param index: index of the string
+        :return: encoded bytes, UTF-8 or UTF-16LE depending on the pool
+        """
+        if index < 0 or index >= self.count:
+            raise ArscError('String index ' + str(index) + ' is out of range')
+        position = self.strings_start + struct.unpack_from('<I', self.data, self.offsets_start + index * 4)[0]
+
+        # The lengths take up to four bytes before the string
+        if position + 4 > self.end:
+            raise ArscError('String is outside of the string pool')
+        if self.utf8:
+            # Length in UTF-16 characters followed by the length in bytes, each one or two bytes
+            position += 2 if self.data[position] & 0x80 else 1
+            length = self.data[position]
+            if length & 0x80:
+                length = ((length & 0x7F) << 8) | self.data[position + 1]
+                position += 1
+            position += 1
+        else:
+            length = struct.unpack_from('<H', self.data, position)[0]
+            position += 2
+            if length & 0x8000:
+                length = ((length & 0x7FFF) << 16) | struct.unpack_from('<H', self.data, position)[0]
+                position += 2
+            length *= 2
+
+        if position + length > self.end:
+            raise ArscError('String is outside of the string pool')
+        return bytes(self.data[position:position + length])
+
+    def get(self, index):
+        """
+        Gets a decoded string
+
+        :param index: index of the string
+        :return: string, or None if the index is out of range
+        """
+        if index >= self.count:
+            return None
+        return self.get_raw(index).decode('utf-8' if self.utf8 else 'utf-16-le', errors='replace')
+
+    def find(self, names):
+        """
+        Finds strings in the pool by comparing their encoded bytes, without decoding the whole pool
+
+        :param names: strings to look for
+        :return: dictionary of index to string, for the strings that were found
+        """
+        encoded = dict((name.encode('utf-8' if self.utf8 else 'utf-16-le'), name) for name in names)
+        found = dict()
+        for index in range(self.count):
+            name = encoded.get(self.get_raw(index))
+            if name is not None:
+                found[index] = name
+        return found
+
+
+class ArscReader(object):
+    """
+    Reads selected string resources from a compiled resource table (resources.arsc) by walking the chunk
+    headers, instead of decoding every package, type and locale. Only strings in the default configuration
+    (no language or region) are returned, same as androguard's ARSCParser.get_string().
+    """
+
+    @staticmethod
+    def read_chunk_header(data, offset):
+        """
+        Reads a chunk header
+
+        :param data: bytes or memoryview of the resource table
+        :param offset: offset of the chunk
+        :return: tuple of (type, header size, total size)
+        """
+        if offset + 8 > len(data):
+            raise ArscError('Chunk header is truncated')
+        chunk_type, header_size, size = struct.unpack_from('<HHI', data, offset)
+        if header_size < 8 or size < header_size or offset + size > len(data):
+            raise ArscError('Invalid chunk size at offset ' + str(offset))
+        return chunk_type, header_size, size
+
+    @staticmethod
+    def get_strings(data, names, package_name=None):
+        """
+        Gets string resources by name
+
+        :param data: bytes or memoryview of the resource table
+        :param names: names of the string resources to look for
+        :param package_name: optional name of the package to search, all packages are searched otherwise
+        :return: dictionary of name to value, for the resources that were found
+        """
+        try:
+            return ArscReader.read_strings(data, names, package_name)
+        except (struct.error, IndexError) as error:
+            # Offsets that are not checked below still can't read past the data
+            raise ArscError('Resource table is malformed - ' + str(error))
+
+    @staticmethod
+    def read_strings(data, names, package_name=None):
+        """
+        Walks the chunks of the resource table, see get_strings()
+
+        :param data: bytes or memoryview of the resource table
+        :param names: names of the string resources to look for
+        :param package_name: optional name of the package to search, all packages are searched otherwise
+        :return: dictionary of name to value, for the resources that were found
+        """
+        chunk_type, header_size, size = ArscReader.read_chunk_header(data, 0)
+        if chunk_type != RES_TABLE_TYPE:
+            raise ArscError('Not a resource table')
+
+        values = dict()
+        global_strings = None
+        offset = header_size
+        while offset < size and len(values) < len(names):
+            chunk_type, _, chunk_size = ArscReader.read_chunk_header(data, offset)
+            if chunk_type == RES_STRING_POOL_TYPE and global_strings is None:
+                global_strings = ArscStringPool(data, offset)
+            elif chunk_type == RES_TABLE_PACKAGE_TYPE and global_strings is not None:
+                found = ArscReader.get_package_strings(data, offset, global_strings, names, package_name)
+                for name, value in found.items():
+                    values.setdefault(name, value)
+            offset += chunk_size
+
+        return values
+
+    @staticmethod
+    def get_package_strings(data, offset, global_strings, names, package_name=None):
+        """
+        Gets string resources by name from a single package chunk
+
+        :param data: bytes or memoryview of the resource table
+        :param offset: offset of the package chunk
+        :param global_strings: ArscStringPool holding the values
+        :param names: names of the string resources to look for
+        :param package_name: optional name of the package, None if any package can match
+        :return: dictionary of name to value, for the resources that were found
+        """
+        _, header_size, size = ArscReader.read_chunk_header(data, offset)
+        if header_size < 280:
+            raise ArscError('Package header is truncated at offset ' + str(offset))
+        name = bytes(data[offset + 12:offset + 12 + 256]).decode('utf-16-le', errors='replace').split('\x00')[0]
+        if package_name is not None and name != package_name:
+            return dict()
+
+        type_strings_offset, _, key_strings_offset = struct.unpack_from('<III', data, offset + 268)
+        if type_strings_offset >= size or key_strings_offset >= size:
+            raise ArscError('String pools are outside of the package at offset ' + str(offset))
+        type_strings = ArscStringPool(data, offset + type_strings_offset)
+        key_strings = ArscStringPool(data, offset + key_strings_offset)
+
+        # Type IDs start at 1, find the ID of the string type and the keys we are looking for
+        string_type_ids = [index + 1 for index in type_strings.find(['string'])]
+        keys = key_strings.find(names)
+        if len(string_type_ids) == 0 or len(keys) == 0:
+            return dict()
+
+        values = dict()
+        position = offset + header_size
+        while position < offset + size and len(values) < len(keys):
+            chunk_type, chunk_header_size, chunk_size = ArscReader.read_chunk_header(data, position)
+            if position + chunk_size > offset + size:
+                raise ArscError('Chunk is outside of the package at offset ' + str(position))
+            if chunk_type == RES_TABLE_TYPE_TYPE and chunk_header_size >= 32 and \
+                    data[position + 8] in string_type_ids:
+                for key, value in ArscReader.get_type_strings(data, position, global_strings, keys).items():
+                    values.setdefault(key, value)
+            position += chunk_size
+
+        return values
+
+    @staticmethod
+    def get_type_strings(data, offset, global_strings, keys):
+        """
+        Gets the values of entries from a type chunk if it is in the default configuration
+
+        :param data: bytes or memoryview of the resource table
+        :param offset: offset of the type chunk
+        :param global_strings: ArscStringPool holding the values
+        :param keys: dictionary of key string index to name of the entries to look for
+        :return: dictionary of name to value, for the entries that were found
+        """
+        _, header_size, size = ArscReader.read_chunk_header(data, offset)
+        if header_size < 32:
+            raise ArscError('Type chunk header is truncated at offset ' + str(offset))
+        flags = data[offset + 9]
+        entry_count, entries_start = struct.unpack_from('<II', data, offset + 12)
+
+        # Configuration follows, only the default language and region are used
+        config_size = struct.unpack_from('<I', data, offset + 20)[0]
+        if config_size >= 16 and bytes(data[offset + 28:offset + 32]) != b'\x00\x00\x00\x00':
+            return dict()
+
+        # Get the offsets of all entries in this chunk
+        entry_offsets = list()
+        table = offset + header_size
+        if table + entry_count * 4 > offset + size:
+            raise ArscError('Type chunk is truncated')
+        if flags & SPARSE_FLAG:
+            for index in range(entry_count):
+                entry_offsets.append(struct.unpack_from('<H', data, table + index * 4 + 2)[0] * 4)
+        else:
+            for entry_offset in struct.unpack_from('<' + str(entry_count) + 'I', data, table):
+                if entry_offset != NO_ENTRY:
+                    entry_offsets.append(entry_offset)
+
+        values = dict()
+        for entry_offset in entry_offsets:
+            position = offset + entries_start + entry_offset
+            if entry_offset < 0 or position + 16 > offset + size:
+                raise ArscError('Entry is outside of the type chunk')
+            _, entry_flags, key = struct.unpack_from('<HHI', data, position)
+            name = keys.get(key)
+            if name is None or entry_flags & COMPLEX_FLAG:
+                continue
+
+            data_type, value = struct.unpack_from('<BI', data, position + 11)
+            if data_type == TYPE_STRING:
+                values[name] = global_strings.get(value)
+
+        return values
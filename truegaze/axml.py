@@ -0,0 +1,155 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import struct
+
+from truegaze.arsc import RES_STRING_POOL_TYPE, TYPE_STRING, ArscError, ArscReader, ArscStringPool
+
+# Chunk types used in binary XML, see ResourceTypes.h in the Android framework
+RES_XML_TYPE = 0x0003
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+
+# Value types of integer attributes
+TYPE_INT_DEC = 0x10
+TYPE_INT_HEX = 0x11
+
+# Index used for strings that are not set
+NO_STRING = 0xFFFFFFFF
+
+# Resource IDs of the attributes read from the manifest, the attribute names themselves can be stripped or
+# renamed by obfuscators
+VERSION_CODE_ID = 0x0101021B
+VERSION_NAME_ID = 0x0101021C
+MIN_SDK_VERSION_ID = 0x0101020C
+
+
+class AxmlError(Exception):
+    """Raised when the binary XML is malformed"""
+
+
+class AxmlReader(object):
+    """
+    Reads the identity of an application from its compiled AndroidManifest.xml by walking the chunk headers, only
+    decoding the attributes of the <manifest> and <uses-sdk> elements and stopping at the latter. Strings are
+    decoded only when asked for, instead of decoding the whole document like androguard's AXMLPrinter.
+    """
+
+    @staticmethod
+    def get_manifest_info(data):
+        """
+        Gets the package name, version and minimum SDK of an application
+
+        :param data: bytes or memoryview of the compiled manifest
+        :return: dictionary with the package, version_code, version_name and min_sdk, each None if it is not set
+        """
+        try:
+            return AxmlReader.read_manifest(data)
+        except (ArscError, struct.error, IndexError) as error:
+            raise AxmlError(str(error))
+
+    @staticmethod
+    def read_manifest(data):
+        """
+        Walks the chunks of the manifest up to the <uses-sdk> element, see get_manifest_info()
+
+        :param data: bytes or memoryview of the compiled manifest
+        :return: dictionary with the package, version_code, version_name and min_sdk
+        """
+        chunk_type, header_size, size = ArscReader.read_chunk_header(data, 0)
+        if chunk_type != RES_XML_TYPE:
+            raise AxmlError('Not a binary XML file')
+
+        strings = None
+        resource_ids = ()
+        info = None
+        offset = header_size
+        while offset < size:
+            chunk_type, header_size, chunk_size = ArscReader.read_chunk_header(data, offset)
+            if chunk_type == RES_STRING_POOL_TYPE and strings is None:
+                strings = ArscStringPool(data, offset)
+            elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+                count = (chunk_size - header_size) // 4
+                resource_ids = struct.unpack_from('<' + str(count) + 'I', data, offset + header_size)
+            elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+                if strings is None:
+                    raise AxmlError('Element found before the string pool')
+                name, attributes = AxmlReader.read_element(data, offset, strings, resource_ids)
+                if info is None:
+                    if name != 'manifest':
+                        raise AxmlError('Root element is <' + str(name) + '> instead of <manifest>')
+                    info = dict(package=attributes.get('package'), version_code=attributes.get(VERSION_CODE_ID),
+                                version_name=attributes.get(VERSION_NAME_ID), min_sdk=None)
+                elif name == 'uses-sdk':
+                    info['min_sdk'] = attributes.get(MIN_SDK_VERSION_ID)
+                    break
+            offset += chunk_size
+
+        if info is None:
+            raise AxmlError('No <manifest> element found')
+        return info
+
+    @staticmethod
+    def read_element(data, offset, strings, resource_ids):
+        """
+        Reads the name and attributes of a start element chunk
+
+        :param data: bytes or memoryview of the compiled manifest
+        :param offset: offset of the chunk
+        :param strings: ArscStringPool of the document
+        :param resource_ids: resource IDs of the attribute names, by string index
+        :return: tuple of (element name, dictionary of attribute values keyed by resource ID if there is one and
+                 by name otherwise)
+        """
+        _, header_size, size = ArscReader.read_chunk_header(data, offset)
+        start = offset + header_size
+        _, name, attribute_start, attribute_size, count = struct.unpack_from('<IIHHH', data, start)
+        if attribute_size < 20 or start + attribute_start + attribute_size * count > offset + size:
+            raise AxmlError('Attributes are outside of the element at offset ' + str(offset))
+
+        attributes = dict()
+        for position in range(start + attribute_start, start + attribute_start + attribute_size * count,
+                              attribute_size):
+            _, attribute_name, raw_value, _, _, value_type, value = struct.unpack_from('<IIIHBBI', data, position)
+            key = resource_ids[attribute_name] if attribute_name < len(resource_ids) else strings.get(attribute_name)
+            attributes[key] = AxmlReader.get_value(strings, raw_value, value_type, value)
+        return strings.get(name), attributes
+
+    @staticmethod
+    def get_value(strings, raw_value, value_type, value):
+        """
+        Gets the value of an attribute, references to resources are not resolved
+
+        :param strings: ArscStringPool of the document
+        :param raw_value: index of the original string value, or NO_STRING
+        :param value_type: type of the typed value
+        :param value: data of the typed value
+        :return: string or integer, or None for other types
+        """
+        if value_type == TYPE_STRING:
+            return strings.get(value)
+        if value_type in (TYPE_INT_DEC, TYPE_INT_HEX):
+            return value
+        if raw_value != NO_STRING:
+            return strings.get(raw_value)
+        return None
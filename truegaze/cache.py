@@ -0,0 +1,316 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Default maximum size of the cache in bytes
+DEFAULT_CACHE_SIZE = 100 * 1024 * 1024
+
+# Number of the least recently used results read at a time when evicting
+EVICTION_BATCH_SIZE = 100
+
+# Name of the database file inside the cache directory
+CACHE_FILENAME = 'results.sqlite'
+
+# Default time in seconds to keep the results of online probes
+DEFAULT_PROBE_TTL = 24 * 60 * 60
+
+# Default time in seconds to keep network errors from online probes before retrying
+DEFAULT_PROBE_ERROR_TTL = 5 * 60
+
+# Default maximum number of entries in an in-memory cache
+DEFAULT_MEMORY_CACHE_ENTRIES = 1024
+
+
+class ResultCache(object):
+    """
+    Persistent on-disk cache of scan results, stored in a SQLite database and keyed on the content hash of
+    the scanned file so that the same binary is only scanned once no matter what it is called. The least
+    recently used entries are evicted once the cache grows over its maximum size.
+    """
+
+    def __init__(self, cache_dir=None, max_size=DEFAULT_CACHE_SIZE, refresh=False):
+        """
+        Main constructor
+
+        :param cache_dir: directory to keep the cache in, defaults to get_default_dir()
+        :param max_size: maximum total size of the cached values in bytes
+        :param refresh: whether to ignore existing entries and overwrite them with new results
+        """
+        self.cache_dir = cache_dir or ResultCache.get_default_dir()
+        self.max_size = max_size
+        self.refresh = refresh
+        self._connection = None
+
+    def __getstate__(self):
+        # SQLite connections can't be shared with worker processes, each one opens its own
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    @staticmethod
+    def get_default_dir():
+        """
+        Gets the default cache directory, which can be overridden via the TRUEGAZE_CACHE_DIR environment variable
+
+        :return: path to the cache directory
+        """
+        if os.environ.get('TRUEGAZE_CACHE_DIR'):
+            return os.environ['TRUEGAZE_CACHE_DIR']
+        base_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(base_dir, 'truegaze')
+
+    @staticmethod
+    def make_key(file_hash, plugin_name, plugin_version, truegaze_version, online, settings=None):
+        """
+        Builds a cache key for a result
+
+        :param file_hash: SHA-256 hash of the scanned file
+        :param plugin_name: name of the plugin that produced the result
+        :param plugin_version: version of the plugin that produced the result
+        :param truegaze_version: version of truegaze that produced the result
+        :param online: whether online tests were performed
+        :param settings: optional string describing other settings that can change the result
+        :return: cache key
+        """
+        parts = [file_hash, plugin_name, plugin_version, truegaze_version, 'online' if online else 'offline']
+        if settings:
+            parts.append(settings)
+        return '|'.join(parts)
+
+    def _connect(self):
+        # The total size of the results is kept up to date by triggers, so that it doesn't have to be summed up
+        # on every put and stays right when several processes share the cache. Replacing a result only fires the
+        # delete trigger for the old one with recursive triggers enabled.
+        if self._connection is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._connection = sqlite3.connect(os.path.join(self.cache_dir, CACHE_FILENAME), timeout=30)
+            self._connection.execute('PRAGMA recursive_triggers = ON')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS results '
+                                     '(key TEXT PRIMARY KEY, value TEXT, size INTEGER, accessed REAL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS results_size (id INTEGER PRIMARY KEY, total INTEGER)')
+            self._connection.execute('CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results BEGIN '
+                                     'UPDATE results_size SET total = total + NEW.size; END')
+            self._connection.execute('CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results BEGIN '
+                                     'UPDATE results_size SET total = total - OLD.size; END')
+            with self._connection:
+                self._connection.execute('INSERT OR IGNORE INTO results_size (id, total) '
+                                         'SELECT 0, COALESCE(SUM(size), 0) FROM results')
+        return self._connection
+
+    def get(self, key):
+        """
+        Looks up a cached result
+
+        :param key: cache key from make_key()
+        :return: cached value, or None if not found or if the cache is being refreshed
+        """
+        if self.refresh:
+            return None
+
+        connection = self._connect()
+        row = connection.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+
+        with connection:
+            connection.execute('UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+    def put(self, key, value):
+        """
+        Stores a result, evicting the least recently used entries if the cache is over its maximum size
+
+        :param key: cache key from make_key()
+        :param value: string value to store
+        """
+        connection = self._connect()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)',
+                               (key, value, len(key) + len(value), time.time()))
+            total = connection.execute('SELECT total FROM results_size').fetchone()[0]
+            if total > self.max_size:
+                ResultCache._evict(connection, total, self.max_size)
+
+    @staticmethod
+    def _evict(connection, total, max_size):
+        # Only the oldest entries are read, a batch at a time, since usually just a few have to go
+        while total > max_size:
+            rows = connection.execute('SELECT key, size FROM results ORDER BY accessed LIMIT ?',
+                                      (EVICTION_BATCH_SIZE,)).fetchall()
+            if len(rows) == 0:
+                break
+            for key, size in rows:
+                if total <= max_size:
+                    break
+                connection.execute('DELETE FROM results WHERE key = ?', (key,))
+                total -= size
+
+    def close(self):
+        """Closes the underlying database"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class ProbeCache(object):
+    """
+    Persistent cache of online probe results shared across apps and scan runs, so that the same endpoint
+    embedded in many apps is only checked once. Results expire after a TTL, and network errors are cached
+    too, for a shorter time, so that unreachable endpoints are not retried for every app.
+    """
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_PROBE_TTL, error_ttl=DEFAULT_PROBE_ERROR_TTL, refresh=False):
+        """
+        Main constructor
+
+        :param cache_dir: directory to keep the cache in, defaults to ResultCache.get_default_dir()
+        :param ttl: time in seconds to keep probe results
+        :param error_ttl: time in seconds to keep network errors
+        :param refresh: whether to ignore existing entries and overwrite them with new results
+        """
+        self.cache_dir = cache_dir or ResultCache.get_default_dir()
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.refresh = refresh
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # SQLite connections can't be shared with worker processes, each one opens its own
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Probes complete on the online client's threads, so the connection is shared between threads
+        # and all access to it goes through the lock
+        if self._connection is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._connection = sqlite3.connect(os.path.join(self.cache_dir, CACHE_FILENAME), timeout=30,
+                                               check_same_thread=False)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS probes (key TEXT PRIMARY KEY, value TEXT, '
+                                     'expires REAL)')
+        return self._connection
+
+    def get(self, key):
+        """
+        Looks up a probe result that hasn't expired yet
+
+        :param key: key of the probe
+        :return: tuple of (message, error) as passed to put(), or None if not found
+        """
+        if self.refresh:
+            return None
+
+        with self._lock:
+            row = self._connect().execute('SELECT value FROM probes WHERE key = ? AND expires > ?',
+                                          (key, time.time())).fetchone()
+        if row is None:
+            return None
+
+        value = json.loads(row[0])
+        return value['message'], value['error']
+
+    def put(self, key, message=None, error=None):
+        """
+        Stores a probe result, and removes any expired results
+
+        :param key: key of the probe
+        :param message: result of the probe
+        :param error: network error that occurred instead of a result, if any
+        """
+        now = time.time()
+        expires = now + (self.error_ttl if error is not None else self.ttl)
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('INSERT OR REPLACE INTO probes (key, value, expires) VALUES (?, ?, ?)',
+                                   (key, json.dumps(dict(message=message, error=error)), expires))
+                connection.execute('DELETE FROM probes WHERE expires <= ?', (now,))
+
+    def close(self):
+        """Closes the underlying database"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class MemoryCache(object):
+    """
+    Bounded in-memory cache with the same interface as ResultCache, for results that are worth reusing within a
+    process but too cheap to look up on disk every time. The least recently used entries are evicted once it
+    holds more than its maximum number of entries.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MEMORY_CACHE_ENTRIES):
+        """
+        Main constructor
+
+        :param max_entries: maximum number of entries to keep
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Looks up a cached value
+
+        :param key: cache key
+        :return: cached value, or None if not found
+        """
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """
+        Stores a value, evicting the least recently used entries if the cache is full
+
+        :param key: cache key
+        :param value: value to store
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Removes all of the entries"""
+        self._entries.clear()
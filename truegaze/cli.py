@@ -21,13 +21,23 @@
 # specific language governing permissions and limitations
 # under the License.
 #
+import os
 import sys
 
 import click
 from beautifultable import BeautifulTable
 
+from truegaze.archive import DEFAULT_MAX_ENTRY_SIZE, DEFAULT_MAX_RATIO
+from truegaze.cache import DEFAULT_CACHE_SIZE, DEFAULT_PROBE_ERROR_TTL, DEFAULT_PROBE_TTL, ProbeCache, ResultCache
+from truegaze.inputs import DEFAULT_EXTENSIONS, TruegazeInputs
+from truegaze.isolation import IsolatedCall
+from truegaze.online import DEFAULT_CONCURRENCY, DEFAULT_RATE_LIMIT, DEFAULT_RETRIES, DEFAULT_TIMEOUT, OnlineClient
 from truegaze.plugins import ACTIVE_PLUGINS
+from truegaze.profiler import Profiler
+from truegaze.scanner import STATUS_OK, TruegazeScanner
+from truegaze.server import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_SCAN_TIMEOUT, ScanService
 from truegaze.utils import TruegazeUtils
+from truegaze.workers import is_memory_limit_supported
 
 
 @click.version_option(version=TruegazeUtils.get_version(), prog_name='truegaze')
@@ -56,52 +66,186 @@ def list_plugins():
 
 
 @cli.command('scan')
-@click.argument('filenames', required=True, nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.argument('filenames', required=False, nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--recursive', '-r', 'directories', multiple=True, type=click.Path(exists=True, file_okay=False),
+              help='Scan all applications in a directory and its subdirectories, can be used more than once')
+@click.option('--from-file', 'list_files', multiple=True, type=click.File('rb'),
+              help='Scan the files listed in a file, one per line or separated by NUL characters, "-" for stdin')
+@click.option('--extension', '-e', 'extensions', multiple=True,
+              help='Only scan files with this extension, can be used more than once [default for directories: ' +
+                   ', '.join(DEFAULT_EXTENSIONS) + ']')
 @click.option('--online', is_flag=True, help='Run tests requiring online access - make sure you are doing this legally')
-def scan(filenames, online):
+@click.option('--jobs', '-j', default=1, show_default=True, type=click.IntRange(min=0),
+              help='Number of files to scan in parallel, 0 to use one process per CPU')
+@click.option('--ordered/--unordered', default=True, show_default=True,
+              help='When scanning in parallel, show results in input order or as soon as each file is done')
+@click.option('--no-cache', is_flag=True, help='Do not use or store results of previous scans')
+@click.option('--refresh', is_flag=True, help='Rescan files even if they were scanned before, updating the cache')
+@click.option('--cache-dir', type=click.Path(file_okay=False), help='Directory to keep the cache of scan results in')
+@click.option('--cache-size', default=DEFAULT_CACHE_SIZE // (1024 * 1024), show_default=True,
+              type=click.IntRange(min=1), help='Maximum size of the cache of scan results in megabytes')
+@click.option('--online-timeout', default=DEFAULT_TIMEOUT, show_default=True, type=click.FloatRange(min=0.1),
+              help='Timeout in seconds for each online request')
+@click.option('--online-concurrency', default=DEFAULT_CONCURRENCY, show_default=True, type=click.IntRange(min=1),
+              help='Maximum number of online requests to run at the same time')
+@click.option('--probe-ttl', default=DEFAULT_PROBE_TTL, show_default=True, type=click.IntRange(min=0),
+              help='Time in seconds to reuse the results of online checks across applications and runs')
+@click.option('--probe-error-ttl', default=DEFAULT_PROBE_ERROR_TTL, show_default=True, type=click.IntRange(min=0),
+              help='Time in seconds to wait before retrying online checks that failed with a network error')
+@click.option('--online-rate', default=DEFAULT_RATE_LIMIT, show_default=True, type=click.FloatRange(min=0.01),
+              help='Maximum number of online requests per second to each host, shared by all parallel jobs')
+@click.option('--online-retries', default=DEFAULT_RETRIES, show_default=True, type=click.IntRange(min=0),
+              help='Number of times to retry online requests that were throttled or failed with a server error')
+@click.option('--max-entry-size', default=DEFAULT_MAX_ENTRY_SIZE // (1024 * 1024), show_default=True,
+              type=click.IntRange(min=0), help='Maximum size in megabytes of each file read from inside an '
+                                               'application, 0 for no limit')
+@click.option('--max-ratio', default=DEFAULT_MAX_RATIO, show_default=True, type=click.IntRange(min=0),
+              help='Maximum compression ratio of each file read from inside an application, 0 for no limit')
+@click.option('--worker-max-files', default=0, type=click.IntRange(min=0),
+              help='Replace each worker process after it scans this many files, 0 for no limit')
+@click.option('--worker-max-memory', default=0, type=click.IntRange(min=0),
+              help='Replace each worker process once it uses more than this many megabytes, 0 for no limit')
+@click.option('--worker-memory-limit', default=0, type=click.IntRange(min=0),
+              help='Maximum memory in megabytes each worker process can allocate, files that need more are '
+                   'reported as failed, 0 for no limit')
+@click.option('--plugin-timeout', default=0, type=click.FloatRange(min=0),
+              help='Stop plugins that take longer than this many seconds on a file and report it, 0 for no limit')
+@click.option('--file-timeout', default=0, type=click.FloatRange(min=0),
+              help='Stop scanning a file after this many seconds and report it, 0 for no limit')
+@click.option('--profile', is_flag=True,
+              help='Show the time and memory used by each plugin and phase of the scan - this slows down scans')
+@click.option('--profile-dir', type=click.Path(file_okay=False),
+              help='Write a cProfile dump for each scanned file to this directory, implies "--profile"')
+def scan(filenames, directories, list_files, extensions, online, jobs, ordered, no_cache, refresh, cache_dir,
+         cache_size, online_timeout, online_concurrency, probe_ttl, probe_error_ttl, online_rate, online_retries,
+         max_entry_size, max_ratio, worker_max_files, worker_max_memory, worker_memory_limit, plugin_timeout,
+         file_timeout, profile, profile_dir):
     """Scan the provided files for vulnerabilities"""
 
-    for filename in filenames:
-        click.echo('\nProcessing file: ' + filename)
-
-        # Try to open the provided file as a ZIP, fail otherwise
-        zip_file = TruegazeUtils.open_file_as_zip(filename)
-        if zip_file is None:
-            click.echo('ERROR: Unable to open file - please check to make sure it is an APK or IPA file')
-            sys.exit(-1)
-
-        # Detect manifest
-        is_android = False
-        is_ios = False
-        android_manifest = TruegazeUtils.get_android_manifest(zip_file)
-        ios_manifest = TruegazeUtils.get_ios_manifest(zip_file)
-
-        # Set flags, error out if no manifest is found
-        if android_manifest:
-            click.echo('Identified as an Android application via a manifest located at: ' + android_manifest)
-            is_android = True
-        elif ios_manifest:
-            click.echo('Identified as an iOS application via a manifest located at: ' + ios_manifest)
-            is_ios = True
-        else:
-            click.echo('ERROR: Unable to identify the file as an Android or iOS application')
-            sys.exit(-2)
-
-        # Pass the filename to the individual modules for scanning
-        for PLUGIN in ACTIVE_PLUGINS:
-            click.echo()
-            click.echo('Scanning using the "' + PLUGIN.name + '" plugin')
-            instance = PLUGIN(filename, is_android, is_ios, online)
-
-            # Show error if OS is not supported
-            # TODO: Add tests
-            if instance.is_os_supported():
-                instance.scan()
-            else:
-                click.echo('-- OS is not supported by this plugin, skipping')
-
+    if len(filenames) == 0 and len(directories) == 0 and len(list_files) == 0:
+        raise click.UsageError('No files to scan, provide filenames or use "--recursive" or "--from-file"')
+
+    # Files are enumerated as they are scanned, so the first results show up right away
+    extensions = [extension if extension.startswith('.') else '.' + extension for extension in extensions]
+    filenames = TruegazeInputs.iter_inputs(filenames, directories, list_files, extensions or None)
+
+    probe_cache = None
+    options = dict(max_entry_size=max_entry_size * 1024 * 1024 or None, max_ratio=max_ratio or None,
+                   **get_timeout_options(plugin_timeout, file_timeout))
+    if not no_cache:
+        options['cache'] = ResultCache(cache_dir, cache_size * 1024 * 1024, refresh)
+        probe_cache = ProbeCache(cache_dir, probe_ttl, probe_error_ttl, refresh)
+
+    # Each parallel job has its own client, so the rate limit is split between them
+    jobs = TruegazeScanner.get_job_count(jobs)
+    options['online_client'] = OnlineClient(online_timeout, online_concurrency, probe_cache, online_rate / jobs,
+                                            online_retries)
+    profiler = None
+    if profile or profile_dir is not None:
+        profiler = options['profiler'] = Profiler(profile_dir)
+
+    # Worker processes are also used for a single job if they have limits, so that they can be replaced
+    worker_options = dict(max_files=worker_max_files or None, max_memory=worker_max_memory * 1024 * 1024 or None,
+                          memory_limit=worker_memory_limit * 1024 * 1024 or None)
+    if worker_memory_limit and not is_memory_limit_supported():
+        raise click.UsageError('Memory limits are not supported on this platform')
+
+    if jobs == 1 and not any(worker_options.values()):
+        for filename in filenames:
+            status = TruegazeScanner.scan_file(filename, online, **options)
+            if status != STATUS_OK:
+                sys.exit(status)
+    else:
+        results = TruegazeScanner.scan_files_parallel(filenames, online, jobs, ordered, **worker_options, **options)
+        for filename, status, output, stats in results:
+            click.echo(output, nl=False)
+            if profiler is not None:
+                profiler.merge(stats)
+            if status != STATUS_OK:
+                sys.exit(status)
+
+    options['online_client'].close()
+    if profiler is not None:
+        profiler.close()
+        click.echo('\nProfile:')
+        click.echo(profiler.get_table())
     click.echo("Done!")
 
 
+@cli.command('serve')
+@click.option('--host', default=DEFAULT_HOST, show_default=True, help='Address to listen on')
+@click.option('--port', default=DEFAULT_PORT, show_default=True, type=click.IntRange(min=0, max=65535),
+              help='Port to listen on')
+@click.option('--socket', 'socket_path', type=click.Path(dir_okay=False),
+              help='Listen on a Unix socket at this path instead of a TCP port')
+@click.option('--online', is_flag=True, help='Run tests requiring online access - make sure you are doing this legally')
+@click.option('--jobs', '-j', default=1, show_default=True, type=click.IntRange(min=0),
+              help='Number of worker processes to keep running, 0 to use one per CPU')
+@click.option('--no-cache', is_flag=True, help='Do not use or store results of previous scans')
+@click.option('--cache-dir', type=click.Path(file_okay=False), help='Directory to keep the cache of scan results in')
+@click.option('--cache-size', default=DEFAULT_CACHE_SIZE // (1024 * 1024), show_default=True,
+              type=click.IntRange(min=1), help='Maximum size of the cache of scan results in megabytes')
+@click.option('--max-entry-size', default=DEFAULT_MAX_ENTRY_SIZE // (1024 * 1024), show_default=True,
+              type=click.IntRange(min=0), help='Maximum size in megabytes of each file read from inside an '
+                                               'application, 0 for no limit')
+@click.option('--max-ratio', default=DEFAULT_MAX_RATIO, show_default=True, type=click.IntRange(min=0),
+              help='Maximum compression ratio of each file read from inside an application, 0 for no limit')
+@click.option('--plugin-timeout', default=0, type=click.FloatRange(min=0),
+              help='Stop plugins that take longer than this many seconds on a file and report it, 0 for no limit')
+@click.option('--file-timeout', default=0, type=click.FloatRange(min=0),
+              help='Stop scanning a file after this many seconds and report it, 0 for no limit')
+@click.option('--scan-timeout', default=DEFAULT_SCAN_TIMEOUT, show_default=True, type=click.FloatRange(min=0),
+              help='Return an error if a scan has no result after this many seconds, such as when its worker died, '
+                   '0 for no limit')
+def serve(host, port, socket_path, online, jobs, no_cache, cache_dir, cache_size, max_entry_size, max_ratio,
+          plugin_timeout, file_timeout, scan_timeout):
+    """
+    Run a scan server with a pool of warmed up workers. Files are submitted by POSTing {"filename": ...} to /scan,
+    and the results are returned as JSON.
+    """
+
+    probe_cache = None
+    options = dict(max_entry_size=max_entry_size * 1024 * 1024 or None, max_ratio=max_ratio or None,
+                   **get_timeout_options(plugin_timeout, file_timeout))
+    if not no_cache:
+        options['cache'] = ResultCache(cache_dir, cache_size * 1024 * 1024)
+        probe_cache = ProbeCache(cache_dir)
+
+    # Each worker has its own client, so the rate limit is split between them
+    jobs = TruegazeScanner.get_job_count(jobs)
+    options['online_client'] = OnlineClient(probe_cache=probe_cache, rate_limit=DEFAULT_RATE_LIMIT / jobs)
+
+    service = ScanService(jobs, online, scan_timeout or None, **options)
+    service.start()
+    server = ScanService.create_server(service, host, port, socket_path)
+    if socket_path is not None:
+        click.echo('Listening on ' + socket_path)
+    else:
+        click.echo('Listening on http://' + host + ':' + str(server.server_address[1]))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def get_timeout_options(plugin_timeout, file_timeout):
+    """
+    Converts the timeout options into keyword arguments for TruegazeScanner.scan_file()
+
+    :param plugin_timeout: maximum time in seconds for each plugin, 0 for no limit
+    :param file_timeout: maximum time in seconds for each file, 0 for no limit
+    :return: dictionary of keyword arguments
+    """
+    if (plugin_timeout or file_timeout) and not IsolatedCall.is_supported():
+        raise click.UsageError('Timeouts are not supported on this platform')
+    return dict(plugin_timeout=plugin_timeout or None, file_timeout=file_timeout or None)
+
+
 if __name__ == '__main__':
     cli(prog_name='truegaze')
\ No newline at end of file
@@ -0,0 +1,110 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import json
+import zipfile
+
+from truegaze.archive import ArchiveView, MappedZipFile
+from truegaze.utils import TruegazeUtils
+
+# Metadata file of XAPK files, which lists the split APKs and marks the base one
+XAPK_MANIFEST = 'manifest.json'
+
+# Names of the base APK in APKS files (built by bundletool) and other split APK bundles, checked in order
+BASE_APK_NAMES = ['base.apk', 'splits/base-master.apk', 'base-master.apk', 'standalones/standalone.apk']
+
+# Extension of the APKs inside bundles
+APK_EXTENSION = '.apk'
+
+# Separator between the path of a nested archive and a path inside of it, as in jar: URLs
+NESTED_SEPARATOR = '!/'
+
+
+class TruegazeContainers(object):
+    """
+    Support for bundles of split APKs such as XAPK and APKS files, which are ZIP files holding a base APK along
+    with configuration splits. The base APK holds the manifest, code, resources and signatures that the plugins
+    look at, so it is opened in place of the bundle - straight from the bundle's memory map if it is stored
+    uncompressed, as it usually is, or decompressed into memory otherwise. Nothing is extracted to disk.
+    """
+
+    @staticmethod
+    def find_base_apk(zip_file):
+        """
+        Finds the base APK inside a bundle of split APKs, named in the XAPK metadata or with one of the names
+        used by bundletool and other tools
+
+        :param zip_file: truegaze.archive.MappedZipFile of the bundle
+        :return: path of the base APK, or None if this is not a bundle
+        """
+        names = [zip_file.index.get_name(index) for index in zip_file.index.find_extension(APK_EXTENSION)]
+        if len(names) == 0:
+            return None
+
+        # Only the XAPK metadata and the known names are trusted, other files such as iOS apps can carry APKs
+        # as plain assets
+        candidates = TruegazeContainers.get_xapk_base_names(zip_file) + BASE_APK_NAMES
+        for name in candidates:
+            if name in names:
+                return name
+        return None
+
+    @staticmethod
+    def get_xapk_base_names(zip_file):
+        """
+        Gets the name of the base APK from the metadata of an XAPK file
+
+        :param zip_file: truegaze.archive.MappedZipFile of the bundle
+        :return: list of possible names of the base APK, empty if there is no usable metadata
+        """
+        try:
+            manifest = json.loads(bytes(TruegazeUtils.read_zip_entry(zip_file, XAPK_MANIFEST)).decode('utf-8'))
+        except (KeyError, ValueError, zipfile.BadZipFile):
+            return []
+        if not isinstance(manifest, dict):
+            return []
+
+        names = [split.get('file') for split in manifest.get('split_apks') or []
+                 if isinstance(split, dict) and split.get('id') == 'base']
+        if isinstance(manifest.get('package_name'), str):
+            names.append(manifest['package_name'] + APK_EXTENSION)
+        return [name for name in names if isinstance(name, str)]
+
+    @staticmethod
+    def open_nested(zip_file, name):
+        """
+        Opens an archive stored inside another one, raising truegaze.archive.EntryLimitError if it has to be
+        decompressed and is over the outer archive's read limits
+
+        :param zip_file: truegaze.archive.MappedZipFile of the outer archive
+        :param name: path of the inner archive
+        :return: truegaze.archive.MappedZipFile of the inner archive with the same limits, or None if it is
+                 not a valid ZIP file
+        """
+        view = ArchiveView(TruegazeUtils.read_zip_entry(zip_file, name),
+                           str(zip_file.filename) + NESTED_SEPARATOR + name)
+        try:
+            return MappedZipFile(view, zip_file.max_entry_size, zip_file.max_ratio)
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, ValueError):
+            view.close()
+            return None
@@ -0,0 +1,278 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import hashlib
+import zipfile
+
+from truegaze.archive import DEFAULT_MAX_ENTRY_SIZE, DEFAULT_MAX_RATIO, EntryLimitError, MappedZipFile
+from truegaze.axml import AxmlError
+from truegaze.containers import NESTED_SEPARATOR, TruegazeContainers
+from truegaze.online import OnlineClient
+from truegaze.utils import IOS_PATTERN, TruegazeUtils
+
+
+class ScanContext(object):
+    """
+    Per-application state that is built once for each scanned file and shared by all plugins, so that the
+    file is only opened, detected and parsed a single time
+    """
+
+    def __init__(self, filename, path_patterns=None, online_client=None, max_entry_size=DEFAULT_MAX_ENTRY_SIZE,
+                 max_ratio=DEFAULT_MAX_RATIO, profiler=None, cache=None):
+        """
+        Main constructor
+
+        :param filename: file to scan
+        :param path_patterns: regex patterns that plugins will search for, matched together in a single pass
+        :param online_client: truegaze.online.OnlineClient shared by the online checks of the whole scan run
+        :param max_entry_size: maximum decompressed size of an entry in bytes, None for no limit
+        :param max_ratio: maximum compression ratio of an entry, None for no limit
+        :param profiler: optional truegaze.profiler.Profiler that plugins record their phases in
+        :param cache: optional truegaze.cache.ResultCache that plugins can keep intermediate results in, such as
+                      results for files that are shared by many apps
+        """
+        self.filename = filename
+        self.profiler = profiler
+        self.cache = cache
+        self._online_client = online_client
+        self.max_entry_size = max_entry_size
+        self.max_ratio = max_ratio
+        self._path_patterns = [IOS_PATTERN] + list(path_patterns or [])
+        self._matched_paths = {}
+        self._zip_file = None
+        self._opened = False
+        self.android_manifest = None
+        self.ios_manifest = None
+        self.detect_error = None
+        self.app_info = None
+        self.nested_path = None
+        self._container = None
+
+    @property
+    def is_android(self):
+        """Whether the file was identified as an Android application"""
+        return self.android_manifest is not None
+
+    @property
+    def is_ios(self):
+        """Whether the file was identified as an iOS application"""
+        return self.android_manifest is None and self.ios_manifest is not None
+
+    @property
+    def zip_file(self):
+        """
+        ZIP handle for the file, opened the first time it is needed
+
+        :return: zipfile.ZipFile, or None if the file can't be opened
+        """
+        if not self._opened:
+            self.open()
+        return self._zip_file
+
+    @property
+    def online_client(self):
+        """
+        Client to use for online checks, the shared default client if none was provided
+
+        :return: truegaze.online.OnlineClient
+        """
+        if self._online_client is None:
+            self._online_client = OnlineClient.get_default()
+        return self._online_client
+
+    def open(self):
+        """
+        Tries to open the file as a ZIP, along with the base APK inside of it if the file was already detected
+        as a bundle of split APKs
+
+        :return: True if the file was opened, False otherwise
+        """
+        self._opened = True
+        self._zip_file = TruegazeUtils.open_file_as_zip(self.filename, self.max_entry_size, self.max_ratio)
+        if self._zip_file is not None and self.nested_path is not None:
+            try:
+                return self.open_nested(self.nested_path)
+            except EntryLimitError:
+                return False
+        return self._zip_file is not None
+
+    def open_nested(self, path):
+        """
+        Switches to an archive inside the file, such as the base APK of a bundle of split APKs. The file stays
+        open, since the inner archive is usually read straight from its memory map.
+
+        :param path: path of the inner archive
+        :return: True if the inner archive was opened, False otherwise
+        """
+        nested = TruegazeContainers.open_nested(self._zip_file, path)
+        if nested is None:
+            return False
+        self._container, self._zip_file = self._zip_file, nested
+        self._matched_paths = {}
+        self.nested_path = path
+        return True
+
+    def close_nested(self):
+        """Switches back from an archive opened by open_nested() to the file itself"""
+        self._zip_file.close()
+        self._zip_file, self._container = self._container, None
+        self._matched_paths = {}
+        self.nested_path = None
+
+    def detect(self):
+        """
+        Detects the platform by looking for the Android or iOS manifest. Android manifests are also decoded to
+        check that they are valid and to read the app's identity into app_info. A manifest that is over the read
+        limits or malformed is kept in detect_error.
+
+        :return: True if the platform was identified, False otherwise
+        """
+        self.android_manifest = TruegazeUtils.get_android_manifest(self.zip_file)
+        try:
+            if self.android_manifest is None:
+                self.ios_manifest = TruegazeUtils.get_ios_manifest(self.zip_file, self.get_matching_paths(IOS_PATTERN))
+            if self.android_manifest is None and self.ios_manifest is None:
+                base_apk = TruegazeContainers.find_base_apk(self.zip_file)
+                if base_apk is not None and self.open_nested(base_apk):
+                    self.android_manifest = TruegazeUtils.get_android_manifest(self.zip_file)
+                    if self.android_manifest is None:
+                        self.close_nested()
+            if self.android_manifest is not None:
+                self.app_info = TruegazeUtils.get_android_app_info(self.zip_file, self.android_manifest)
+        except EntryLimitError as error:
+            self.detect_error = str(error)
+            self.android_manifest = None
+        except (AxmlError, zipfile.BadZipFile) as error:
+            self.detect_error = 'Invalid Android manifest "' + self.get_location(self.android_manifest) + \
+                                '" - ' + str(error)
+            self.android_manifest = None
+        return self.is_android or self.is_ios
+
+    def get_app_name(self):
+        """
+        Describes the application by its package name and version, as read from the Android manifest
+
+        :return: description of the application, or None if it is not known
+        """
+        if self.app_info is None or self.app_info.get('package') is None:
+            return None
+        name = self.app_info['package']
+        if self.app_info.get('version_name') is not None:
+            name += ' version ' + str(self.app_info['version_name'])
+        if self.app_info.get('version_code') is not None:
+            name += ' (' + str(self.app_info['version_code']) + ')'
+        if self.app_info.get('min_sdk') is not None:
+            name += ', minimum SDK ' + str(self.app_info['min_sdk'])
+        return name
+
+    def get_location(self, path):
+        """
+        Describes where a path is, including the inner archive it is in if there is one
+
+        :param path: path inside the archive being scanned
+        :return: location of the path
+        """
+        if self.nested_path is None:
+            return path
+        return self.nested_path + NESTED_SEPARATOR + path
+
+    def get_matching_paths(self, pattern):
+        """
+        Gets the paths in the file matching a pattern. The first call walks the list of files once for all of
+        the patterns given to the constructor, later calls reuse those results.
+
+        :param pattern: regex pattern to use
+        :return: list of matched paths
+        """
+        if pattern not in self._matched_paths:
+            patterns = [item for item in self._path_patterns if item not in self._matched_paths]
+            if pattern not in patterns:
+                patterns.append(pattern)
+            self._matched_paths.update(TruegazeUtils.get_matching_paths_for_patterns(self.zip_file, patterns))
+        return self._matched_paths[pattern]
+
+    def entry_contains(self, path, signatures):
+        """
+        Searches an entry for byte signatures, reading it in chunks so that it is never held in memory as a whole.
+        Entries that are over the read limits or malformed count as a match, so that the plugin reports them.
+
+        :param path: path of the entry
+        :param signatures: list of byte strings to search for
+        :return: True if the entry contains any of the signatures, False if it doesn't or doesn't exist
+        """
+        overlap = max(len(signature) for signature in signatures) - 1
+        tail = b''
+        try:
+            if isinstance(self.zip_file, MappedZipFile):
+                chunks = self.zip_file.iter_entry(path)
+            else:
+                chunks = [self.zip_file.read(path)]
+            for chunk in chunks:
+                # Keep the end of the previous chunk, in case a signature spans both
+                data = tail + bytes(chunk)
+                if any(signature in data for signature in signatures):
+                    return True
+                tail = data[-overlap:] if overlap > 0 else b''
+        except KeyError:
+            return False
+        except (EntryLimitError, zipfile.BadZipFile):
+            return True
+        return False
+
+    def get_fingerprint(self, patterns):
+        """
+        Fingerprints the entries matching some patterns using the names, CRCs and sizes from the central
+        directory, without reading the entries themselves. Other builds of the same app get the same fingerprint
+        as long as those entries are unchanged.
+
+        :param patterns: regex patterns of the entries to include
+        :return: hex digest of the fingerprint
+        """
+        digest = hashlib.sha256()
+        digest.update(('android' if self.is_android else 'ios' if self.is_ios else 'unknown').encode())
+        for pattern in patterns:
+            digest.update(b'\x00' + pattern.pattern.encode())
+            for path in sorted(set(self.get_matching_paths(pattern))):
+                try:
+                    info = self.zip_file.getinfo(path)
+                    entry = path + ':' + str(info.CRC) + ':' + str(info.file_size)
+                except KeyError:
+                    entry = path + ':missing'
+                digest.update(b'\x00' + entry.encode())
+        return digest.hexdigest()
+
+    def close(self):
+        """Releases the ZIP handle"""
+        if self._zip_file is not None:
+            self._zip_file.close()
+            self._zip_file = None
+        if self._container is not None:
+            self._container.close()
+            self._container = None
+        self._matched_paths = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
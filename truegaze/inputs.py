@@ -0,0 +1,155 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import os
+
+import click
+
+# Extensions of the files picked up when scanning directories, unless others are given
+DEFAULT_EXTENSIONS = ('.apk', '.ipa', '.xapk', '.apks', '.aab')
+
+# Size of the chunks that list files are read in
+LIST_CHUNK_SIZE = 64 * 1024
+
+
+class TruegazeInputs(object):
+    """
+    Enumerates the files to scan from the command line, directories and list files. Everything is done with
+    generators, so that scanning starts right away and memory use doesn't grow with the number of files.
+    """
+
+    @staticmethod
+    def iter_inputs(filenames=(), directories=(), list_files=(), extensions=None):
+        """
+        Enumerates all of the files to scan, in the order they were given
+
+        :param filenames: files given directly
+        :param directories: directories to search recursively
+        :param list_files: binary file objects listing the files to scan, one per line or separated by NUL, entries
+                           that are missing or aren't regular files are reported and skipped
+        :param extensions: extensions to filter all inputs by, if None only the files found in directories are
+                           filtered using DEFAULT_EXTENSIONS
+        :return: generator of filenames
+        """
+        for filename in filenames:
+            if TruegazeInputs.has_extension(filename, extensions):
+                yield filename
+        for directory in directories:
+            for filename in TruegazeInputs.iter_directory(directory, extensions or DEFAULT_EXTENSIONS):
+                yield filename
+        for list_file in list_files:
+            for filename in TruegazeInputs.iter_list_file(list_file):
+                if TruegazeInputs.has_extension(filename, extensions) and TruegazeInputs.is_file(filename):
+                    yield filename
+
+    @staticmethod
+    def is_file(filename):
+        """
+        Checks that a file from a list exists and is a regular file, reporting it otherwise
+
+        :param filename: name of the file
+        :return: True if the file can be scanned
+        """
+        if os.path.isfile(filename):
+            return True
+        if os.path.exists(filename):
+            click.echo('ERROR: Skipping "' + filename + '" - not a regular file')
+        else:
+            click.echo('ERROR: Skipping "' + filename + '" - file not found')
+        return False
+
+    @staticmethod
+    def has_extension(filename, extensions):
+        """
+        Checks if a file has one of the extensions, ignoring case
+
+        :param filename: name of the file
+        :param extensions: list of extensions including the dot, None or empty to accept all files
+        :return: True if the file has one of the extensions
+        """
+        if not extensions:
+            return True
+        return filename.lower().endswith(tuple(extension.lower() for extension in extensions))
+
+    @staticmethod
+    def iter_directory(directory, extensions=DEFAULT_EXTENSIONS):
+        """
+        Finds files in a directory and its subdirectories, in sorted order. Only one directory listing is held in
+        memory per level, and symbolic links to directories are not followed to avoid loops.
+
+        :param directory: directory to search
+        :param extensions: list of extensions to filter by, None or empty to return all files
+        :return: generator of filenames
+        """
+        with os.scandir(directory) as iterator:
+            entries = sorted(iterator, key=lambda item: item.name)
+
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    for filename in TruegazeInputs.iter_directory(entry.path, extensions):
+                        yield filename
+                elif entry.is_file() and TruegazeInputs.has_extension(entry.name, extensions):
+                    yield entry.path
+            except OSError:
+                continue
+
+    @staticmethod
+    def iter_list_file(list_file):
+        """
+        Reads filenames from a list, one per line or separated by NUL characters like the output of
+        "find -print0". The separator is picked from the first chunk, and empty lines are skipped.
+
+        :param list_file: binary file object to read from
+        :return: generator of filenames
+        """
+        separator = None
+        remainder = b''
+        for chunk in iter(lambda: list_file.read(LIST_CHUNK_SIZE), b''):
+            if separator is None:
+                separator = b'\x00' if b'\x00' in chunk else b'\n'
+            lines = (remainder + chunk).split(separator)
+            remainder = lines.pop()
+            for line in lines:
+                filename = TruegazeInputs.decode_line(line, separator)
+                if filename:
+                    yield filename
+
+        filename = TruegazeInputs.decode_line(remainder, separator)
+        if filename:
+            yield filename
+
+    @staticmethod
+    def decode_line(line, separator):
+        """
+        Decodes a filename from a list file
+
+        :param line: raw bytes of the line
+        :param separator: separator used by the list
+        :return: filename, or an empty string if the line was blank
+        """
+        if separator != b'\x00':
+            line = line.rstrip(b'\r')
+            if len(line.strip()) == 0:
+                return ''
+        return os.fsdecode(line)
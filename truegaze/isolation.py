@@ -0,0 +1,126 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import os
+import pickle
+import select
+import signal
+import time
+import traceback
+
+# Size of each read from the pipe the child process writes its result to
+READ_SIZE = 64 * 1024
+
+
+class IsolationError(Exception):
+    """Raised when a function run in a child process raised an exception or the child process died"""
+
+
+class CallTimeoutError(IsolationError):
+    """Raised when a function run in a child process didn't finish in time, the child process is killed"""
+
+
+class IsolatedCall(object):
+    """
+    Runs functions in forked child processes that can be killed if they take too long, so that a single file
+    that sends a parser into a loop can't stall a whole batch. The child starts with a copy of the parent's
+    memory - such as the already opened and indexed file - and sends back the function's result, which must be
+    picklable. Only available on platforms with os.fork().
+    """
+
+    @staticmethod
+    def is_supported():
+        """
+        Checks if functions can be run in child processes on this platform
+
+        :return: True if os.fork() is available
+        """
+        return hasattr(os, 'fork')
+
+    @staticmethod
+    def run(function, timeout=None):
+        """
+        Runs a function in a child process and waits for its result
+
+        :param function: function to call without arguments
+        :param timeout: maximum time in seconds to wait, None to wait forever
+        :return: result of the function
+        """
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            IsolatedCall._run_child(function, write_fd)
+
+        os.close(write_fd)
+        finished = False
+        try:
+            data = IsolatedCall._read_result(read_fd, timeout)
+            _, status = os.waitpid(pid, 0)
+            finished = True
+        finally:
+            os.close(read_fd)
+            if not finished:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+
+        if not data:
+            if os.WIFSIGNALED(status):
+                raise IsolationError('Child process was killed by signal ' + str(os.WTERMSIG(status)))
+            raise IsolationError('Child process exited without a result')
+        success, result = pickle.loads(data)
+        if not success:
+            raise IsolationError(result)
+        return result
+
+    @staticmethod
+    def _run_child(function, write_fd):
+        # Never returns, the child exits without running any cleanup inherited from the parent
+        try:
+            try:
+                data = pickle.dumps((True, function()))
+            except BaseException:
+                data = pickle.dumps((False, traceback.format_exc().strip().splitlines()[-1]))
+            view = memoryview(data)
+            while view:
+                view = view[os.write(write_fd, view):]
+        finally:
+            os._exit(0)
+
+    @staticmethod
+    def _read_result(read_fd, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        chunks = []
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CallTimeoutError('Timed out after ' + str(timeout) + ' seconds')
+
+            ready, _, _ = select.select([read_fd], [], [], remaining)
+            if ready:
+                chunk = os.read(read_fd, READ_SIZE)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
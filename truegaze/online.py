@@ -0,0 +1,319 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Default timeout in seconds for each online request
+DEFAULT_TIMEOUT = 10
+
+# Default maximum number of online requests in flight at the same time
+DEFAULT_CONCURRENCY = 8
+
+# Default maximum number of requests per second sent to each host
+DEFAULT_RATE_LIMIT = 10
+
+# Default number of times to retry requests that were throttled or failed with a server error
+DEFAULT_RETRIES = 2
+
+# Initial delay in seconds before retrying, doubled after each attempt
+BACKOFF_DELAY = 0.25
+
+# Maximum delay in seconds before retrying, including delays requested by the server via Retry-After
+MAX_BACKOFF_DELAY = 30
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket used to limit the rate of requests to a host"""
+
+    def __init__(self, rate, burst=None):
+        """
+        Main constructor
+
+        :param rate: number of tokens added per second
+        :param burst: maximum number of tokens that can be saved up, defaults to the rate
+        """
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes a token, waiting until one is available
+
+        :return: time in seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class ProbeError(Exception):
+    """Raised when an online probe failed because of a network error, including errors cached from earlier"""
+
+
+class OnlineClient(object):
+    """
+    HTTP client shared by all online checks in a scan run. Requests go through a single keep-alive session and
+    a thread pool that caps how many are in flight at once, and every request has a timeout so that a slow
+    endpoint can't stall the scan. Each host gets its own rate limit, and requests that are throttled (429) or
+    fail with a server error (5xx) are retried with exponential backoff. The session and pool are created on
+    first use, and are not shared with worker processes - each one creates its own.
+    """
+
+    # Shared client used when none is provided
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_concurrency=DEFAULT_CONCURRENCY, probe_cache=None,
+                 rate_limit=DEFAULT_RATE_LIMIT, retries=DEFAULT_RETRIES):
+        """
+        Main constructor
+
+        :param timeout: timeout in seconds for each request
+        :param max_concurrency: maximum number of requests in flight at the same time
+        :param probe_cache: optional truegaze.cache.ProbeCache to share probe results across apps and runs
+        :param rate_limit: maximum number of requests per second to each host
+        :param retries: number of times to retry throttled requests and server errors
+        """
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.probe_cache = probe_cache
+        self.rate_limit = rate_limit
+        self.retries = retries
+        self._session = None
+        self._executor = None
+        self._in_flight = dict()
+        self._buckets = dict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_session'] = None
+        state['_executor'] = None
+        state['_in_flight'] = dict()
+        state['_buckets'] = dict()
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_default():
+        """
+        Gets the shared client with the default settings
+
+        :return: OnlineClient
+        """
+        with OnlineClient._default_lock:
+            if OnlineClient._default is None:
+                OnlineClient._default = OnlineClient()
+            return OnlineClient._default
+
+    @property
+    def session(self):
+        """Keep-alive session sized to the concurrency limit, created on first use"""
+        with self._lock:
+            if self._session is None:
+                import requests
+                self._session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=self.max_concurrency,
+                                                        pool_maxsize=self.max_concurrency)
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+            return self._session
+
+    def get(self, url, **kwargs):
+        """
+        Sends a GET request with the client's timeout, rate limit and retries
+
+        :param url: URL to request
+        :return: requests.Response
+        """
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        """
+        Sends a HEAD request with the client's timeout, rate limit and retries
+
+        :param url: URL to request
+        :return: requests.Response
+        """
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request, waiting for the host's rate limit and retrying with exponential backoff if the
+        request was throttled or failed with a server error
+
+        :param method: HTTP method
+        :param url: URL to request
+        :return: requests.Response, the last one received if all retries failed
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        bucket = self.get_bucket(urlsplit(url).netloc)
+        attempt = 0
+        while True:
+            bucket.acquire()
+            response = self.session.request(method, url, **kwargs)
+            if attempt >= self.retries or not OnlineClient.should_retry(response):
+                return response
+
+            delay = OnlineClient.get_backoff_delay(response, attempt)
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def get_bucket(self, host):
+        """
+        Gets the rate limiter for a host
+
+        :param host: host name, including the port if any
+        :return: TokenBucket
+        """
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate_limit)
+                self._buckets[host] = bucket
+            return bucket
+
+    @staticmethod
+    def should_retry(response):
+        """
+        Checks if a request should be retried
+
+        :param response: requests.Response
+        :return: True if the request was throttled or failed with a server error
+        """
+        return response.status_code == 429 or response.status_code >= 500
+
+    @staticmethod
+    def get_backoff_delay(response, attempt):
+        """
+        Calculates how long to wait before retrying, using the server's Retry-After header if it has one
+
+        :param response: requests.Response
+        :param attempt: number of retries done so far
+        :return: delay in seconds
+        """
+        delay = BACKOFF_DELAY * (2 ** attempt)
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        return min(delay, MAX_BACKOFF_DELAY)
+
+    def submit(self, function, *args):
+        """
+        Runs a check in the background, at most max_concurrency checks run at the same time
+
+        :param function: function to call
+        :param args: arguments to pass to the function
+        :return: concurrent.futures.Future with the result of the function
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+            executor = self._executor
+        return executor.submit(function, *args)
+
+    def probe(self, key, function, *args):
+        """
+        Runs an online probe in the background, reusing the cached result if the same probe ran recently and
+        sharing a single request between all callers that ask for the same probe while it is in flight
+
+        :param key: key identifying the probe, such as the URL being checked
+        :param function: function to call, must raise a requests.RequestException on network errors
+        :param args: arguments to pass to the function
+        :return: concurrent.futures.Future with the result of the function, or raising ProbeError
+        """
+        if self.probe_cache is not None:
+            cached = self.probe_cache.get(key)
+            if cached is not None:
+                future = Future()
+                message, error = cached
+                if error is not None:
+                    future.set_exception(ProbeError(error))
+                else:
+                    future.set_result(message)
+                return future
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            self._in_flight[key] = future
+
+        self.submit(self._run_probe, key, future, function, *args)
+        return future
+
+    def _run_probe(self, key, future, function, *args):
+        import requests
+        message, error = None, None
+        try:
+            message = function(*args)
+        except requests.RequestException as exception:
+            error = str(exception) or exception.__class__.__name__
+        except Exception as exception:
+            # Unexpected errors are passed on as they are, and not cached
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(exception)
+            return
+
+        if self.probe_cache is not None:
+            self.probe_cache.put(key, message, error)
+        with self._lock:
+            del self._in_flight[key]
+
+        if error is not None:
+            future.set_exception(ProbeError(error))
+        else:
+            future.set_result(message)
+
+    def close(self):
+        """Waits for any pending checks and closes the session"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            session, self._session = self._session, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if session is not None:
+            session.close()
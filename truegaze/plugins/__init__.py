@@ -1,11 +1,105 @@
-from truegaze.plugins.adobe_mobile_sdk import AdobeMobileSdkPlugin
-from truegaze.plugins.firebase import FirebasePlugin
-from truegaze.plugins.weak_key import WeakKeyPlugin
+import importlib
+import re
 
-# List of active plugins - when developing a new plugin, it should be added here.
+
+class PluginInfo(object):
+    """
+    Metadata about a plugin that can be read without importing the plugin module, so that listing plugins or
+    skipping plugins that don't apply doesn't pull in heavy dependencies like androguard. The module is only
+    imported when load() is called.
+    """
+
+    def __init__(self, module, class_name, name, desc, version, supports_android, supports_ios,
+                 supports_online=False, path_patterns=None, input_patterns=None, required_patterns=None,
+                 required_content=None, not_applicable=None):
+        """
+        Main constructor, the metadata must match the attributes of the plugin class
+
+        :param module: name of the module containing the plugin
+        :param class_name: name of the plugin class
+        :param name: name of the plugin
+        :param desc: description of the plugin
+        :param version: version of the plugin
+        :param supports_android: whether scanning of Android files is supported
+        :param supports_ios: whether scanning of iOS files is supported
+        :param supports_online: whether online tests are supported
+        :param path_patterns: regex patterns of paths in the file that the plugin searches for
+        :param input_patterns: regex patterns of the entries that the plugin's results depend on, or None if
+                               they depend on the whole file
+        :param required_patterns: regex patterns of paths, the plugin only applies to files with an entry matching
+                                  at least one of them
+        :param required_content: tuple of (entry name, list of byte signatures), the plugin only applies to
+                                 files where that entry contains at least one of the signatures
+        :param not_applicable: what the file is missing when the plugin doesn't apply, shown instead of its results
+        """
+        self.module = module
+        self.class_name = class_name
+        self.name = name
+        self.desc = desc
+        self.version = version
+        self.supports_android = supports_android
+        self.supports_ios = supports_ios
+        self.supports_online = supports_online
+        self.path_patterns = path_patterns or []
+        self.input_patterns = input_patterns
+        self.required_patterns = required_patterns or []
+        self.required_content = required_content
+        self.not_applicable = not_applicable
+
+    def load(self):
+        """
+        Imports the plugin module
+
+        :return: plugin class
+        """
+        return getattr(importlib.import_module(self.module), self.class_name)
+
+    def is_os_supported(self, is_android, is_ios):
+        """
+        Checks if this plugin supports a given OS, same as BasePlugin.is_os_supported()
+
+        :param is_android: whether the file is an Android application
+        :param is_ios: whether the file is an iOS application
+        :return: True if supported
+        """
+        return (is_android and self.supports_android) or (is_ios and self.supports_ios)
+
+    def is_applicable(self, context):
+        """
+        Checks the plugin's pre-conditions against the file, without importing the plugin. Paths are checked
+        against the central directory, and only the one entry named in required_content is read.
+
+        :param context: truegaze.context.ScanContext for the file
+        :return: True if the plugin applies to the file
+        """
+        if len(self.required_patterns) > 0 and \
+                not any(len(context.get_matching_paths(pattern)) > 0 for pattern in self.required_patterns):
+            return False
+        if self.required_content is not None:
+            path, signatures = self.required_content
+            return context.entry_contains(path, signatures)
+        return True
+
+
+# List of active plugins - when developing a new plugin, it should be added here along with its metadata.
 # BasePlugin should never be added to this list.
 ACTIVE_PLUGINS = [
-    AdobeMobileSdkPlugin,
-    FirebasePlugin,
-    WeakKeyPlugin
-]
\ No newline at end of file
+    PluginInfo('truegaze.plugins.adobe_mobile_sdk', 'AdobeMobileSdkPlugin', name='AdobeMobileSdk',
+               desc='Detection of incorrect SSL configuration\nin the Adobe Mobile SDK', version='1.1',
+               supports_android=True, supports_ios=True,
+               path_patterns=[re.compile(r'(.*/)?ADBMobileConfig(.*)\.json')],
+               input_patterns=[re.compile(r'(.*/)?ADBMobileConfig(.*)\.json')],
+               required_patterns=[re.compile(r'(.*/)?ADBMobileConfig(.*)\.json')],
+               not_applicable='no Adobe integration in this application (no "ADBMobileConfig.json" file)'),
+    PluginInfo('truegaze.plugins.firebase', 'FirebasePlugin', name='FirebasePlugin',
+               desc='Detection of insecure Firebase databases and GCP storage buckets', version='1.3',
+               supports_android=True, supports_ios=False, supports_online=True,
+               input_patterns=[re.compile(r'resources\.arsc$')],
+               required_content=('resources.arsc', [b'firebase_database_url',
+                                                    'firebase_database_url'.encode('utf-16-le')]),
+               not_applicable='no Firebase database in this application (no "firebase_database_url" resource)'),
+    PluginInfo('truegaze.plugins.weak_key', 'WeakKeyPlugin', name='WeakKeyPlugin',
+               desc='Detection of weak Android signing keys', version='1.1',
+               supports_android=True, supports_ios=False,
+               path_patterns=[re.compile(r'META-INF/.*\.(RSA|DSA|EC)$')]),
+]
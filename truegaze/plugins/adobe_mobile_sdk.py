@@ -21,6 +21,8 @@
 # specific language governing permissions and limitations
 # under the License.
 #
+import functools
+import hashlib
 import json
 import re
 
@@ -28,6 +30,8 @@ import click
 import pkg_resources
 from jsonschema.validators import validator_for
 
+from truegaze.archive import EntryLimitError
+from truegaze.cache import MemoryCache, ResultCache
 from truegaze.plugins.base import BasePlugin
 from truegaze.utils import TruegazeUtils
 
@@ -38,6 +42,11 @@ CONFIG_FILE_PATTERN =\
 # Location of the rules file for validation
 RULES_FILE = pkg_resources.resource_filename('truegaze', 'data/adobe_mobile_sdk.schema')
 
+# Many apps ship identical config files copied from the SDK samples, so validation results are kept by content
+# in memory for the whole process, and in the persistent cache under this name if there is one
+VALIDATION_CACHE = MemoryCache()
+VALIDATION_CACHE_NAME = 'AdobeMobileSdk:validation'
+
 
 #
 # Plugin to support detection of incorrect SSL configuration in the Adobe Mobile SDK. This plugin will not
@@ -52,20 +61,22 @@ RULES_FILE = pkg_resources.resource_filename('truegaze', 'data/adobe_mobile_sdk.
 class AdobeMobileSdkPlugin(BasePlugin):
     name = 'AdobeMobileSdk'
     desc = 'Detection of incorrect SSL configuration\nin the Adobe Mobile SDK'
+    version = '1.1'
     supports_android = True
     supports_ios = True
-    zip_file = None
+    path_patterns = [CONFIG_FILE_PATTERN]
+    input_patterns = [CONFIG_FILE_PATTERN]
+    required_patterns = [CONFIG_FILE_PATTERN]
+    not_applicable = 'no Adobe integration in this application (no "ADBMobileConfig.json" file)'
 
     # Main scanning method
     def scan(self):
         # On Android, the config file is usually in the assets folder but can be placed elsewhere.
         # On iOS the configuration file can be anywhere.
 
-        # Load file
-        self.zip_file = TruegazeUtils.open_file_as_zip(self.filename)
-
-        # Search all paths for the config file
-        paths = AdobeMobileSdkPlugin.get_paths(self.zip_file)
+        # Search all paths for the config file, reusing the already opened file
+        zip_file = self.context.zip_file
+        paths = self.context.get_matching_paths(CONFIG_FILE_PATTERN)
         if len(paths) == 0:
             click.echo('-- No Adobe integration in this application (no "ADBMobileConfig.json" file); skipping test')
             return
@@ -75,14 +86,16 @@ class AdobeMobileSdkPlugin(BasePlugin):
         for path in paths:
             click.echo('-- Scanning "' + path + "'")
 
-            # Try to parse the data
-            parsed_data = AdobeMobileSdkPlugin.parse_data(self.zip_file, path)
-            if not parsed_data:
+            # Try to parse and validate the data, files over the read limits are reported instead
+            try:
+                messages = self.get_messages(zip_file, path)
+            except EntryLimitError as error:
+                click.echo('---- ISSUE: ' + str(error))
+                continue
+            if messages is None:
                 click.echo('---- ERROR: Unable to parse config file - will skip. File: ' + path)
                 continue
 
-            # Validate the file
-            messages = AdobeMobileSdkPlugin.validate(parsed_data)
             if len(messages) > 0:
                 click.echo("-- Found " + str(len(messages)) + ' issues')
                 for message in messages:
@@ -90,6 +103,48 @@ class AdobeMobileSdkPlugin(BasePlugin):
             else:
                 click.echo("-- No issues found")
 
+    # Parses and validates a config file, returning the messages or None if the file can't be parsed. Results are
+    # reused for files with the same contents, found first by the CRC and size from the central directory so that
+    # a match doesn't even read the file, then by the hash of the contents.
+    def get_messages(self, zip_file, path):
+        info = zip_file.getinfo(path)
+        crc_key = self.get_cache_key('crc:' + format(info.CRC, '08x') + ':' + str(info.file_size))
+        cached = self.get_cached(crc_key)
+        if cached is None:
+            with self.phase('parse'):
+                data = zip_file.read(path)
+            hash_key = self.get_cache_key('sha256:' + hashlib.sha256(data).hexdigest())
+            cached = self.get_cached(hash_key)
+            if cached is None:
+                with self.phase('parse'):
+                    parsed_data = AdobeMobileSdkPlugin.parse_json(data)
+                cached = json.dumps(AdobeMobileSdkPlugin.validate(parsed_data) if parsed_data else None)
+                self.store(hash_key, cached)
+            self.store(crc_key, cached)
+        return json.loads(cached)
+
+    # Builds the key of a validation result, which depends on the plugin and the schema
+    def get_cache_key(self, content_key):
+        return ResultCache.make_key(content_key, VALIDATION_CACHE_NAME, self.version, TruegazeUtils.get_version(),
+                                    False)
+
+    # Looks up a validation result in memory, then in the persistent cache
+    def get_cached(self, key):
+        cached = VALIDATION_CACHE.get(key)
+        cache = getattr(self.context, 'cache', None)
+        if cached is None and cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                VALIDATION_CACHE.put(key, cached)
+        return cached
+
+    # Stores a validation result in memory, and in the persistent cache if there is one
+    def store(self, key, value):
+        VALIDATION_CACHE.put(key, value)
+        cache = getattr(self.context, 'cache', None)
+        if cache is not None:
+            cache.put(key, value)
+
     # Gets paths for the configuration file from the ZIP File
     @staticmethod
     def get_paths(zip_file):
@@ -98,23 +153,38 @@ class AdobeMobileSdkPlugin(BasePlugin):
     # Parses the config file from a given path
     @staticmethod
     def parse_data(zip_file, path):
-        data = zip_file.read(path)
+        return AdobeMobileSdkPlugin.parse_json(zip_file.read(path))
+
+    # Parses the contents of a config file
+    @staticmethod
+    def parse_json(data):
         try:
             parsed_data = json.loads(data.decode())
         except json.JSONDecodeError:
             return None
         return parsed_data
 
+    # Loads the JSON schema and compiles it into a validator, done only once per process
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def get_validator():
+        with open(RULES_FILE, 'r') as schema_file:
+            schema_data = json.load(schema_file)
+
+        validator_class = validator_for(schema_data)
+        validator_class.check_schema(schema_data)
+        return validator_class(schema=schema_data)
+
+    # Compiles the schema ahead of the first scan
+    @staticmethod
+    def warm_up():
+        AdobeMobileSdkPlugin.get_validator()
+
     # Validates the config file against the JSON schema
     @staticmethod
     def validate(parsed_data):
-        # Load the schema
-        schema_file = open(RULES_FILE, 'r')
-        schema_data = json.load(schema_file)
-
         # Validate the file
-        validator = validator_for(schema_data)
-        errors = validator(schema=schema_data).iter_errors(parsed_data)
+        errors = AdobeMobileSdkPlugin.get_validator().iter_errors(parsed_data)
 
         # Extract error messages and return
         messages = []
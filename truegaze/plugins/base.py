@@ -24,15 +24,20 @@
 
 #
 # Base plugin, implements basic methods and attributes all plugins must use. To create a new plugin,
-# please extend this class, set the attributes correctly. implement the scan method and add the class
-# to the ACTIVE_PLUGINS list in the truegaze.py file.
+# please extend this class, set the attributes correctly. implement the scan method and add a PluginInfo
+# entry with the same attributes to the ACTIVE_PLUGINS list in truegaze/plugins/__init__.py. Heavy
+# dependencies should be imported by the plugin module only, since it is not imported until the plugin runs.
 #
+from truegaze.profiler import Profiler
 
 
 class BasePlugin(object):
     name = 'Base Plugin'
     desc = 'Base class used for all other plugins, do not access directly'
 
+    # Version of the plugin, must be increased whenever its results change so that cached results are discarded
+    version = '1.0'
+
     # Whether scanning of Android files is supported
     supports_android = False
 
@@ -42,15 +47,32 @@ class BasePlugin(object):
     # Whether supports online tests
     supports_online = False
 
-    def __init__(self, filename, is_android, is_ios, do_online):
+    # Regex patterns of paths searched for by the plugin, all plugins' patterns are matched in a single pass
+    # over the file via ScanContext.get_matching_paths()
+    path_patterns = []
+
+    # Regex patterns of the entries in the file that the plugin's results depend on, used to reuse results from
+    # earlier scans of other builds of the same app when those entries are unchanged. None means the results
+    # depend on the whole file.
+    input_patterns = None
+
+    # Cheap pre-conditions checked before the plugin is even imported, plugins that don't apply to a file are
+    # reported as not applicable instead of being run. required_patterns are regex patterns of paths, at least one
+    # of which must match an entry in the file, and required_content is a tuple of (entry name, list of byte
+    # signatures), at least one of which must be found in that entry. not_applicable describes what is missing.
+    required_patterns = []
+    required_content = None
+    not_applicable = None
+
+    def __init__(self, context, is_android, is_ios, do_online):
         # Main constructor
         #
-        # :param filename: Filename to scan
+        # :param context: truegaze.context.ScanContext shared by all plugins for the file being scanned
         # :param is_android: Whether the provided file is an Android application
         # :param is_ios: Whether the provided is an iOS application
         # :param do_online: Whether online tests should be performed
         #
-        self.filename = filename
+        self.context = context
         self.is_android = is_android
         self.is_ios = is_ios
         self.do_online = do_online
@@ -72,3 +94,22 @@ class BasePlugin(object):
     # Main scanning method
     def scan(self):
         raise NotImplementedError('Scanning functionality not implemented')
+
+    # Marks a phase of the scan, such as 'parse' or 'check', to be measured when profiling is enabled. The whole
+    # of scan() is measured as 'check' and finish() as 'report', phases used inside them are measured separately:
+    #
+    #   with self.phase('parse'):
+    #       data = ...
+    def phase(self, name):
+        return Profiler.measure(getattr(self.context, 'profiler', None), self.name, name)
+
+    # Called once all plugins have started scanning the file, used to wait for and report the results of any
+    # background work started by scan() - such as online checks - so that it overlaps with the other plugins
+    def finish(self):
+        pass
+
+    # Called once per process before any files are scanned, used by long-running modes such as "truegaze serve"
+    # to do one-time setup like loading data files ahead of the first scan
+    @staticmethod
+    def warm_up():
+        pass
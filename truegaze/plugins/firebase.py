@@ -21,12 +21,34 @@
 # specific language governing permissions and limitations
 # under the License.
 #
-from androguard.core.bytecodes.apk import APK
+import re
+import zipfile
+
 import click
-import requests
 import tldextract
 
+from truegaze.archive import EntryLimitError
+from truegaze.arsc import ArscError, ArscReader
+from truegaze.online import OnlineClient, ProbeError
 from truegaze.plugins.base import BasePlugin
+from truegaze.utils import TruegazeUtils
+
+# URL of the Firebase database, formatted with the database name
+FIREBASE_DB_URL = 'https://{}.firebaseio.com/.json'
+
+# URL of the GCP storage bucket, formatted with the database name
+BUCKET_URL = 'https://storage.googleapis.com/{}.appspot.com'
+
+# Compiled resource table of the APK, the only file the results depend on
+RESOURCES_FILE = 'resources.arsc'
+RESOURCES_FILE_PATTERN = re.compile(r'resources\.arsc$')
+
+# String resources added by the Firebase SDK that are looked up in the resource table
+RESOURCE_NAMES = ['firebase_database_url']
+
+# Name of the database URL resource as it appears in the resource table, which holds the names either as UTF-8
+# or as UTF-16 - apps without it are skipped before the resource table is parsed
+DB_URL_SIGNATURES = [b'firebase_database_url', 'firebase_database_url'.encode('utf-16-le')]
 
 
 # TODO: Add iOS support
@@ -34,18 +56,26 @@ from truegaze.plugins.base import BasePlugin
 class FirebasePlugin(BasePlugin):
     name = 'FirebasePlugin'
     desc = 'Detection of insecure Firebase databases and GCP storage buckets'
+    version = '1.3'
     supports_android = True
     supports_ios = False
     supports_online = True
+    input_patterns = [RESOURCES_FILE_PATTERN]
+    required_content = (RESOURCES_FILE, DB_URL_SIGNATURES)
+    not_applicable = 'no Firebase database in this application (no "firebase_database_url" resource)'
+    futures = None
 
     # Main scanning method
     def scan(self):
-        # Open the file
-        apk = APK(self.filename)
-
-
         # Get the Firebase URL
-        db_name = FirebasePlugin.get_db_name(apk)
+        try:
+            with self.phase('parse'):
+                package_name = self.context.app_info['package'] if self.context.app_info else None
+                resources = FirebasePlugin.get_resources(self.context.zip_file, package_name)
+        except (EntryLimitError, zipfile.BadZipFile) as error:
+            click.echo('---- ISSUE: ' + str(error))
+            return
+        db_name = FirebasePlugin.get_db_name(resources)
         if db_name and len(db_name) > 0:
             click.echo('Found Firebase database: ' + db_name)
         else:
@@ -57,12 +87,28 @@ class FirebasePlugin(BasePlugin):
             click.echo('-- Online tests are disabled, skipping check...')
             return
 
-        # Check if the database and bucket are accessible
+        # Check if the database and bucket are accessible, both checks run in the background at the same time
+        # while the other plugins keep scanning
         click.echo('-- Checking if the database is accessible...')
+        client = self.context.online_client
+        db_url = FIREBASE_DB_URL.format(db_name)
+        bucket_url = BUCKET_URL.format(db_name)
+        self.futures = [client.probe(db_url, FirebasePlugin.check_firebase_db, db_name, client),
+                        client.probe(bucket_url, FirebasePlugin.check_bucket, db_name, client)]
+
+    # Waits for the online checks started by scan() and shows the results
+    def finish(self):
+        if not self.futures:
+            return
+
         messages = list()
-        messages.append(FirebasePlugin.check_firebase_db(db_name))
-        messages.append(FirebasePlugin.check_bucket(db_name))
+        for future in self.futures:
+            try:
+                messages.append(future.result())
+            except ProbeError as error:
+                click.echo('-- ERROR: Unable to complete online check - ' + str(error))
         messages = list(filter(None, messages))
+        self.futures = None
 
         # Show results if needed
         if len(messages) > 0:
@@ -72,33 +118,48 @@ class FirebasePlugin(BasePlugin):
         else:
             click.echo("-- No issues found")
 
-    # Get the firebase URL from the APK
-    # TODO: add tests
+    # Get the Firebase string resources from the APK, reading only those entries from the resource table and
+    # only from the package of the application if its name is known
+    @staticmethod
+    def get_resources(zip_file, package_name=None):
+        try:
+            data = TruegazeUtils.read_zip_entry(zip_file, RESOURCES_FILE)
+            return ArscReader.get_strings(data, RESOURCE_NAMES, package_name)
+        except (KeyError, ArscError, ValueError):
+            return dict()
+
+    # Get the database name from the Firebase URL
     @staticmethod
-    def get_db_name(apk):
-        res = apk.get_android_resources().get_string(apk.package, 'firebase_database_url')
-        if res is not None:
-            url = res[1]
+    def get_db_name(resources):
+        url = resources.get('firebase_database_url')
+        if url is not None:
             return tldextract.extract(url).subdomain
 
         return None
 
+    # Loads the public suffix list used by get_db_name() ahead of the first scan
+    @staticmethod
+    def warm_up():
+        tldextract.extract(FIREBASE_DB_URL)
+
     # Check if the Firebase database is accessible
     @staticmethod
-    def check_firebase_db(db_name):
-        url = 'https://' + db_name + '.firebaseio.com/.json'
-        res = requests.get(url, stream=True)
-        if res.status_code == 200:
-            return '---- ISSUE: Unprotected Firebase DB found - ' + url
+    def check_firebase_db(db_name, client=None):
+        client = client or OnlineClient.get_default()
+        url = FIREBASE_DB_URL.format(db_name)
+        with client.get(url, stream=True) as res:
+            if res.status_code == 200:
+                return '---- ISSUE: Unprotected Firebase DB found - ' + url
 
         return None
 
     # Check if the bucket is accessible
     @staticmethod
-    def check_bucket(db_name):
-        url = 'https://storage.googleapis.com/' + db_name + '.appspot.com'
-        res = requests.head(url)
+    def check_bucket(db_name, client=None):
+        client = client or OnlineClient.get_default()
+        url = BUCKET_URL.format(db_name)
+        res = client.head(url)
         if res.status_code == 200:
             return '---- ISSUE: Unprotected bucket found - ' + url
 
-        return None
\ No newline at end of file
+        return None
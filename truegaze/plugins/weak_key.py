@@ -21,35 +21,42 @@
 # specific language governing permissions and limitations
 # under the License.
 #
-import re
+import functools
 
-from androguard.core.bytecodes.apk import APK
-from asn1crypto import cms
 from cryptography.hazmat.primitives.asymmetric import utils
 import click
 from roca.detect import RocaFingerprinter as Roca
 
+from truegaze.archive import EntryLimitError
+from truegaze.apk_signing import SIGNATURE_FILE_PATTERN, ApkSigningError, ApkSigningInfo
 from truegaze.plugins.base import BasePlugin
 
-# Regex pattern for the configuration file
-CERTIFICATE_FILE_PATTERN =\
-    re.compile(r'META-INF/.*\.RSA|META-INF/.*\.DSA')
-
 
 # Plugin to check for weak Android signing keys and signatures
 class WeakKeyPlugin(BasePlugin):
     name = 'WeakKeyPlugin'
     desc = 'Detection of weak Android signing keys'
+    version = '1.1'
     supports_android = True
     supports_ios = False
+    path_patterns = [SIGNATURE_FILE_PATTERN]
 
     # Main scanning method
     def scan(self):
-        # Open the file
-        apk = APK(self.filename)
+        # Read the signers directly from the file, without parsing the rest of the APK, and get their certificates,
+        # which are loaded from the raw signature data and may be malformed
+        try:
+            with self.phase('parse'):
+                signing_info = ApkSigningInfo.read(self.context.zip_file,
+                                                   self.context.get_matching_paths(SIGNATURE_FILE_PATTERN))
+                unique_certs = WeakKeyPlugin.get_certificates(signing_info)
+        except EntryLimitError as error:
+            click.echo('---- ISSUE: ' + str(error))
+            return
+        except (ApkSigningError, ValueError) as error:
+            click.echo('-- Unable to read the signatures in the APK File, skipping: ' + str(error))
+            return
 
-        # Get certificates
-        unique_certs = WeakKeyPlugin.get_certificates(apk)
         if len(unique_certs) == 0:
             click.echo('-- Cannot find the any certificates in the APK File, skipping')
             return
@@ -60,9 +67,9 @@ class WeakKeyPlugin(BasePlugin):
         messages.extend(WeakKeyPlugin.check_for_roca(unique_certs))
 
         # Check for weak DSA signatures
-        signatures = WeakKeyPlugin.get_signatures(apk)
+        signatures = WeakKeyPlugin.get_signatures(signing_info)
         if len(signatures) > 1:
-            messages = WeakKeyPlugin.check_for_weak_signatures(signatures)
+            messages.extend(WeakKeyPlugin.check_for_weak_signatures(signatures))
 
         # Show results if needed
         if len(messages) > 0:
@@ -72,43 +79,24 @@ class WeakKeyPlugin(BasePlugin):
         else:
             click.echo("-- No issues found")
 
-    # Get a list of certificates from the apk
-    # TODO: add tests
+    # Get a list of unique certificates from all signers (v1, v2 and v3)
     @staticmethod
-    def get_certificates(apk):
-        all_certs = list()
-        all_certs.extend(apk.get_certificates_v1())
-        all_certs.extend(apk.get_certificates_v2())
-        all_certs.extend(apk.get_certificates_v3())
-
+    def get_certificates(signing_info):
         unique_certs = dict()
-        for cert in all_certs:
-            unique_certs[cert.sha256_fingerprint] = cert
+        for signer in signing_info.signers:
+            for cert in signer.get_certificates():
+                unique_certs[cert.sha256_fingerprint] = cert
 
-        return unique_certs.values()
+        return list(unique_certs.values())
 
-    # Get a list of DSA/ECDSA signatures from the APK file
-    # TODO: add tests
+    # Get a list of DSA/ECDSA signatures from all signers (v1, v2 and v3)
     @staticmethod
-    def get_signatures(apk):
+    def get_signatures(signing_info):
         signatures = list()
-        certs_v1 = apk.get_certificates_v1()
-        for x in range(len(certs_v1)):
-            if certs_v1[x].public_key.algorithm == 'dsa' or certs_v1[x].public_key.algorithm == 'ecdsa':
-                data = cms.ContentInfo.load(apk.get_signatures()[x])
-                signatures.append(data['content']['signer_infos'][0]['signature'].contents)
-
-        if apk._is_signed_v2:
-            certs_v2 = apk.get_certificates_v2()
-            for x in range(len(certs_v2)):
-                if certs_v2[x].public_key.algorithm == 'dsa' or certs_v2[x].public_key.algorithm == 'ecdsa':
-                    signatures.append(apk._v2_signing_data[x].signatures[0][1])
-
-        if apk._is_signed_v3:
-            certs_v3 = apk.get_certificates_v3()
-            for x in range(len(certs_v3)):
-                if certs_v3[x].public_key.algorithm == 'dsa' or certs_v3[x].public_key.algorithm == 'ecdsa':
-                    signatures.append(apk._v3_signing_data[x].signatures[0][1])
+        for signer in signing_info.signers:
+            certs = signer.get_certificates()
+            if len(certs) > 0 and certs[0].public_key.algorithm in ('dsa', 'ecdsa'):
+                signatures.extend(signature for (algorithm, signature) in signer.signatures)
 
         return signatures
 
@@ -127,6 +115,17 @@ class WeakKeyPlugin(BasePlugin):
                                 '): Key is less than 2048 bits, size is ' + str(cert.public_key.bit_size) + ' bits')
         return messages
 
+    # Builds the ROCA fingerprinter and its tables, done only once per process
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def get_roca():
+        return Roca()
+
+    # Builds the ROCA tables ahead of the first scan
+    @staticmethod
+    def warm_up():
+        WeakKeyPlugin.get_roca()
+
     # Check for ROCA attacks
     # TODO: add tests
     @staticmethod
@@ -135,7 +134,8 @@ class WeakKeyPlugin(BasePlugin):
         for cert in certs:
             if cert.public_key.algorithm == 'rsa':
                 modulus = cert.public_key.native['public_key']['modulus']
-                if Roca().has_fingerprint_moduli(modulus) or Roca().has_fingerprint_dlog(modulus):
+                roca = WeakKeyPlugin.get_roca()
+                if roca.has_fingerprint_moduli(modulus) or roca.has_fingerprint_dlog(modulus):
                     messages.append('---- ISSUE (' +
                                     'algorithm: ' + cert.public_key.algorithm +
                                     ', fingerprint: ' + cert.sha1_fingerprint.replace(' ', '') +
@@ -158,6 +158,7 @@ class WeakKeyPlugin(BasePlugin):
         # Check if any appear more than once
         for r in values:
             if values.count(r) > 1:
-                messages.append('---- ISSUE: DSA "r" value occurs more than once, private key is recoverable; k = ' + r)
+                messages.append('---- ISSUE: DSA "r" value occurs more than once, private key is recoverable; k = ' +
+                                str(r))
 
         return messages
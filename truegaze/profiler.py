@@ -0,0 +1,244 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import contextlib
+import cProfile
+import hashlib
+import os
+import time
+import tracemalloc
+
+from beautifultable import BeautifulTable
+
+# Phases of a scan, in the order they are shown. Phases of the file as a whole are recorded under SCAN_NAME and
+# plugin phases under the plugin's name.
+PHASES = ['open', 'detect', 'preflight', 'parse', 'check', 'report']
+SCAN_NAME = 'scan'
+
+
+class PhaseTimer(object):
+    """A phase being measured, its times exclude any phases nested inside it"""
+
+    def __init__(self, key, memory):
+        self.key = key
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.start_memory = memory
+        self.peak_memory = 0
+        self.resume()
+
+    def resume(self):
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    def pause(self):
+        self.wall_time += time.perf_counter() - self._wall_start
+        self.cpu_time += time.process_time() - self._cpu_start
+
+
+class Profiler(object):
+    """
+    Collects the wall time, CPU time and peak memory allocated by each phase of each plugin, and optionally
+    writes a cProfile dump for each file. Phases are entered through phase(), or BasePlugin.phase() inside
+    plugins, and can be nested - the times of a phase exclude the phases nested inside it, while its peak
+    memory includes them. Peak memory is tracked with tracemalloc, which is only available on Python 3.9+
+    since it needs tracemalloc.reset_peak().
+    """
+
+    def __init__(self, profile_dir=None, trace_memory=True):
+        """
+        Main constructor
+
+        :param profile_dir: optional directory to write a cProfile dump for each scanned file to
+        :param trace_memory: whether to track the peak memory allocated by each phase, which slows down scans
+        """
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory and hasattr(tracemalloc, 'reset_peak')
+        self.stats = dict()
+        self._stack = []
+        self._started_tracing = False
+
+    def __getstate__(self):
+        # Copies sent to worker processes start out empty, their stats are merged back with merge()
+        state = self.__dict__.copy()
+        state['stats'] = dict()
+        state['_stack'] = []
+        state['_started_tracing'] = False
+        return state
+
+    @staticmethod
+    def measure(profiler, name, phase):
+        """
+        Measures a phase if profiling is enabled
+
+        :param profiler: Profiler, or None if profiling is disabled
+        :param name: name of the plugin, or SCAN_NAME
+        :param phase: name of the phase, usually one of PHASES
+        :return: context manager
+        """
+        if profiler is None:
+            return _no_phase()
+        return profiler.phase(name, phase)
+
+    @staticmethod
+    def profile(profiler, filename):
+        """
+        Runs cProfile while a file is scanned if profiling is enabled, see profile_file()
+
+        :param profiler: Profiler, or None if profiling is disabled
+        :param filename: file being scanned
+        :return: context manager
+        """
+        if profiler is None:
+            return _no_phase()
+        return profiler.profile_file(filename)
+
+    @contextlib.contextmanager
+    def phase(self, name, phase):
+        """
+        Measures a phase, adding its times and peak memory to the stats
+
+        :param name: name of the plugin, or SCAN_NAME
+        :param phase: name of the phase, usually one of PHASES
+        """
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+        if self._stack:
+            self._stack[-1].pause()
+            self._update_peak()
+        timer = PhaseTimer((name, phase), self._get_memory())
+        self._stack.append(timer)
+        try:
+            yield
+        finally:
+            timer.pause()
+            self._update_peak()
+            self._stack.pop()
+            self.add(timer.key, 1, timer.wall_time, timer.cpu_time, timer.peak_memory)
+            if self._stack:
+                self._stack[-1].resume()
+
+    def _get_memory(self):
+        return tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+
+    def _update_peak(self):
+        # The peak since the last update counts towards all of the phases that are running, then starts over
+        if not self.trace_memory:
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for timer in self._stack:
+            timer.peak_memory = max(timer.peak_memory, peak - timer.start_memory)
+        tracemalloc.reset_peak()
+
+    def add(self, key, calls, wall_time, cpu_time, peak_memory):
+        """
+        Adds measurements to the stats of a phase
+
+        :param key: tuple of (name, phase)
+        :param calls: number of times the phase ran
+        :param wall_time: wall time in seconds
+        :param cpu_time: CPU time in seconds
+        :param peak_memory: peak memory in bytes
+        """
+        stats = self.stats.get(key)
+        if stats is None:
+            self.stats[key] = [calls, wall_time, cpu_time, peak_memory]
+        else:
+            stats[0] += calls
+            stats[1] += wall_time
+            stats[2] += cpu_time
+            stats[3] = max(stats[3], peak_memory)
+
+    def merge(self, stats):
+        """
+        Merges stats collected by another profiler, such as the copy in a worker process
+
+        :param stats: dictionary of (name, phase) to [calls, wall time, CPU time, peak memory]
+        """
+        for key, values in (stats or dict()).items():
+            self.add(key, *values)
+
+    def close(self):
+        """Stops tracking memory allocations, if they were started by this profiler"""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextlib.contextmanager
+    def profile_file(self, filename):
+        """
+        Runs cProfile while a file is scanned and writes the dump to the profile directory, if one was given
+
+        :param filename: file being scanned
+        """
+        if self.profile_dir is None:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profile.dump_stats(Profiler.get_dump_path(self.profile_dir, filename))
+
+    @staticmethod
+    def get_dump_path(profile_dir, filename):
+        """
+        Gets the path of the cProfile dump for a file, files with the same name in different directories get
+        different dumps
+
+        :param profile_dir: directory of the dumps
+        :param filename: file being scanned
+        :return: path of the dump
+        """
+        digest = hashlib.sha1(os.path.abspath(filename).encode('utf-8', 'surrogateescape')).hexdigest()[:8]
+        return os.path.join(profile_dir, os.path.basename(filename) + '.' + digest + '.pstats')
+
+    def get_table(self):
+        """
+        Builds the summary table of the stats, with the scan phases first and then each plugin's phases
+
+        :return: beautifultable.BeautifulTable
+        """
+        def sort_key(key):
+            name, phase = key
+            phase_order = PHASES.index(phase) if phase in PHASES else len(PHASES)
+            return name != SCAN_NAME, name, phase_order, phase
+
+        table = BeautifulTable()
+        table.column_headers = ['Name', 'Phase', 'Calls', 'Wall (ms)', 'CPU (ms)', 'Peak memory (KB)']
+        for key in sorted(self.stats, key=sort_key):
+            calls, wall_time, cpu_time, peak_memory = self.stats[key]
+            table.append_row([key[0], key[1], calls, round(wall_time * 1000, 1), round(cpu_time * 1000, 1),
+                              round(peak_memory / 1024, 1) if self.trace_memory else '-'])
+        return table
+
+
+@contextlib.contextmanager
+def _no_phase():
+    yield
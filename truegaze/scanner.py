@@ -0,0 +1,439 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import contextlib
+import copy
+import io
+import json
+import os
+import time
+
+import click
+
+from truegaze.archive import DEFAULT_MAX_ENTRY_SIZE, DEFAULT_MAX_RATIO
+from truegaze.cache import ResultCache
+from truegaze.context import ScanContext
+from truegaze.isolation import CallTimeoutError, IsolatedCall, IsolationError
+from truegaze.plugins import ACTIVE_PLUGINS
+from truegaze.profiler import SCAN_NAME, Profiler
+from truegaze.utils import TruegazeUtils
+from truegaze.workers import WorkerPool
+
+# Exit codes returned for each scanned file
+STATUS_OK = 0
+STATUS_UNABLE_TO_OPEN = -1
+STATUS_UNKNOWN_PLATFORM = -2
+STATUS_WORKER_FAILED = -3
+
+# Name used to cache the platform detection results alongside the plugin results
+DETECTION_CACHE_NAME = '_detection'
+
+# Prefix of the fingerprints of a plugin's input entries, used in place of the file hash in cache keys
+FINGERPRINT_PREFIX = 'entries:'
+
+# Number of files per worker process that can be started ahead of the next result shown, when showing results in
+# input order
+PENDING_FILES_PER_JOB = 4
+
+
+class TruegazeScanner(object):
+    """Runs the active plugins against files, either one at a time or spread over a pool of worker processes"""
+
+    @staticmethod
+    def scan_file(filename, online, cache=None, online_client=None, max_entry_size=DEFAULT_MAX_ENTRY_SIZE,
+                  max_ratio=DEFAULT_MAX_RATIO, profiler=None, plugin_timeout=None, file_timeout=None):
+        """
+        Scans a single file with all of the active plugins, writing the results to the console
+
+        :param filename: file to scan
+        :param online: whether online tests should be performed
+        :param cache: optional truegaze.cache.ResultCache to reuse results from previous scans of the same file
+        :param online_client: optional truegaze.online.OnlineClient shared by the online checks
+        :param max_entry_size: maximum decompressed size of each file inside the application, None for no limit
+        :param max_ratio: maximum compression ratio of each file inside the application, None for no limit
+        :param profiler: optional truegaze.profiler.Profiler to record the time and memory used by each phase
+        :param plugin_timeout: maximum time in seconds for each plugin, None for no limit
+        :param file_timeout: maximum time in seconds for the whole file, None for no limit
+        :return: one of the STATUS_* codes
+        """
+        deadline = None if file_timeout is None else time.monotonic() + file_timeout
+        with Profiler.profile(profiler, filename):
+            click.echo('\nProcessing file: ' + filename)
+
+            path_patterns = [pattern for plugin in ACTIVE_PLUGINS
+                             for pattern in plugin.path_patterns + (plugin.input_patterns or [])]
+            with ScanContext(filename, path_patterns, online_client, max_entry_size, max_ratio, profiler,
+                             cache) as context:
+                settings = TruegazeScanner.get_settings(max_entry_size, max_ratio)
+
+                # Try to open and identify the file, error out if it is not a supported application. Files that
+                # can't be read, such as ones removed after they were listed, are reported the same way.
+                try:
+                    file_hash = TruegazeUtils.get_file_hash(filename) if cache is not None else None
+                except OSError:
+                    file_hash = None
+                    status = STATUS_UNABLE_TO_OPEN
+                else:
+                    status = TruegazeScanner.detect(context, cache, file_hash, settings)
+                if status == STATUS_UNABLE_TO_OPEN:
+                    click.echo('ERROR: Unable to open file - please check to make sure it is an APK or IPA file')
+                    return status
+                elif status == STATUS_UNKNOWN_PLATFORM:
+                    if context.detect_error is not None:
+                        click.echo('ERROR: ' + context.detect_error)
+                    click.echo('ERROR: Unable to identify the file as an Android or iOS application')
+                    return status
+                elif context.is_android:
+                    click.echo('Identified as an Android application via a manifest located at: ' +
+                               context.get_location(context.android_manifest))
+                    if context.get_app_name() is not None:
+                        click.echo('Application: ' + context.get_app_name())
+                else:
+                    click.echo('Identified as an iOS application via a manifest located at: ' +
+                               context.get_location(context.ios_manifest))
+
+                # Pass the shared context to the individual modules for scanning. All plugins are started first so
+                # that background work like online checks overlaps with the other plugins, then they are finished
+                # and their output is shown in order.
+                runs = [PluginRun(PLUGIN, context, online, cache, file_hash, settings, plugin_timeout, deadline)
+                        for PLUGIN in ACTIVE_PLUGINS]
+                for run in runs:
+                    run.start()
+                for run in runs:
+                    click.echo(run.finish(), nl=False)
+
+            return STATUS_OK
+
+    @staticmethod
+    def get_settings(max_entry_size, max_ratio):
+        """
+        Describes the settings that can change scan results, for use in cache keys
+
+        :param max_entry_size: maximum decompressed size of each file inside the application
+        :param max_ratio: maximum compression ratio of each file inside the application
+        :return: string, or None if the defaults are used
+        """
+        if max_entry_size == DEFAULT_MAX_ENTRY_SIZE and max_ratio == DEFAULT_MAX_RATIO:
+            return None
+        return 'limits=' + str(max_entry_size) + ':' + str(max_ratio)
+
+    @staticmethod
+    def detect(context, cache=None, file_hash=None, settings=None):
+        """
+        Opens the file and detects its platform, or restores a previous detection from the cache without
+        opening the file at all
+
+        :param context: truegaze.context.ScanContext for the file
+        :param cache: optional truegaze.cache.ResultCache
+        :param file_hash: SHA-256 hash of the file, required if the cache is used
+        :param settings: optional string describing the settings, as returned by get_settings()
+        :return: one of the STATUS_* codes
+        """
+        key = None
+        if cache is not None:
+            key = ResultCache.make_key(file_hash, DETECTION_CACHE_NAME, TruegazeUtils.get_version(),
+                                       TruegazeUtils.get_version(), False, settings)
+            cached = cache.get(key)
+            if cached is not None:
+                detection = json.loads(cached)
+                context.android_manifest = detection['android_manifest']
+                context.ios_manifest = detection['ios_manifest']
+                context.detect_error = detection.get('detect_error')
+                context.app_info = detection.get('app_info')
+                context.nested_path = detection.get('nested_path')
+                return detection['status']
+
+        with Profiler.measure(context.profiler, SCAN_NAME, 'open'):
+            opened = context.open()
+        if not opened:
+            status = STATUS_UNABLE_TO_OPEN
+        else:
+            with Profiler.measure(context.profiler, SCAN_NAME, 'detect'):
+                detected = context.detect()
+            status = STATUS_OK if detected else STATUS_UNKNOWN_PLATFORM
+
+        if cache is not None:
+            cache.put(key, json.dumps(dict(status=status, android_manifest=context.android_manifest,
+                                           ios_manifest=context.ios_manifest, detect_error=context.detect_error,
+                                           app_info=context.app_info, nested_path=context.nested_path)))
+        return status
+
+    @staticmethod
+    def scan_file_captured(args):
+        """
+        Scans a single file inside a worker process, capturing the console output so that results
+        from different files do not interleave
+
+        :param args: tuple of (filename, online, options), options being a dictionary of keyword arguments
+                     for scan_file()
+        :return: tuple of (filename, status, output, profiler stats), the stats being None unless a profiler
+                 was passed in the options
+        """
+        filename, online, options = args
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = TruegazeScanner.scan_file(filename, online, **options)
+
+        # The profiler is a per-task copy in worker processes, so its stats are handed back to be merged
+        stats = None
+        profiler = options.get('profiler')
+        if profiler is not None:
+            stats, profiler.stats = profiler.stats, dict()
+        return filename, status, output.getvalue(), stats
+
+    @staticmethod
+    def warm_up():
+        """
+        Imports all of the plugins and runs their one-time setup, so that the first scan in a long-running
+        process doesn't pay for it
+        """
+        for plugin in ACTIVE_PLUGINS:
+            plugin.load().warm_up()
+
+    @staticmethod
+    def get_job_count(jobs):
+        """
+        Gets the number of worker processes to use
+
+        :param jobs: requested number of worker processes, 0 to use one per CPU
+        :return: number of worker processes
+        """
+        if jobs <= 0:
+            return os.cpu_count() or 1
+        return jobs
+
+    @staticmethod
+    def scan_files_parallel(filenames, online, jobs, ordered=True, max_files=None, max_memory=None,
+                            memory_limit=None, **options):
+        """
+        Scans files using a pool of worker processes. Files are taken from the iterable only as workers become
+        free, so that a generator over a huge number of files is never read all at once. Workers are replaced
+        after scanning max_files files or once they use more than max_memory bytes, and a worker that dies is
+        replaced while the file it was scanning is reported with STATUS_WORKER_FAILED.
+
+        :param filenames: iterable of files to scan
+        :param online: whether online tests should be performed
+        :param jobs: number of worker processes, 0 to use one per CPU
+        :param ordered: whether to return results in input order, or in the order they complete
+        :param max_files: number of files after which a worker is replaced, None for no limit
+        :param max_memory: resident set size in bytes above which a worker is replaced, None for no limit
+        :param memory_limit: limit in bytes of the memory each worker can allocate, None for no limit
+        :param options: keyword arguments for scan_file(), such as the cache - each worker gets its own copy
+        :return: generator of (filename, status, output, profiler stats) tuples, as returned by
+                 scan_file_captured()
+        """
+        if jobs <= 0:
+            jobs = os.cpu_count() or 1
+
+        pool = WorkerPool(TruegazeScanner.scan_file_captured, jobs, max_files, max_memory, memory_limit,
+                          TruegazeScanner.get_failed_result)
+        tasks = ((filename, online, options) for filename in filenames)
+        return pool.imap(tasks, ordered, jobs * PENDING_FILES_PER_JOB)
+
+    @staticmethod
+    def get_failed_result(args):
+        """
+        Builds the result for a file whose worker process died while scanning it
+
+        :param args: tuple of (filename, online, options), as passed to scan_file_captured()
+        :return: tuple of (filename, status, output, profiler stats)
+        """
+        filename = args[0]
+        output = '\nProcessing file: ' + filename + '\nERROR: The worker process scanning the file stopped, it may ' \
+                 'have run out of memory\n'
+        return filename, STATUS_WORKER_FAILED, output, None
+
+
+class PluginRun(object):
+    """
+    A single plugin being run against a file. The plugin's output is buffered, so that plugins can be started
+    one after the other and finished later while still showing their output in order.
+
+    Plugins whose pre-conditions aren't met by the file are reported as not applicable without being imported.
+    Results are cached by the hash of the file, and for plugins that declare their input entries also by a
+    fingerprint of those entries, so that a new build of an app only reruns the plugins whose inputs changed.
+    Plugins that run online checks are not cached, since their results depend on the probes' own expiry.
+
+    If a timeout is given, the plugin runs in a child process that is killed when it runs out of time, and the
+    timeout is reported instead of the plugin's results. Plugins then run one after the other, since the child
+    processes share the file handle.
+    """
+
+    def __init__(self, plugin, context, online, cache=None, file_hash=None, settings=None, timeout=None,
+                 deadline=None):
+        """
+        Main constructor
+
+        :param plugin: truegaze.plugins.PluginInfo of the plugin to run
+        :param context: truegaze.context.ScanContext for the file
+        :param online: whether online tests should be performed
+        :param cache: optional truegaze.cache.ResultCache to reuse the output of previous scans of the same file
+        :param file_hash: SHA-256 hash of the file, required if the cache is used
+        :param settings: optional string describing the settings, included in the cache key
+        :param timeout: maximum time in seconds for the plugin, None for no limit
+        :param deadline: time.monotonic() value by which the plugin has to finish, None for no limit
+        """
+        self.plugin = plugin
+        self.context = context
+        self.online = online
+        self.cache = cache
+        self.file_hash = file_hash
+        self.settings = settings
+        self.header = '\nScanning using the "' + plugin.name + '" plugin\n'
+        self.output = io.StringIO()
+        self.timeout = timeout
+        self.deadline = deadline
+        self.instance = None
+        self.keys = []
+
+    def start(self):
+        """
+        Starts the plugin by calling its scan() method, or replays its output if it was cached. The plugin
+        module is only imported if it actually needs to run.
+        """
+        # Show error if OS is not supported, without importing the plugin
+        if not self.plugin.is_os_supported(self.context.is_android, self.context.is_ios):
+            self.output.write('-- OS is not supported by this plugin, skipping\n')
+            return
+
+        # Results of online checks can change at any time and are kept in the probe cache with their own expiry
+        # instead, so the output of plugins that ran them is never cached
+        if self.cache is not None and not (self.online and self.plugin.supports_online):
+            cached = self.get_cached(self.file_hash)
+
+            # Fall back to results from another file with the same input entries, the file itself is only
+            # opened here to read its central directory
+            if cached is None and self.plugin.input_patterns is not None and self.context.zip_file is not None:
+                cached = self.get_cached(FINGERPRINT_PREFIX +
+                                         self.context.get_fingerprint(self.plugin.input_patterns))
+                if cached is not None:
+                    self.cache.put(self.keys[0], cached)
+
+            if cached is not None:
+                self.output.write(cached)
+                return
+
+        # Skip the plugin without importing it if the file doesn't have what it looks for
+        with Profiler.measure(self.context.profiler, self.plugin.name, 'preflight'):
+            applicable = self.context.zip_file is None or self.plugin.is_applicable(self.context)
+        if not applicable:
+            reason = '' if self.plugin.not_applicable is None else ', ' + self.plugin.not_applicable
+            self.output.write('-- Not applicable' + reason + ', skipping\n')
+            self.store()
+            return
+
+        if self.timeout is not None or self.deadline is not None:
+            self.run_isolated()
+            return
+
+        self.instance = self.plugin.load()(self.context, self.context.is_android, self.context.is_ios, self.online)
+        with contextlib.redirect_stdout(self.output), \
+                Profiler.measure(self.context.profiler, self.plugin.name, 'check'):
+            self.instance.scan()
+
+    def run_isolated(self):
+        """
+        Runs the plugin from start to finish in a child process, within the plugin's timeout and the time left
+        for the file. Results are only cached if the plugin finished.
+        """
+        timeout = self.timeout
+        if self.deadline is not None:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                self.output.write('---- ISSUE: Skipped, the time limit for the file was reached\n')
+                return
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+        # One-time setup is done here so that the child processes of later files start with it
+        self.plugin.load().warm_up()
+        try:
+            output, stats = IsolatedCall.run(self.run_in_child, timeout)
+        except CallTimeoutError:
+            self.output.write('---- ISSUE: Plugin timed out after ' + str(round(timeout, 2)) +
+                              ' seconds and was stopped, the file may be malformed\n')
+            return
+        except IsolationError as error:
+            self.output.write('-- ERROR: Plugin failed - ' + str(error) + '\n')
+            return
+
+        self.output.write(output)
+        if self.context.profiler is not None:
+            self.context.profiler.merge(stats)
+        self.store()
+
+    def run_in_child(self):
+        """
+        Runs the plugin inside the child process started by run_isolated()
+
+        :return: tuple of (output, profiler stats), the stats being None if profiling is disabled
+        """
+        profiler = self.context.profiler
+        if profiler is not None:
+            profiler.stats = dict()
+
+        # The parent's database connection can't be used after fork(), so plugins get a copy of the cache that
+        # opens its own connection, and what they store there is still seen by the parent and later scans
+        if self.context.cache is not None:
+            self.context.cache = copy.copy(self.context.cache)
+
+        output = io.StringIO()
+        instance = self.plugin.load()(self.context, self.context.is_android, self.context.is_ios, self.online)
+        with contextlib.redirect_stdout(output):
+            with Profiler.measure(profiler, self.plugin.name, 'check'):
+                instance.scan()
+            with Profiler.measure(profiler, self.plugin.name, 'report'):
+                instance.finish()
+        return output.getvalue(), None if profiler is None else profiler.stats
+
+    def get_cached(self, file_hash):
+        """
+        Gets the cached output of the plugin, remembering the key so that the output is stored under it if the
+        plugin has to run
+
+        :param file_hash: hash of the file, or fingerprint of the plugin's input entries
+        :return: cached output, or None if it is not in the cache
+        """
+        key = ResultCache.make_key(file_hash, self.plugin.name, self.plugin.version, TruegazeUtils.get_version(),
+                                   self.online and self.plugin.supports_online, self.settings)
+        self.keys.append(key)
+        return self.cache.get(key)
+
+    def finish(self):
+        """
+        Finishes the plugin by calling its finish() method, and stores its output in the cache
+
+        :return: output of the plugin, including the header
+        """
+        if self.instance is not None:
+            with contextlib.redirect_stdout(self.output), \
+                    Profiler.measure(self.context.profiler, self.plugin.name, 'report'):
+                self.instance.finish()
+            self.store()
+            self.instance = None
+
+        return self.header + self.output.getvalue()
+
+    def store(self):
+        """Stores the output of the plugin in the cache, under all of the keys that were looked up"""
+        for key in self.keys:
+            self.cache.put(key, self.output.getvalue())
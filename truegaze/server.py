@@ -0,0 +1,228 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import multiprocessing
+import os
+import socketserver
+import stat
+
+from truegaze.scanner import TruegazeScanner
+from truegaze.utils import TruegazeUtils
+
+# Default address to listen on, only local clients are accepted since requests name files on this machine
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8270
+
+# Maximum size of a request body in bytes
+MAX_REQUEST_SIZE = 64 * 1024
+
+# Default time in seconds to wait for the result of a scan, the pool doesn't report workers that die during a
+# scan so without a limit the request would never get a response
+DEFAULT_SCAN_TIMEOUT = 10 * 60
+
+
+class ScanService(object):
+    """
+    Pool of worker processes kept running between scans. Each worker imports the plugins and runs their
+    one-time setup when it starts, and keeps the scan options (cache, online client) for its whole life, so
+    that a scan only pays for the work on the file itself.
+    """
+
+    # Options of the current worker process, set by init_worker()
+    _worker_online = False
+    _worker_options = {}
+
+    def __init__(self, jobs=1, online=False, scan_timeout=DEFAULT_SCAN_TIMEOUT, **options):
+        """
+        Main constructor
+
+        :param jobs: number of worker processes, 0 to use one per CPU
+        :param online: whether online tests should be performed
+        :param scan_timeout: maximum time in seconds to wait for the result of a scan
+        :param options: keyword arguments for TruegazeScanner.scan_file(), such as the cache
+        """
+        self.jobs = TruegazeScanner.get_job_count(jobs)
+        self.online = online
+        self.scan_timeout = scan_timeout
+        self.options = options
+        self._pool = None
+
+    def start(self):
+        """Starts the worker processes"""
+        self._pool = multiprocessing.Pool(processes=self.jobs, initializer=ScanService.init_worker,
+                                          initargs=(self.online, self.options))
+
+    @staticmethod
+    def init_worker(online, options):
+        """
+        Sets up a worker process
+
+        :param online: whether online tests should be performed
+        :param options: keyword arguments for TruegazeScanner.scan_file()
+        """
+        ScanService._worker_online = online
+        ScanService._worker_options = options
+        TruegazeScanner.warm_up()
+
+    @staticmethod
+    def scan_in_worker(filename):
+        """
+        Scans a file inside a worker process with the options given to init_worker()
+
+        :param filename: file to scan
+        :return: tuple of (filename, status, output, profiler stats)
+        """
+        return TruegazeScanner.scan_file_captured((filename, ScanService._worker_online,
+                                                   ScanService._worker_options))
+
+    def scan(self, filename):
+        """
+        Scans a file on one of the workers, waiting for the result. Can be called from several threads at once.
+
+        :param filename: file to scan
+        :return: dictionary with the filename, status and output
+        :raises multiprocessing.TimeoutError: if there was no result in time, such as when the worker died
+        """
+        result = self._pool.apply_async(ScanService.scan_in_worker, (filename,))
+        try:
+            _, status, output, _ = result.get(self.scan_timeout)
+        except multiprocessing.TimeoutError:
+            raise multiprocessing.TimeoutError('No result after ' + str(self.scan_timeout) +
+                                               ' seconds, the worker may have stopped')
+        return dict(filename=filename, status=status, output=output)
+
+    def close(self):
+        """Stops the worker processes"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    @staticmethod
+    def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+        """
+        Creates a server for the scan API, listening on a Unix socket or on a TCP port
+
+        :param service: ScanService to run the scans on
+        :param host: address to listen on, if no socket path is given
+        :param port: port to listen on, if no socket path is given
+        :param socket_path: optional path of a Unix socket to listen on instead, only accessible to the
+                            current user
+        :return: socketserver.BaseServer
+        """
+        if socket_path is not None:
+            if not hasattr(socketserver, 'UnixStreamServer'):
+                raise ValueError('Unix sockets are not supported on this platform')
+            if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                os.remove(socket_path)
+            umask = os.umask(0o177)
+            try:
+                server = ScanUnixServer(socket_path, ScanRequestHandler)
+            finally:
+                os.umask(umask)
+        else:
+            server = ScanHTTPServer((host, port), ScanRequestHandler)
+        server.service = service
+        return server
+
+
+class ScanHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """HTTP server for the scan API, each request is handled in its own thread"""
+    daemon_threads = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class ScanUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """HTTP server for the scan API listening on a Unix socket, each request is handled in its own thread"""
+        daemon_threads = True
+
+
+class ScanRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles requests to the scan API:
+
+    GET /health - returns {"status": "ok", "version": ...}
+    POST /scan - takes {"filename": ...} and returns {"filename": ..., "status": ..., "output": ...}, the status
+                 being one of the truegaze.scanner.STATUS_* codes
+
+    Errors are returned as {"error": ...} with a 4xx or 5xx status code.
+    """
+    server_version = 'truegaze/' + TruegazeUtils.get_version()
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, dict(status='ok', version=TruegazeUtils.get_version()))
+        else:
+            self.send_json(404, dict(error='Not found'))
+
+    def do_POST(self):
+        if self.path != '/scan':
+            self.send_json(404, dict(error='Not found'))
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_SIZE:
+            self.send_json(413, dict(error='Request is too large'))
+            return
+
+        try:
+            filename = json.loads(self.rfile.read(length).decode())['filename']
+            if not isinstance(filename, str):
+                raise ValueError()
+        except (ValueError, KeyError, TypeError):
+            self.send_json(400, dict(error='Request must be a JSON object with a "filename" string'))
+            return
+
+        if not os.path.isfile(filename):
+            self.send_json(404, dict(error='File not found: ' + filename))
+            return
+
+        # Errors from the scan or the worker pool are returned to the client instead of dropping the connection
+        try:
+            result = self.server.service.scan(filename)
+        except Exception as error:
+            self.send_json(500, dict(error='Scan failed: ' + (str(error) or type(error).__name__)))
+            return
+        self.send_json(200, result)
+
+    def send_json(self, code, data):
+        """
+        Sends a JSON response
+
+        :param code: HTTP status code
+        :param data: data to encode
+        """
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Clients connecting over a Unix socket don't have an address
+        if isinstance(self.client_address, tuple):
+            return str(self.client_address[0])
+        return 'unix'
@@ -21,15 +21,26 @@
 # specific language governing permissions and limitations
 # under the License.
 #
+import hashlib
 import plistlib
 import re
 import zipfile
 
+from truegaze.archive import DEFAULT_MAX_ENTRY_SIZE, DEFAULT_MAX_RATIO, MappedZipFile
+from truegaze.axml import AxmlReader
+
 # Name of the Android manifest file
 ANDROID_MANIFEST = 'AndroidManifest.xml'
 
-# Regex pattern to use when searching iOS files
+# Path of the Android manifest in Android App Bundles (AAB), which keep each module in its own directory
+AAB_MANIFEST = 'base/manifest/AndroidManifest.xml'
+
+# Size of the chunks used when hashing files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Regex pattern to use when searching iOS files, and the directory all of the matches are in
 IOS_PATTERN = re.compile(r'Payload/[^/]*.\.app/Info.plist')
+IOS_PREFIX = 'Payload/'
 
 
 class TruegazeUtils(object):
@@ -41,43 +52,109 @@ class TruegazeUtils(object):
         return "0.1.7"
 
     @staticmethod
-    def open_file_as_zip(filename):
+    def get_file_hash(filename):
+        """
+        Calculates the SHA-256 hash of a file without reading all of it into memory
+
+        :param filename: file to hash
+        :return: hex digest of the hash
+        """
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def open_file_as_zip(filename, max_entry_size=DEFAULT_MAX_ENTRY_SIZE, max_ratio=DEFAULT_MAX_RATIO):
         """
-        Tries to open the provided file as a zipfile
+        Tries to open the provided file as a memory mapped zipfile
 
         :param filename: file to open
-        :return: zipfile.ZipFile
+        :param max_entry_size: maximum decompressed size of an entry in bytes, None for no limit
+        :param max_ratio: maximum compression ratio of an entry, None for no limit
+        :return: truegaze.archive.MappedZipFile
         """
         try:
-            return zipfile.ZipFile(filename, 'r')
+            return MappedZipFile(filename, max_entry_size, max_ratio)
         except (zipfile.BadZipfile, FileNotFoundError, zipfile.LargeZipFile):
             return None
 
+    @staticmethod
+    def read_zip_entry(zip_file, path):
+        """
+        Reads an entry from a zipfile, without copying it if the zipfile is memory mapped and the entry is stored
+
+        :param zip_file: zipfile.ZipFile or truegaze.archive.MappedZipFile to read from
+        :param path: path of the entry
+        :return: memoryview or bytes
+        """
+        if isinstance(zip_file, MappedZipFile):
+            return zip_file.read_view(path)
+        return zip_file.read(path)
+
+    @staticmethod
+    def get_zip_names(zip_file, prefix=''):
+        """
+        Gets the names of the entries in a zipfile, using the compact index if the zipfile has one instead of
+        building a list of every name
+
+        :param zip_file: zipfile.ZipFile or truegaze.archive.MappedZipFile to scan
+        :param prefix: optional prefix that the names must start with
+        :return: iterable of names
+        """
+        if isinstance(zip_file, MappedZipFile):
+            if len(prefix) == 0:
+                return zip_file.index.iter_names()
+            return (zip_file.index.get_name(index) for index in zip_file.index.find_prefix(prefix))
+        return [name for name in zip_file.namelist() if name.startswith(prefix)]
+
     @staticmethod
     def get_android_manifest(zip_file):
         """
-        Check if this is an Android application by looking for the AndroidManifest.xml file in root
+        Check if this is an Android application by looking for the AndroidManifest.xml file in root, or in the
+        base module of an Android App Bundle
 
         :param zip_file: zipfile.ZipFile to scan
         :return: path to the Android manifest file
         """
-        try:
-            file_info = zip_file.getinfo(ANDROID_MANIFEST)
-            if file_info.file_size > 0:
-                return ANDROID_MANIFEST
-        except KeyError:
+        for path in [ANDROID_MANIFEST, AAB_MANIFEST]:
+            try:
+                file_info = zip_file.getinfo(path)
+                if file_info.file_size > 0:
+                    return path
+            except KeyError:
+                continue
+        return None
+
+    @staticmethod
+    def get_android_app_info(zip_file, path=ANDROID_MANIFEST):
+        """
+        Reads the package name, version and minimum SDK from the Android manifest without parsing the rest of
+        the application, raising truegaze.axml.AxmlError if the manifest is malformed
+
+        :param zip_file: zipfile.ZipFile to read from
+        :param path: path to the Android manifest file, as returned by get_android_manifest()
+        :return: dictionary as returned by truegaze.axml.AxmlReader.get_manifest_info(), or None for App Bundles,
+                 whose manifests are compiled to protobuf instead of binary XML
+        """
+        if path == AAB_MANIFEST:
             return None
+        return AxmlReader.get_manifest_info(TruegazeUtils.read_zip_entry(zip_file, path))
 
     @staticmethod
-    def get_ios_manifest(zip_file):
+    def get_ios_manifest(zip_file, paths=None):
         """
-        Check if this is an iOS application by looking for the application and its plist
+        Check if this is an iOS application by looking for the application and its plist, raising
+        truegaze.archive.EntryLimitError if the plist is over the zipfile's read limits
 
         :param zip_file: zipfile.ZipFile to scan
+        :param paths: optional list of paths matching IOS_PATTERN, if they were already found
         :return: path to the iOS plist file
         """
         # IPA files have a /Payload/[something].app directory with the plist file in it, try to find it via regex
-        paths = TruegazeUtils.get_matching_paths_from_zip(zip_file, IOS_PATTERN, True)
+        if paths is None:
+            paths = TruegazeUtils.get_matching_paths_from_zip(zip_file, IOS_PATTERN, True, IOS_PREFIX)
 
         # Check if the path was found and try to parse
         if len(paths) > 0:
@@ -97,16 +174,17 @@ class TruegazeUtils(object):
         return None
 
     @staticmethod
-    def get_matching_paths_from_zip(zip_file, pattern, stop_after_first=False):
+    def get_matching_paths_from_zip(zip_file, pattern, stop_after_first=False, prefix=''):
         """
         Searches ZIP file for list of matching paths
 
         :param zip_file: zipfile.ZipFile to scan
         :param pattern: regex pattern to use
         :param stop_after_first: whether to stop once first match is found
+        :param prefix: optional prefix that all matches start with, to skip the other paths up front
         :return: list of matched paths
         """
-        file_list = zip_file.namelist()
+        file_list = TruegazeUtils.get_zip_names(zip_file, prefix)
         paths = []
         for file_path in file_list:
             matched = pattern.match(file_path)
@@ -116,3 +194,22 @@ class TruegazeUtils(object):
                     break
 
         return paths
+
+    @staticmethod
+    def get_matching_paths_for_patterns(zip_file, patterns):
+        """
+        Searches ZIP file for paths matching any of several patterns, walking the list of files only once
+
+        :param zip_file: zipfile.ZipFile to scan
+        :param patterns: list of regex patterns to use
+        :return: dictionary of pattern to the list of matched paths
+        """
+        results = dict((pattern, []) for pattern in patterns)
+        items = list(results.items())
+        for file_path in TruegazeUtils.get_zip_names(zip_file):
+            for pattern, paths in items:
+                matched = pattern.match(file_path)
+                if matched is not None:
+                    paths.append(matched.group())
+
+        return results
@@ -0,0 +1,268 @@
+#
+# Copyright (c) 2019 Nightwatch Cybersecurity.
+#
+# This file is part of truegaze
+# (see https://github.com/nightwatchcybersecurity/truegaze).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import importlib.util
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import sys
+
+# Time in seconds to wait for a worker to exit after asking it to stop, before it is killed
+STOP_TIMEOUT = 5
+
+# Marker for the end of the tasks
+_DONE = object()
+
+
+def get_rss():
+    """
+    Gets the resident set size of the current process, or its peak on platforms without /proc
+
+    :return: size in bytes
+    """
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def set_memory_limit(memory_limit):
+    """
+    Limits the memory the current process can allocate. RLIMIT_DATA is used where available since unlike
+    RLIMIT_AS it doesn't count read-only mapped files, so large applications can still be memory mapped.
+
+    :param memory_limit: limit in bytes
+    """
+    import resource
+    limit = getattr(resource, 'RLIMIT_DATA', resource.RLIMIT_AS)
+    resource.setrlimit(limit, (memory_limit, memory_limit))
+
+
+def is_memory_limit_supported():
+    """
+    Checks if memory limits can be applied to worker processes on this platform
+
+    :return: True if the resource module is available
+    """
+    return importlib.util.find_spec('resource') is not None
+
+
+class Worker(object):
+    """A worker process that runs tasks sent over a pipe, one at a time"""
+
+    def __init__(self, function, memory_limit=None):
+        """
+        Starts the worker process
+
+        :param function: function to call with each task, must be picklable
+        :param memory_limit: optional limit in bytes of the memory the worker can allocate
+        """
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=Worker.run, args=(child_connection, function, memory_limit),
+                                               daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.task = None
+        self.files = 0
+        self.rss = 0
+
+    @staticmethod
+    def run(connection, function, memory_limit):
+        """
+        Main loop of the worker process, sends back tuples of (success, result or exception, RSS) until it gets
+        None. A worker that runs out of memory exits, and the task is reported as failed by the pool.
+
+        :param connection: multiprocessing.connection.Connection to the pool
+        :param function: function to call with each task
+        :param memory_limit: optional limit in bytes of the memory the worker can allocate
+        """
+        if memory_limit is not None:
+            set_memory_limit(memory_limit)
+
+        while True:
+            try:
+                task = connection.recv()
+            except EOFError:
+                return
+            if task is None:
+                return
+
+            try:
+                result = (True, function(task))
+            except MemoryError:
+                os._exit(1)
+            except Exception as exception:
+                result = (False, exception)
+            connection.send(result + (get_rss(),))
+
+    def submit(self, index, task):
+        """
+        Sends a task to the worker
+
+        :param index: position of the task in the input
+        :param task: argument for the worker's function
+        """
+        self.task = (index, task)
+        self.connection.send(task)
+
+    def stop(self):
+        """Asks the worker to exit once it is idle, killing it if it doesn't"""
+        try:
+            if self.task is None:
+                self.connection.send(None)
+                self.process.join(STOP_TIMEOUT)
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+
+
+class WorkerPool(object):
+    """
+    Pool of worker processes that are replaced after scanning a number of files or when their memory use grows
+    too large, so that long batch runs stay at a stable memory footprint. A worker that dies while scanning a
+    file - for example because it was killed by the OOM killer - is replaced, and the file is reported as
+    failed instead of stalling the batch. Tasks are taken from the input only as workers become free.
+    """
+
+    def __init__(self, function, jobs, max_files=None, max_memory=None, memory_limit=None, on_failure=None):
+        """
+        Main constructor
+
+        :param function: function to call with each task, must be picklable
+        :param jobs: number of worker processes
+        :param max_files: number of tasks after which a worker is replaced, None for no limit
+        :param max_memory: resident set size in bytes above which a worker is replaced, None for no limit
+        :param memory_limit: limit in bytes of the memory each worker can allocate, None for no limit
+        :param on_failure: function called with a task whose worker died to get its result, by default an
+                           exception is raised
+        """
+        self.function = function
+        self.jobs = jobs
+        self.max_files = max_files
+        self.max_memory = max_memory
+        self.memory_limit = memory_limit
+        self.on_failure = on_failure
+        self.workers = []
+        self.recycled = 0
+
+    def start_worker(self):
+        return Worker(self.function, self.memory_limit)
+
+    def should_recycle(self, worker):
+        """
+        Checks if a worker should be replaced after finishing a task
+
+        :param worker: Worker
+        :return: True if it reached the maximum number of files or memory use
+        """
+        return (self.max_files is not None and worker.files >= self.max_files) or \
+            (self.max_memory is not None and worker.rss >= self.max_memory)
+
+    def imap(self, tasks, ordered=True, max_pending=None):
+        """
+        Runs the function on each task
+
+        :param tasks: iterable of tasks
+        :param ordered: whether to return results in input order, or in the order they complete
+        :param max_pending: when ordered, maximum number of tasks that can be started ahead of the next result
+                            to return, None for no limit
+        :return: generator of results
+        """
+        tasks = iter(tasks)
+        next_index = 0
+        next_result = 0
+        finished = dict()
+        exhausted = False
+        self.workers = [self.start_worker() for _ in range(self.jobs)]
+        try:
+            while True:
+                # Hand out tasks to idle workers
+                for worker in self.workers:
+                    if exhausted or (ordered and max_pending is not None and next_index - next_result >= max_pending):
+                        break
+                    if worker.task is None:
+                        task = next(tasks, _DONE)
+                        if task is _DONE:
+                            exhausted = True
+                            break
+                        worker.submit(next_index, task)
+                        next_index += 1
+
+                busy = dict((worker.connection, position) for position, worker in enumerate(self.workers)
+                            if worker.task is not None)
+                if len(busy) == 0:
+                    return
+
+                for connection in wait(list(busy)):
+                    index, result = self.collect(busy[connection])
+                    if not ordered:
+                        yield result
+                        continue
+
+                    finished[index] = result
+                    while next_result in finished:
+                        yield finished.pop(next_result)
+                        next_result += 1
+        finally:
+            for worker in self.workers:
+                worker.stop()
+            self.workers = []
+
+    def collect(self, position):
+        """
+        Gets the result of a worker's task, replacing the worker if it died or should be recycled
+
+        :param position: position of the worker in the list of workers
+        :return: tuple of (task index, result)
+        """
+        worker = self.workers[position]
+        index, task = worker.task
+        try:
+            success, result, worker.rss = worker.connection.recv()
+        except (EOFError, OSError):
+            if self.on_failure is None:
+                raise
+            worker.task = None
+            self.replace(position)
+            return index, self.on_failure(task)
+
+        worker.task = None
+        worker.files += 1
+        if self.should_recycle(worker):
+            self.replace(position)
+        if not success:
+            raise result
+        return index, result
+
+    def replace(self, position):
+        self.workers[position].stop()
+        self.workers[position] = self.start_worker()
+        self.recycled += 1